@@ -0,0 +1,190 @@
+"""
+Admission Control
+Bounds the work the API server accepts and rate-limits each client
+
+Every request has a cost from its route: a single-id lookup is cheap, the
+full transaction list is expensive (unless its encoded body is already
+cached). Requests are admitted while the cost of those in flight stays within
+the capacity, and expensive ones may only use part of it, so cheap lookups
+still get through while exports saturate the server. The capacity defaults to
+every request thread running an expensive request, so load is only shed once
+requests would otherwise queue for a thread. A request that does not fit waits
+briefly for capacity to free up, then gets a 503 with Retry-After.
+
+Optionally (MOMO_RATE_LIMIT > 0), each client - the user together with the
+address it connects from, since many clients share one account - also has a
+token bucket refilled at a fixed rate; a request spends its cost in tokens
+and is answered 429 when the bucket is empty.
+"""
+
+import math
+import os
+import threading
+import time
+
+HEAVY_SHARE = 0.75  # Fraction of the capacity expensive requests may use
+ADMISSION_WAIT = float(os.environ.get('MOMO_ADMISSION_WAIT', '0.25'))  # seconds
+RATE_LIMIT = float(os.environ.get('MOMO_RATE_LIMIT', '0'))  # tokens/second per client, 0 = off
+RATE_BURST = float(os.environ.get('MOMO_RATE_BURST', '100'))
+RETRY_AFTER_SECONDS = 1
+MAX_TRACKED_CLIENTS = 10_000
+
+# Route cost weights; requests up to CHEAP_COST count as cheap
+CHEAP_COST = 1
+LIST_COST = 10
+PAGE_COST = 2
+WRITE_COST = 2
+
+
+def default_capacity(request_threads):
+    """
+    Get the admission capacity for a process with the given request threads
+
+    MOMO_MAX_IN_FLIGHT (cost units) overrides it; by default every thread may
+    run an expensive request.
+    """
+    configured = os.environ.get('MOMO_MAX_IN_FLIGHT')
+    return int(configured) if configured else request_threads * LIST_COST
+
+
+def route_cost(method, path, query=''):
+    """
+    Get the cost weight of a request
+
+    Args:
+        method (str): HTTP method
+        path (str): URL path
+        query (str): URL query string
+
+    Returns:
+        int: Cost units (0 = never limited)
+    """
+    if method == 'OPTIONS' or path in ('/health', '/ready'):
+        return 0
+    if method != 'GET':
+        return WRITE_COST
+    if path.rstrip('/') == '/transactions':
+        paged = 'limit=' in query or 'offset=' in query
+        return PAGE_COST if paged else LIST_COST
+    if path == '/transactions/export':
+        return LIST_COST
+    if path == '/transactions/reconciliation':
+        return LIST_COST  # May have to reconcile the whole store
+    return CHEAP_COST
+
+
+class AdmissionController:
+    """Cost-weighted bound on the requests being processed"""
+
+    def __init__(self, capacity, heavy_share=HEAVY_SHARE, wait=ADMISSION_WAIT):
+        """
+        Args:
+            capacity (int): Total cost of requests allowed in flight
+            heavy_share (float): Fraction of the capacity requests costlier
+                than CHEAP_COST may occupy
+            wait (float): Seconds a request may wait for capacity before
+                being rejected
+        """
+        self.capacity = capacity
+        self.heavy_limit = max(1, int(capacity * heavy_share))
+        self.wait = wait
+        self.in_flight = 0
+        self.stats = {'admitted': 0, 'waited': 0, 'rejected': 0}
+        self._released = threading.Condition()
+
+    def _fits(self, cost):
+        limit = self.capacity if cost <= CHEAP_COST else self.heavy_limit
+        # A request costlier than the limit is still admitted when idle
+        return not self.in_flight or self.in_flight + cost <= limit
+
+    def try_acquire(self, cost, timeout=None):
+        """
+        Admit a request of the given cost
+
+        Args:
+            cost (int): Cost units
+            timeout (float): Seconds to wait for capacity (defaults to self.wait;
+                0 only probes, without counting a rejection)
+
+        Returns:
+            bool: False if the server stayed saturated
+        """
+        if cost == 0:
+            return True
+        timeout = self.wait if timeout is None else timeout
+        with self._released:
+            if not self._fits(cost):
+                if timeout == 0:
+                    return False
+                self.stats['waited'] += 1
+                deadline = time.monotonic() + timeout
+                while not self._fits(cost):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.stats['rejected'] += 1
+                        return False
+                    self._released.wait(remaining)
+            self.in_flight += cost
+            self.stats['admitted'] += 1
+            return True
+
+    def release(self, cost):
+        if cost == 0:
+            return
+        with self._released:
+            self.in_flight -= cost
+            self._released.notify_all()
+
+
+class RateLimiter:
+    """Token bucket per client"""
+
+    def __init__(self, rate=RATE_LIMIT, burst=RATE_BURST):
+        """
+        Args:
+            rate (float): Tokens added per second (0 disables rate limiting)
+            burst (float): Bucket size
+        """
+        self.rate = rate
+        self.burst = burst
+        self.buckets = {}  # client -> (tokens, last refill time)
+        self._lock = threading.Lock()
+
+    def consume(self, client, cost):
+        """
+        Spend tokens for a request
+
+        Returns:
+            float: 0 if allowed, otherwise seconds until enough tokens are available
+        """
+        if cost == 0 or self.rate <= 0:
+            return 0
+        cost = min(cost, self.burst)
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self.buckets.get(client, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens < cost:
+                self.buckets[client] = (tokens, now)
+                return (cost - tokens) / self.rate
+            self.buckets[client] = (tokens - cost, now)
+            if len(self.buckets) > MAX_TRACKED_CLIENTS:
+                self._forget_idle(now)
+            return 0
+
+    def _forget_idle(self, now):
+        """Drop buckets that have refilled completely (same as a new client)"""
+        refill_time = self.burst / self.rate
+        for client, (_, updated) in list(self.buckets.items()):
+            if now - updated >= refill_time:
+                del self.buckets[client]
+
+
+def client_key(user, address):
+    """Rate limit bucket of a request: the authenticated user on one address"""
+    return f"{user or '-'}@{address}"
+
+
+def retry_after(seconds):
+    """Format a Retry-After header value (whole seconds, at least 1)"""
+    return str(max(RETRY_AFTER_SECONDS, math.ceil(seconds)))
@@ -6,6 +6,8 @@ Handles create, update, and delete operations
 import json
 from datetime import datetime
 
+from fee_engine import get_fee_engine
+
 
 def validate_transaction_data(data, is_update=False):
     """
@@ -52,6 +54,29 @@ def validate_transaction_data(data, is_update=False):
     return True, None
 
 
+def apply_transaction_defaults(data):
+    """
+    Fill in optional fields of a new transaction
+    
+    Args:
+        data (dict): Validated transaction data (modified in place)
+        
+    Returns:
+        dict: The same transaction data
+    """
+    if 'timestamp' not in data:
+        data['timestamp'] = datetime.now().isoformat()
+    
+    if 'status' not in data:
+        data['status'] = 'COMPLETED'
+    
+    if 'fee' not in data:
+        # Calculate fee from the fee type of this transaction type
+        data['fee'] = get_fee_engine().calculate(data['amount'], data.get('type'))
+    
+    return data
+
+
 def handle_post(handler, store):
     """
     Handle POST /transactions - Create new transaction
@@ -84,15 +109,7 @@ def handle_post(handler, store):
             return
         
         # Set defaults for optional fields
-        if 'timestamp' not in data:
-            data['timestamp'] = datetime.now().isoformat()
-        
-        if 'status' not in data:
-            data['status'] = 'COMPLETED'
-        
-        if 'fee' not in data:
-            # Calculate default fee (1% of amount)
-            data['fee'] = round(float(data['amount']) * 0.01, 2)
+        apply_transaction_defaults(data)
         
         # Add transaction
         new_transaction = store.add(data)
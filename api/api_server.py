@@ -1,16 +1,54 @@
 """
 MoMo SMS REST API Server
 Handles GET requests for transaction data
+
+The server binds its port immediately and loads the store in a background
+thread: /health answers at once, /ready (and the transaction endpoints) once
+loading has finished. Parsing modules are only imported by the loader.
 """
 
+from concurrent.futures import ThreadPoolExecutor
 from http.server import HTTPServer, BaseHTTPRequestHandler
+import itertools
 import json
 import sys
 import os
+import threading
+from urllib.parse import parse_qs, urlparse
 
 # Add parent directory to path to import from dsa folder
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
-from dsa.xml_parser import parse_xml_to_json
+from admission import (CHEAP_COST, AdmissionController, RateLimiter, client_key,
+                       default_capacity, retry_after, route_cost)
+from change_feed import SSE_CONTENT_TYPE, SSE_HEADERS, ChangeBroadcaster, ChangeLog
+from compression import ResponseCache, compress, compress_stream, negotiate_encoding
+from export import (EXPORT_FORMATS, export_headers, iter_export, iter_transaction_list,
+                    parse_export_query)
+from reconciliation import DEFAULT_ISSUE_LIMIT, BalanceReconciler
+from timestamps import in_range, parse_time_range, timestamp_to_epoch_ms
+
+# Credentials (hardcoded for demo - INSECURE!)
+# In production, use hashed passwords and database
+VALID_USERNAME = 'admin'
+VALID_PASSWORD = 'momo2024'
+
+
+def verify_credentials(username, password):
+    """Check a username/password pair against the API credentials"""
+    return username == VALID_USERNAME and password == VALID_PASSWORD
+
+
+def authenticated_user(auth_header):
+    """Get the username of valid Basic Auth credentials, or None"""
+    import base64
+    try:
+        auth_type, credentials = auth_header.split(' ', 1)
+        username, password = base64.b64decode(credentials).decode('utf-8').split(':', 1)
+    except Exception:
+        return None
+    if auth_type.lower() == 'basic' and verify_credentials(username, password):
+        return username
+    return None
 
 
 class TransactionStore:
@@ -20,90 +58,549 @@ class TransactionStore:
         self.transactions = []
         self.transactions_dict = {}
         self.next_id = 1
+        self.version = 0  # Bumped on every change; keys the response cache
+        self.changes = ChangeLog()
+        self.change_listeners = self.changes.listeners
+        self._lock = threading.Lock()  # Requests are handled on several threads
     
     def load_from_xml(self, xml_path):
-        """Load transactions from XML file"""
-        self.transactions = parse_xml_to_json(xml_path)
+        """Load transactions from XML file, dropping duplicate messages"""
+        from dsa.deduplicator import Deduplicator
+        from dsa.xml_parser import parse_xml_to_json
+        
+        deduplicator = Deduplicator()
+        self.transactions = parse_xml_to_json(xml_path, deduplicator=deduplicator)
+        deduplicator.close()
+        if deduplicator.stats['duplicates']:
+            print(f"Skipped {deduplicator.stats['duplicates']} duplicate messages")
         self.transactions_dict = {trans['id']: trans for trans in self.transactions}
         if self.transactions:
             self.next_id = max(trans['id'] for trans in self.transactions) + 1
+        self.version += 1
+        self.changes.record('reset')
+    
+    def count(self):
+        """Get the number of transactions"""
+        return len(self.transactions)
     
     def get_all(self):
         """Get all transactions"""
         return self.transactions
     
+    def iter_all(self):
+        """Yield all transactions"""
+        return iter(self.transactions)
+    
+    def get_page(self, offset, limit):
+        """Get transactions in insertion order, starting at offset"""
+        return self.transactions[offset:offset + limit]
+    
+    def iter_range(self, start_ms=None, end_ms=None):
+        """Yield transactions with start_ms <= timestamp < end_ms"""
+        return (trans for trans in self.transactions
+                if in_range(timestamp_to_epoch_ms(trans.get('timestamp')), start_ms, end_ms))
+    
+    def get_range(self, start_ms=None, end_ms=None):
+        """Get transactions with start_ms <= timestamp < end_ms"""
+        return list(self.iter_range(start_ms, end_ms))
+    
+    def get_range_page(self, start_ms, end_ms, offset, limit):
+        """Get one page of get_range() without building the whole list"""
+        return list(itertools.islice(self.iter_range(start_ms, end_ms), offset, offset + limit))
+    
+    def count_range(self, start_ms=None, end_ms=None):
+        """Get the number of transactions with start_ms <= timestamp < end_ms"""
+        return sum(1 for _ in self.iter_range(start_ms, end_ms))
+    
     def get_by_id(self, trans_id):
         """Get transaction by ID"""
         return self.transactions_dict.get(trans_id)
     
     def add(self, transaction):
         """Add new transaction"""
-        transaction['id'] = self.next_id
-        self.next_id += 1
-        self.transactions.append(transaction)
-        self.transactions_dict[transaction['id']] = transaction
+        with self._lock:
+            transaction['id'] = self.next_id
+            self.next_id += 1
+            self.transactions.append(transaction)
+            self.transactions_dict[transaction['id']] = transaction
+            self.version += 1
+        self.changes.record('create', transaction['id'], transaction)
         return transaction
     
     def update(self, trans_id, updated_data):
         """Update existing transaction"""
-        if trans_id not in self.transactions_dict:
-            return None
-        
-        # Update the transaction
-        transaction = self.transactions_dict[trans_id]
-        for key, value in updated_data.items():
-            if key != 'id':  # Don't allow ID changes
-                transaction[key] = value
+        with self._lock:
+            if trans_id not in self.transactions_dict:
+                return None
+            
+            # Update the transaction
+            transaction = self.transactions_dict[trans_id]
+            for key, value in updated_data.items():
+                if key != 'id':  # Don't allow ID changes
+                    transaction[key] = value
+            self.version += 1
+        self.changes.record('update', trans_id, transaction)
         
         return transaction
     
+    def recalculate_fees(self):
+        """Recalculate historical fees with the fee engine"""
+        from fee_engine import recalculate_fees
+        changed = recalculate_fees(self.transactions)
+        if changed:
+            self.version += 1
+            self.changes.record('reset')
+        return changed
+    
     def delete(self, trans_id):
         """Delete transaction"""
-        if trans_id not in self.transactions_dict:
-            return False
-        
-        # Remove from both list and dict
-        transaction = self.transactions_dict[trans_id]
-        self.transactions.remove(transaction)
-        del self.transactions_dict[trans_id]
+        with self._lock:
+            if trans_id not in self.transactions_dict:
+                return False
+            
+            # Remove from both list and dict
+            transaction = self.transactions_dict[trans_id]
+            self.transactions.remove(transaction)
+            del self.transactions_dict[trans_id]
+            self.version += 1
+        self.changes.record('delete', trans_id)
         
         return True
+    
+    def changes_since(self, seq):
+        """Get change events after a sequence number (None if the client must re-fetch)"""
+        return self.changes.since(seq)
+    
+    def last_change_seq(self):
+        """Get the sequence number of the latest change event"""
+        return self.changes.last_seq
+
+
+# Storage backend: 'memory' (parse the XML on every start), 'sqlite' or
+# 'partitioned' (monthly JSON files, old months loaded on demand)
+STORE_BACKEND = os.environ.get('MOMO_STORE', 'memory')
+DB_PATH = os.environ.get(
+    'MOMO_DB_PATH', os.path.join(os.path.dirname(__file__), '..', 'data', 'momo.sqlite')
+)
+PARTITION_DIR = os.environ.get(
+    'MOMO_PARTITION_DIR', os.path.join(os.path.dirname(__file__), '..', 'data', 'partitions')
+)
+PARTITION_BUDGET_MB = int(os.environ.get('MOMO_PARTITION_BUDGET_MB', '64'))
+
 
+def create_store(backend=STORE_BACKEND, db_path=DB_PATH):
+    """Create the transaction store for a storage backend"""
+    if backend == 'memory':
+        return TransactionStore()
+    if backend == 'sqlite':
+        from db import SQLiteTransactionStore
+        return SQLiteTransactionStore(db_path)
+    if backend == 'partitioned':
+        from partitioned_store import PartitionedTransactionStore
+        return PartitionedTransactionStore(
+            PARTITION_DIR, memory_budget=PARTITION_BUDGET_MB * 1024 * 1024
+        )
+    raise ValueError(f"Unknown store backend: {backend}")
+
+
+XML_PATH = os.path.join(os.path.dirname(__file__), '..', 'modified_sms_v2.xml')
 
 # Global transaction store
-store = TransactionStore()
+store = create_store()
+
+# Set once the store is loaded; until then only /health and /ready answer
+store_ready = threading.Event()
+load_error = None
+
+# POST/PUT/DELETE handlers from api_crud_operations, resolved once at startup
+CRUD_HANDLERS = {}
+
+# Encoded GET bodies, reused until the store version changes
+response_cache = ResponseCache()
+
+# Request threads per process; connections beyond this many waiting are refused
+REQUEST_THREADS = int(os.environ.get('MOMO_REQUEST_THREADS', '16'))
+
+# Overload protection shared by all request threads
+admission = AdmissionController(default_capacity(REQUEST_THREADS))
+rate_limiter = RateLimiter()
+MAX_QUEUED_CONNECTIONS = 64
+OVERLOADED_RESPONSE = (
+    b'HTTP/1.0 503 Service Unavailable\r\n'
+    b'Content-Type: application/json\r\n'
+    b'Retry-After: 1\r\n'
+    b'Connection: close\r\n\r\n'
+    b'{"error": "Server overloaded - retry later", "status_code": 503}'
+)
+
+# Streams store changes to /transactions/changes subscribers, started on first use
+_change_broadcaster = None
+_change_broadcaster_lock = threading.Lock()
+
+
+def get_change_broadcaster():
+    """Get the broadcaster for the current store, starting its thread on first use"""
+    global _change_broadcaster
+    with _change_broadcaster_lock:
+        if _change_broadcaster is None or _change_broadcaster.store is not store:
+            _change_broadcaster = ChangeBroadcaster(store)
+        return _change_broadcaster
+
+
+# Balance reconciliation report, kept up to date incrementally between requests
+_reconciler = None
+_reconciler_lock = threading.Lock()
+
+
+def get_reconciler():
+    """Get the reconciler for the current store"""
+    global _reconciler
+    with _reconciler_lock:
+        if _reconciler is None or _reconciler.store is not store:
+            _reconciler = BalanceReconciler(store)
+        return _reconciler
+
+
+DEFAULT_PAGE_SIZE = 100
+
+
+def readiness():
+    """
+    Get the /ready answer shared by both servers
+
+    Returns:
+        tuple: (status code, body, extra headers or None)
+    """
+    if store_ready.is_set():
+        return 200, {'status': 'ready', 'transactions': store.count()}, None
+    if load_error:
+        return 503, {'status': 'failed', 'error': load_error}, None
+    return 503, {'status': 'loading'}, {'Retry-After': '1'}
+
+
+def not_ready_error():
+    """
+    Get the error answered to API requests before the store is ready
+
+    Returns:
+        tuple: (message, extra headers or None)
+    """
+    if load_error:
+        return 'Service unavailable - transactions failed to load', None
+    return 'Service starting - transactions are still loading', {'Retry-After': '1'}
+
+
+def parse_page(offset, limit):
+    """
+    Validate ?offset=&limit= paging parameters
+
+    Args:
+        offset (str): Query value, or None when absent
+        limit (str): Query value, or None when absent
+
+    Returns:
+        tuple: (offset, limit)
+
+    Raises:
+        ValueError: If either is not an integer or out of range
+    """
+    try:
+        offset = 0 if offset is None else int(offset)
+        limit = DEFAULT_PAGE_SIZE if limit is None else int(limit)
+    except ValueError:
+        offset = limit = None
+    if offset is None or offset < 0 or limit < 1:
+        raise ValueError('offset and limit must be non-negative integers')
+    return offset, limit
+
+
+def parse_issue_limit(limit):
+    """
+    Validate the ?limit= of the reconciliation report
+
+    Args:
+        limit (str): Query value, or None when absent
+
+    Returns:
+        int: Number of issues to include
+
+    Raises:
+        ValueError: If it is not a non-negative integer
+    """
+    try:
+        limit = DEFAULT_ISSUE_LIMIT if limit is None else int(limit)
+    except ValueError:
+        limit = -1
+    if limit < 0:
+        raise ValueError('limit must be a non-negative integer')
+    return limit
+
+
+def resolve_handlers():
+    """Import the CRUD handlers once instead of on every request"""
+    from api_crud_operations import handle_delete, handle_post, handle_put
+    CRUD_HANDLERS.update(POST=handle_post, PUT=handle_put, DELETE=handle_delete)
+
+
+def warm_up(backend=None):
+    """Create and load the store, then mark the server ready"""
+    global store, load_error
+    try:
+        if backend is not None and backend != STORE_BACKEND:
+            store = create_store(backend)
+        if store.count() == 0:
+            print(f"Loading data from {XML_PATH}...")
+            store.load_from_xml(XML_PATH)
+            print(f"Loaded {store.count()} transactions")
+        else:
+            # The database/partitions already hold the data from an earlier run
+            print(f"Using {store.count()} stored transactions")
+        resolve_handlers()
+    except Exception as e:
+        load_error = str(e)
+        print(f"❌ Failed to load transactions: {e}")
+        return
+    store_ready.set()
+
+
+def recalculate_stored_fees(backend=None):
+    """Load the store and recalculate its historical fees with the fee engine"""
+    warm_up(backend)
+    if not store_ready.is_set():
+        return
+    changed = store.recalculate_fees()
+    print(f"Recalculated fees: {changed} transactions changed")
+
+
+def start_warm_up(backend=None):
+    """Run warm_up() in a background thread"""
+    thread = threading.Thread(target=warm_up, args=(backend,), name='warm-up', daemon=True)
+    thread.start()
+    return thread
+
+
+class APIServer(HTTPServer):
+    """
+    HTTPServer handling requests on a bounded thread pool
+    
+    Connections that would wait behind more than MAX_QUEUED_CONNECTIONS others
+    get an immediate 503 instead of sitting in the queue until clients time
+    out. Connections can also be kept open after their request was handled.
+    """
+    
+    # Deep enough that bursts reach process_request rather than overflowing the
+    # kernel backlog, where dropped connections are only retried after a second
+    request_queue_size = 128
+    
+    def __init__(self, *args, threads=REQUEST_THREADS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.detached_requests = set()
+        self.max_pending = threads + MAX_QUEUED_CONNECTIONS
+        self.pending = 0
+        self._pending_lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='request')
+    
+    def process_request(self, request, client_address):
+        with self._pending_lock:
+            overloaded = self.pending >= self.max_pending
+            if not overloaded:
+                self.pending += 1
+        if overloaded:
+            try:
+                request.sendall(OVERLOADED_RESPONSE)
+            except OSError:
+                pass
+            self.shutdown_request(request)
+            return
+        self._pool.submit(self._process_request_thread, request, client_address)
+    
+    def _process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            with self._pending_lock:
+                self.pending -= 1
+    
+    def server_close(self):
+        super().server_close()
+        self._pool.shutdown(wait=False)
+    
+    def detach_request(self, request):
+        """Leave the connection open; its new owner closes it"""
+        self.detached_requests.add(request)
+    
+    def shutdown_request(self, request):
+        if request in self.detached_requests:
+            self.detached_requests.discard(request)
+            return
+        super().shutdown_request(request)
 
 
 class APIHandler(BaseHTTPRequestHandler):
     """HTTP request handler for the API"""
     
-    def _set_headers(self, status_code=200, content_type='application/json'):
+    quiet = False  # --quiet: no per-request log lines (e.g. under load tests)
+    
+    def handle_one_request(self):
+        self._admitted_cost = 0
+        try:
+            super().handle_one_request()
+        finally:
+            admission.release(self._admitted_cost)
+    
+    def parse_request(self):
+        """Parse the request line and headers, then apply rate limits and admission"""
+        if not super().parse_request():
+            return False
+        
+        url = urlparse(self.path)
+        cost = route_cost(self.command, url.path, url.query)
+        if cost > CHEAP_COST and self.command == 'GET' and self._is_cached():
+            cost = CHEAP_COST  # Only the cached body has to be sent
+        client = client_key(authenticated_user(self.headers.get('Authorization')),
+                            self.client_address[0])
+        wait = rate_limiter.consume(client, cost)
+        if wait:
+            self._send_error_response(429, 'Too many requests - slow down',
+                                      {'Retry-After': retry_after(wait)})
+            return False
+        if not admission.try_acquire(cost):
+            self._send_error_response(503, 'Server busy - retry later',
+                                      {'Retry-After': retry_after(0)})
+            return False
+        self._admitted_cost = cost
+        return True
+    
+    def _set_headers(self, status_code=200, content_type='application/json', headers=None):
         """Set response headers"""
         self.send_response(status_code)
         self.send_header('Content-Type', content_type)
+        self.send_header('Vary', 'Accept-Encoding')
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, PUT, DELETE, OPTIONS')
         self.send_header('Access-Control-Allow-Headers', 'Content-Type, Authorization')
         self.end_headers()
     
-    def _send_json_response(self, data, status_code=200):
-        """Send JSON response"""
-        self._set_headers(status_code)
-        self.wfile.write(json.dumps(data, indent=2).encode())
+    def _send_json_response(self, data, status_code=200, headers=None, cache_key=None):
+        """
+        Send JSON response, compressed if the client accepts gzip/deflate
+        
+        cache_key: (path, store version) under which to keep the encoded body
+        """
+        encoding = negotiate_encoding(self.headers.get('Accept-Encoding'))
+        body, applied = compress(json.dumps(data, indent=2).encode(), encoding)
+        if cache_key is not None and status_code == 200:
+            response_cache.put(cache_key[0], encoding, cache_key[1], body, applied)
+        self._send_body(body, applied, status_code, headers)
+    
+    def _is_cached(self):
+        """Check whether this GET can be answered from the response cache"""
+        if not store_ready.is_set():
+            return False
+        encoding = negotiate_encoding(self.headers.get('Accept-Encoding'))
+        return response_cache.get(self.path, encoding, store.version) is not None
     
-    def _send_error_response(self, status_code, message):
+    def _send_cached_response(self, cache_key):
+        """Send a body cached for this path and store version; False if there is none"""
+        encoding = negotiate_encoding(self.headers.get('Accept-Encoding'))
+        cached = response_cache.get(cache_key[0], encoding, cache_key[1])
+        if cached is None:
+            return False
+        self._send_body(*cached)
+        return True
+    
+    def _send_body(self, body, encoding=None, status_code=200, headers=None):
+        """Send an encoded JSON body"""
+        headers = dict(headers or {})
+        if encoding:
+            headers['Content-Encoding'] = encoding
+        headers['Content-Length'] = str(len(body))
+        self._set_headers(status_code, headers=headers)
+        self.wfile.write(body)
+    
+    def _send_error_response(self, status_code, message, headers=None):
         """Send error response"""
         self._send_json_response({
             'error': message,
             'status_code': status_code
-        }, status_code)
+        }, status_code, headers)
+    
+    def _check_ready(self):
+        """Answer 503 while the store is still loading"""
+        if store_ready.is_set():
+            return True
+        self._send_error_response(503, *not_ready_error())
+        return False
+    
+    def _stream_changes(self, query):
+        """GET /transactions/changes - Server-Sent Events of store changes"""
+        since = self.headers.get('Last-Event-ID') or query.get('since', [None])[0]
+        try:
+            since = int(since) if since is not None else None
+        except ValueError:
+            self._send_error_response(400, 'since must be an integer sequence number')
+            return
+        
+        self._set_headers(200, SSE_CONTENT_TYPE, SSE_HEADERS)
+        self.wfile.flush()
+        # The broadcaster thread owns the connection from here on
+        self.server.detach_request(self.connection)
+        get_change_broadcaster().subscribe(self.connection, since)
+    
+    def _stream_list(self, transactions):
+        """GET /transactions - JSON list written as it is read from the store"""
+        encoding = negotiate_encoding(self.headers.get('Accept-Encoding'))
+        headers = {'Content-Encoding': encoding} if encoding else None
+        # No Content-Length: the body ends when the connection closes
+        self.close_connection = True
+        self._set_headers(200, headers=headers)
+        try:
+            for chunk in compress_stream(iter_transaction_list(transactions), encoding):
+                self.wfile.write(chunk)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # Client stopped reading
+    
+    def _stream_export(self, query):
+        """GET /transactions/export - CSV/NDJSON rows written as they are encoded"""
+        try:
+            export_format, start_ms, end_ms, types = parse_export_query(query)
+        except ValueError as e:
+            self._send_error_response(400, str(e))
+            return
+        
+        if start_ms is None and end_ms is None:
+            transactions = store.iter_all()
+        else:
+            transactions = store.iter_range(start_ms, end_ms)
+        encoding = negotiate_encoding(self.headers.get('Accept-Encoding'))
+        headers = export_headers(export_format)
+        if encoding:
+            headers['Content-Encoding'] = encoding
+        # No Content-Length: the body ends when the connection closes
+        self.close_connection = True
+        self._set_headers(200, EXPORT_FORMATS[export_format], headers)
+        try:
+            for chunk in compress_stream(iter_export(transactions, export_format, types), encoding):
+                self.wfile.write(chunk)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # Client stopped reading
+    
+    def _send_readiness(self):
+        """GET /ready - 200 once the store is loaded, 503 before"""
+        status_code, body, headers = readiness()
+        self._send_json_response(body, status_code, headers)
     
     def _check_authentication(self):
         """Check Basic Authentication"""
         auth_header = self.headers.get('Authorization')
         
         if not auth_header:
-            print("❌ Authentication failed: No Authorization header")
+            self.log_message("Authentication failed: No Authorization header")
             return False
         
         try:
@@ -112,29 +609,22 @@ class APIHandler(BaseHTTPRequestHandler):
             auth_type, credentials = auth_header.split(' ', 1)
             
             if auth_type.lower() != 'basic':
-                print("❌ Authentication failed: Not Basic Auth")
+                self.log_message("Authentication failed: Not Basic Auth")
                 return False
             
             # Decode credentials
             decoded = base64.b64decode(credentials).decode('utf-8')
             username, password = decoded.split(':', 1)
             
-            # Check credentials (hardcoded for demo - INSECURE!)
-            # In production, use hashed passwords and database
-            VALID_USERNAME = 'admin'
-            VALID_PASSWORD = 'momo2024'
-            
-            is_valid = (username == VALID_USERNAME and password == VALID_PASSWORD)
-            
-            if is_valid:
-                print(f"✅ Authentication successful: {username}")
-            else:
-                print(f"❌ Authentication failed: Invalid credentials (username={username})")
+            # Successful logins show up in the request log line
+            is_valid = verify_credentials(username, password)
+            if not is_valid:
+                self.log_message("Authentication failed: Invalid credentials (username=%s)", username)
             
             return is_valid
         
         except Exception as e:
-            print(f"❌ Authentication error: {e}")
+            self.log_message("Authentication error: %s", e)
             return False
     
     def do_OPTIONS(self):
@@ -143,21 +633,97 @@ class APIHandler(BaseHTTPRequestHandler):
     
     def do_GET(self):
         """Handle GET requests"""
+        url = urlparse(self.path)
+        
+        # Probes for load balancers/orchestrators, no authentication
+        if url.path == '/health':
+            self._send_json_response({'status': 'ok'})
+            return
+        if url.path == '/ready':
+            self._send_readiness()
+            return
+        
         # Check authentication
         if not self._check_authentication():
             self._send_error_response(401, 'Unauthorized - Invalid or missing credentials')
             return
+        if not self._check_ready():
+            return
+        
+        # GET /transactions/changes?since=N - Change feed (not cached)
+        if url.path == '/transactions/changes':
+            self._stream_changes(parse_qs(url.query))
+            return
+        
+        # GET /transactions/export?format=csv&type=PAYMENT - Streamed rows (not cached)
+        if url.path == '/transactions/export':
+            self._stream_export(parse_qs(url.query))
+            return
+        
+        # Responses depend only on the URL and the store contents
+        cache_key = (self.path, store.version)
+        if self._send_cached_response(cache_key):
+            return
         
         # Parse path
-        path_parts = self.path.split('/')
+        path_parts = url.path.split('/')
         
         # GET /transactions - List all transactions
-        if self.path == '/transactions' or self.path == '/transactions/':
-            transactions = store.get_all()
+        if url.path == '/transactions' or url.path == '/transactions/':
+            query = parse_qs(url.query)
+            try:
+                # GET /transactions?start=2024-05-01&end=2024-06-01 - Date range
+                start_ms, end_ms = parse_time_range(query)
+            except ValueError as e:
+                self._send_error_response(400, str(e))
+                return
+            is_range = start_ms is not None or end_ms is not None
+            
+            if 'limit' in query or 'offset' in query:
+                # GET /transactions?offset=0&limit=100 - One page of transactions
+                try:
+                    offset, limit = parse_page(query.get('offset', [None])[0],
+                                               query.get('limit', [None])[0])
+                except ValueError as e:
+                    self._send_error_response(400, str(e))
+                    return
+                
+                if is_range:
+                    total = store.count_range(start_ms, end_ms)
+                    transactions = store.get_range_page(start_ms, end_ms, offset, limit)
+                else:
+                    total = store.count()
+                    transactions = store.get_page(offset, limit)
+                self._send_json_response({
+                    'count': len(transactions),
+                    'total': total,
+                    'offset': offset,
+                    'limit': limit,
+                    'transactions': transactions
+                }, cache_key=cache_key)
+                return
+            
+            if getattr(store, 'stream_lists', False):
+                # Too large to build, encode and cache in one piece
+                self._stream_list(store.iter_range(start_ms, end_ms) if is_range
+                                  else store.iter_all())
+                return
+            
+            transactions = store.get_range(start_ms, end_ms) if is_range else store.get_all()
             self._send_json_response({
                 'count': len(transactions),
                 'transactions': transactions
-            })
+            }, cache_key=cache_key)
+            return
+        
+        # GET /transactions/reconciliation?limit=N - Balance reconciliation report
+        elif url.path == '/transactions/reconciliation':
+            try:
+                limit = parse_issue_limit(parse_qs(url.query).get('limit', [None])[0])
+            except ValueError as e:
+                self._send_error_response(400, str(e))
+                return
+            self._send_json_response(get_reconciler().report(limit), cache_key=cache_key)
             return
         
         # GET /transactions/{id} - Get single transaction
@@ -167,7 +733,7 @@ class APIHandler(BaseHTTPRequestHandler):
                 transaction = store.get_by_id(trans_id)
                 
                 if transaction:
-                    self._send_json_response(transaction)
+                    self._send_json_response(transaction, cache_key=cache_key)
                 else:
                     self._send_error_response(404, f'Transaction with ID {trans_id} not found')
             
@@ -181,42 +747,65 @@ class APIHandler(BaseHTTPRequestHandler):
     
     def do_POST(self):
         """Handle POST requests - implemented by Person 3"""
-        from api_crud_operations import handle_post
-        handle_post(self, store)
+        if self._check_ready():
+            CRUD_HANDLERS['POST'](self, store)
     
     def do_PUT(self):
         """Handle PUT requests - implemented by Person 3"""
-        from api_crud_operations import handle_put
-        handle_put(self, store)
+        if self._check_ready():
+            CRUD_HANDLERS['PUT'](self, store)
     
     def do_DELETE(self):
         """Handle DELETE requests - implemented by Person 3"""
-        from api_crud_operations import handle_delete
-        handle_delete(self, store)
+        if self._check_ready():
+            CRUD_HANDLERS['DELETE'](self, store)
     
     def log_message(self, format, *args):
         """Custom log message format"""
+        if self.quiet:
+            return
         print(f"[{self.log_date_time_string()}] {format % args}")
 
 
-def run_server(port=8000):
+def run_server(port=8000, workers=1, backend=None):
     """Start the API server"""
-    # Load data
-    xml_path = os.path.join(os.path.dirname(__file__), '..', 'modified_sms_v2.xml')
-    print(f"Loading data from {xml_path}...")
-    store.load_from_xml(xml_path)
-    print(f"Loaded {len(store.get_all())} transactions")
+    global store
+    
+    if workers > 1:
+        # Pre-forked workers need the data before forking, so load it first
+        if (backend or STORE_BACKEND) == 'partitioned':
+            # Each process would cache its own, diverging copy of the partitions
+            raise ValueError("--workers requires the memory or sqlite store")
+        from prefork_server import run_prefork_server
+        if backend is not None and backend != STORE_BACKEND:
+            store = create_store(backend)
+        
+        if isinstance(store, TransactionStore):
+            # Workers share one memory-mapped snapshot of the XML
+            print(f"Loading data from {XML_PATH}...")
+            run_prefork_server(XML_PATH, port, workers)
+        else:
+            # Workers each open their own connection to the database
+            warm_up()
+            if not store_ready.is_set():
+                return
+            run_prefork_server(XML_PATH, port, workers, shared_store=store)
+        return
     
-    # Start server
+    # Bind first so the port answers while the data loads
     server_address = ('', port)
-    httpd = HTTPServer(server_address, APIHandler)
+    httpd = APIServer(server_address, APIHandler)
+    start_warm_up(backend)
     
     print(f"\n{'='*60}")
     print(f"MoMo SMS REST API Server")
     print(f"{'='*60}")
     print(f"Server running on http://localhost:{port}")
     print(f"\nAvailable endpoints:")
-    print(f"  GET    /transactions      - List all transactions")
+    print(f"  GET    /health            - Liveness probe (no auth)")
+    print(f"  GET    /ready             - 200 once transactions are loaded (no auth)")
+    print(f"  GET    /transactions      - List all transactions (?start=&end= date range)")
+    print(f"  GET    /transactions/changes - Change feed (Server-Sent Events)")
     print(f"  GET    /transactions/{{id}} - Get transaction by ID")
     print(f"  POST   /transactions      - Create new transaction")
     print(f"  PUT    /transactions/{{id}} - Update transaction")
@@ -235,4 +824,22 @@ def run_server(port=8000):
 
 
 if __name__ == '__main__':
-    run_server()
+    import argparse
+    parser = argparse.ArgumentParser(description='MoMo SMS REST API Server')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Number of worker processes (default: 1)')
+    parser.add_argument('--store', choices=['memory', 'sqlite', 'partitioned'], default=STORE_BACKEND,
+                        help='Storage backend (default: $MOMO_STORE or memory)')
+    parser.add_argument('--recalculate-fees', action='store_true',
+                        help='Recalculate stored fees with the fee engine and exit')
+    parser.add_argument('--quiet', action='store_true',
+                        help='Do not log each request or failed login')
+    args = parser.parse_args()
+    APIHandler.quiet = args.quiet
+    if args.recalculate_fees:
+        if args.store == 'memory':
+            parser.error('--recalculate-fees needs the sqlite or partitioned store')
+        recalculate_stored_fees(args.store)
+    else:
+        run_server(args.port, args.workers, args.store)
@@ -1,6 +1,337 @@
-from fastapi import FastAPI
+"""
+MoMo SMS FastAPI Application
+Async version of the REST API, serving the same TransactionStore as api_server.py
+"""
 
-app = FastAPI(title="MoMo SMS Serialization API")
+import base64
+import json
+import os
+import sys
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from fastapi import Depends, FastAPI, HTTPException, Request
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
+
+sys.path.append(os.path.dirname(__file__))
+from admission import client_key, retry_after, route_cost
+from api_server import (admission, authenticated_user, get_reconciler, not_ready_error,
+                        parse_issue_limit, parse_page, rate_limiter, readiness, start_warm_up,
+                        store, store_ready, verify_credentials)
+from api_crud_operations import apply_transaction_defaults, validate_transaction_data
+from change_feed import HEARTBEAT_INTERVAL, SSE_CONTENT_TYPE, SSE_HEADERS, AsyncChangeBroadcaster
+from compression import MIN_COMPRESS_SIZE
+from export import (EXPORT_FORMATS, export_headers, iter_export, iter_transaction_list,
+                    parse_export_query)
+from schemas import (DeleteMessage, ErrorResponse, ReconciliationReport, Transaction,
+                     TransactionList, TransactionMessage)
+from timestamps import parse_time_range
+
+try:
+    # orjson serializes the transaction list several times faster than json
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response rendered with orjson when it is installed"""
+
+    def render(self, content):
+        if orjson is None:
+            return super().render(content)
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Load the XML data in the background, unless the store is already populated"""
+    start_warm_up()
+    yield
+
+
+app = FastAPI(title="MoMo SMS Serialization API", default_response_class=FastJSONResponse,
+              lifespan=lifespan)
+# Same size threshold as api_server.py (gzip only; no per-version body cache here)
+app.add_middleware(GZipMiddleware, minimum_size=MIN_COMPRESS_SIZE)
+
+ERROR_RESPONSES = {
+    400: {"model": ErrorResponse},
+    401: {"model": ErrorResponse},
+    404: {"model": ErrorResponse},
+    429: {"model": ErrorResponse},
+    503: {"model": ErrorResponse},
+}
+
+
+@app.middleware("http")
+async def admission_control(request: Request, call_next):
+    """Per-client rate limits and cost-weighted in-flight limit, as in api_server.py"""
+    cost = route_cost(request.method, request.url.path, request.url.query)
+    client = client_key(authenticated_user(request.headers.get('Authorization')),
+                        request.client.host if request.client else None)
+    wait = rate_limiter.consume(client, cost)
+    if wait:
+        return FastJSONResponse({"error": "Too many requests - slow down", "status_code": 429},
+                                status_code=429, headers={"Retry-After": retry_after(wait)})
+    # Waiting for capacity blocks, so only leave the event loop when it is needed
+    if not (admission.try_acquire(cost, timeout=0)
+            or await run_in_threadpool(admission.try_acquire, cost)):
+        return FastJSONResponse({"error": "Server busy - retry later", "status_code": 503},
+                                status_code=503, headers={"Retry-After": retry_after(0)})
+    try:
+        response = await call_next(request)
+    except BaseException:
+        admission.release(cost)
+        raise
+    if response.headers.get("content-type", "").startswith(SSE_CONTENT_TYPE):
+        # Change feed subscribers stay connected but cost nothing while they
+        # wait, so release now (the stdlib server detaches them the same way)
+        admission.release(cost)
+        return response
+    # Streamed bodies (exports, lists) are sent after call_next returns
+    response.body_iterator = release_after(response.body_iterator, cost)
+    return response
+
+
+async def release_after(body_iterator, cost):
+    """Hold a request's admitted cost until its body has been sent (or the client left)"""
+    try:
+        async for chunk in body_iterator:
+            yield chunk
+    finally:
+        admission.release(cost)
+
+
+@app.exception_handler(HTTPException)
+async def http_error_handler(request, exc):
+    """Keep the same error body as the stdlib server"""
+    return FastJSONResponse(
+        {"error": exc.detail, "status_code": exc.status_code},
+        status_code=exc.status_code,
+        headers=getattr(exc, "headers", None),
+    )
+
+
+async def require_auth(request: Request):
+    """Check Basic Authentication"""
+    auth_header = request.headers.get('Authorization')
+    try:
+        auth_type, credentials = auth_header.split(' ', 1)
+        username, password = base64.b64decode(credentials).decode('utf-8').split(':', 1)
+        is_valid = auth_type.lower() == 'basic' and verify_credentials(username, password)
+    except Exception:
+        is_valid = False
+
+    if not is_valid:
+        raise HTTPException(401, 'Unauthorized - Invalid or missing credentials')
+
+
+async def require_ready():
+    """Answer 503 while the store is still loading"""
+    if not store_ready.is_set():
+        message, headers = not_ready_error()
+        raise HTTPException(503, message, headers=headers)
+
+
+TRANSACTION_DEPENDENCIES = [Depends(require_auth), Depends(require_ready)]
+
+
+async def read_json_body(request: Request):
+    """Parse the request body as JSON"""
+    try:
+        data = json.loads(await request.body())
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        raise HTTPException(400, 'Invalid JSON in request body')
+    if not isinstance(data, dict):
+        raise HTTPException(400, 'Invalid JSON in request body')
+    return data
+
+
+@app.get("/health")
+async def health():
+    return {"status": "ok"}
+
+
+@app.get("/ready")
+def ready():
+    status_code, body, headers = readiness()
+    return FastJSONResponse(body, status_code=status_code, headers=headers)
+
+
+@app.get("/transactions", response_model=TransactionList,
+         responses=ERROR_RESPONSES, dependencies=TRANSACTION_DEPENDENCIES)
+def list_transactions(offset: Optional[str] = None, limit: Optional[str] = None,
+                      start: Optional[str] = None, end: Optional[str] = None):
+    """List transactions (sync: store reads may block on SQLite, so they run in the threadpool)"""
+    query = {name: [value] for name, value in (("start", start), ("end", end)) if value is not None}
+    try:
+        start_ms, end_ms = parse_time_range(query)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    is_range = start_ms is not None or end_ms is not None
+
+    if offset is not None or limit is not None:
+        try:
+            offset, limit = parse_page(offset, limit)
+        except ValueError as e:
+            raise HTTPException(400, str(e))
+        if is_range:
+            total = store.count_range(start_ms, end_ms)
+            transactions = store.get_range_page(start_ms, end_ms, offset, limit)
+        else:
+            total = store.count()
+            transactions = store.get_page(offset, limit)
+        return FastJSONResponse({
+            "count": len(transactions),
+            "total": total,
+            "offset": offset,
+            "limit": limit,
+            "transactions": transactions
+        })
+
+    if getattr(store, "stream_lists", False):
+        # A sync iterator, so Starlette reads the store from its threadpool
+        return StreamingResponse(iter_transaction_list(store.iter_range(start_ms, end_ms) if is_range
+                                                       else store.iter_all()),
+                                 media_type="application/json")
+
+    transactions = store.get_range(start_ms, end_ms) if is_range else store.get_all()
+    # Returning the response directly skips per-item model validation
+    return FastJSONResponse({"count": len(transactions), "transactions": transactions})
+
+
+_change_broadcaster = None
+
+
+def get_change_broadcaster():
+    """Get the broadcaster for the current store; one polling task serves every subscriber"""
+    global _change_broadcaster
+    if _change_broadcaster is None or _change_broadcaster.store is not store:
+        _change_broadcaster = AsyncChangeBroadcaster(store)
+    return _change_broadcaster
+
+
+@app.get("/transactions/changes", responses=ERROR_RESPONSES,
+         dependencies=TRANSACTION_DEPENDENCIES)
+async def transaction_changes(request: Request, since: Optional[int] = None):
+    """Server-Sent Events of store changes, resumable with Last-Event-ID or ?since="""
+    last_event_id = request.headers.get("Last-Event-ID")
+    if last_event_id is not None:
+        try:
+            since = int(last_event_id)
+        except ValueError:
+            raise HTTPException(400, 'since must be an integer sequence number')
+
+    broadcaster = get_change_broadcaster()
+    subscriber = await broadcaster.subscribe(since)
+
+    async def stream():
+        try:
+            while True:
+                data = await subscriber.get(timeout=HEARTBEAT_INTERVAL)
+                if data is None:
+                    return
+                # Heartbeats also let Starlette notice clients that left
+                yield data or b": keep-alive\n\n"
+        finally:
+            broadcaster.unsubscribe(subscriber)
+
+    return StreamingResponse(stream(), media_type=SSE_CONTENT_TYPE, headers=SSE_HEADERS)
+
+
+@app.get("/transactions/export", responses=ERROR_RESPONSES,
+         dependencies=TRANSACTION_DEPENDENCIES)
+async def export_transactions(request: Request):
+    """Stream transactions as CSV or NDJSON (?format=, ?start=, ?end=, ?type=)"""
+    query = {name: request.query_params.getlist(name) for name in request.query_params}
+    try:
+        export_format, start_ms, end_ms, types = parse_export_query(query)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    if start_ms is None and end_ms is None:
+        transactions = store.iter_all()
+    else:
+        transactions = store.iter_range(start_ms, end_ms)
+    # A sync iterator, so Starlette reads the store from its threadpool
+    return StreamingResponse(iter_export(transactions, export_format, types),
+                             media_type=EXPORT_FORMATS[export_format],
+                             headers=export_headers(export_format))
+
+
+@app.get("/transactions/reconciliation", response_model=ReconciliationReport,
+         responses=ERROR_RESPONSES, dependencies=TRANSACTION_DEPENDENCIES)
+def reconciliation_report(limit: Optional[str] = None):
+    """Balance reconciliation report (sync: a full run is CPU-bound, so it uses the threadpool)"""
+    try:
+        limit = parse_issue_limit(limit)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    return FastJSONResponse(get_reconciler().report(limit))
+
+
+@app.get("/transactions/{trans_id}", response_model=Transaction,
+         responses=ERROR_RESPONSES, dependencies=TRANSACTION_DEPENDENCIES)
+def get_transaction(trans_id: str):
+    transaction = store.get_by_id(parse_transaction_id(trans_id))
+    if transaction is None:
+        raise HTTPException(404, f'Transaction with ID {trans_id} not found')
+    return FastJSONResponse(transaction)
+
+
+@app.post("/transactions", status_code=201, response_model=TransactionMessage,
+          responses=ERROR_RESPONSES, dependencies=TRANSACTION_DEPENDENCIES)
+async def create_transaction(request: Request):
+    data = await read_json_body(request)
+    is_valid, error_msg = validate_transaction_data(data)
+    if not is_valid:
+        raise HTTPException(400, error_msg)
+
+    new_transaction = await run_in_threadpool(store.add, apply_transaction_defaults(data))
+    return FastJSONResponse({
+        "message": "Transaction created successfully",
+        "transaction": new_transaction
+    }, status_code=201)
+
+
+@app.put("/transactions/{trans_id}", response_model=TransactionMessage,
+         responses=ERROR_RESPONSES, dependencies=TRANSACTION_DEPENDENCIES)
+async def update_transaction(trans_id: str, request: Request):
+    trans_id = parse_transaction_id(trans_id)
+    data = await read_json_body(request)
+    is_valid, error_msg = validate_transaction_data(data, is_update=True)
+    if not is_valid:
+        raise HTTPException(400, error_msg)
+
+    updated_transaction = await run_in_threadpool(store.update, trans_id, data)
+    if updated_transaction is None:
+        raise HTTPException(404, f'Transaction with ID {trans_id} not found')
+    return FastJSONResponse({
+        "message": "Transaction updated successfully",
+        "transaction": updated_transaction
+    })
+
+
+@app.delete("/transactions/{trans_id}", response_model=DeleteMessage,
+            responses=ERROR_RESPONSES, dependencies=TRANSACTION_DEPENDENCIES)
+def delete_transaction(trans_id: str):
+    trans_id = parse_transaction_id(trans_id)
+    if not store.delete(trans_id):
+        raise HTTPException(404, f'Transaction with ID {trans_id} not found')
+    return FastJSONResponse({
+        "message": f"Transaction {trans_id} deleted successfully",
+        "id": trans_id
+    })
+
+
+def parse_transaction_id(trans_id):
+    """Convert a path segment to an integer transaction ID"""
+    try:
+        return int(trans_id)
+    except ValueError:
+        raise HTTPException(400, 'Invalid transaction ID - must be an integer')
 
 
 @app.get("/api/database-test")
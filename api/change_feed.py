@@ -0,0 +1,400 @@
+"""
+Transaction Change Feed
+Mutation events recorded by the stores and streamed to clients as Server-Sent Events
+
+Every create/update/delete gets an increasing sequence number. Clients send the
+last number they saw (Last-Event-ID, or ?since=) when they reconnect and
+receive everything after it; if that is older than the retained history they
+get a 'reset' event and should re-fetch /transactions.
+
+One broadcaster thread serves all subscribers: their sockets are non-blocking
+and multiplexed with selectors, and each event is encoded once and queued to
+every subscriber. AsyncChangeBroadcaster does the same for the FastAPI app with
+one polling task and a queue per subscriber.
+"""
+
+import asyncio
+import json
+import selectors
+import socket
+import threading
+import time
+from collections import deque
+
+MAX_EVENTS = 10_000  # History kept for catching up
+POLL_INTERVAL = 1.0  # seconds; picks up writes made by other processes
+HEARTBEAT_INTERVAL = 15.0  # seconds; keeps proxies open and detects dead clients
+MAX_PENDING_BYTES = 1024 * 1024  # Slow subscribers are dropped and must reconnect
+
+SSE_CONTENT_TYPE = 'text/event-stream'
+SSE_HEADERS = {
+    'Cache-Control': 'no-cache',
+    'X-Accel-Buffering': 'no',  # Don't let nginx buffer the stream
+}
+
+
+class ChangeLog:
+    """Bounded, in-memory history of mutation events"""
+
+    def __init__(self, max_events=MAX_EVENTS):
+        self.events = deque(maxlen=max_events)
+        self.last_seq = 0
+        self.discarded_seq = 0  # Newest sequence number no longer in the history
+        self.listeners = []  # Called after every recorded event
+        self._lock = threading.Lock()
+
+    def record(self, op, trans_id=None, transaction=None, seq=None):
+        """
+        Record a mutation
+
+        Args:
+            op (str): 'create', 'update', 'delete' or 'reset' (everything changed)
+            trans_id (int): Affected transaction
+            transaction (dict): New state, for create/update
+            seq (int): Sequence number to use (must increase); defaults to the next one
+
+        Returns:
+            int: The event's sequence number
+        """
+        with self._lock:
+            self.last_seq = seq if seq is not None else self.last_seq + 1
+            if len(self.events) == self.events.maxlen:
+                self.discarded_seq = self.events[0]['seq']
+            self.events.append({
+                'seq': self.last_seq,
+                'op': op,
+                'id': trans_id,
+                'transaction': dict(transaction) if transaction is not None else None,
+            })
+            seq = self.last_seq
+        for listener in self.listeners:
+            listener()
+        return seq
+
+    def since(self, seq):
+        """
+        Get the events after a sequence number
+
+        Returns:
+            list or None: Events in order, or None if the client must re-fetch
+                (some were already discarded, or seq is from before a restart)
+        """
+        with self._lock:
+            if seq == self.last_seq:
+                return []
+            if seq < self.discarded_seq or seq > self.last_seq:
+                return None
+            return [event for event in self.events if event['seq'] > seq]
+
+
+def format_event(event):
+    """Encode a change event as an SSE message"""
+    data = json.dumps(event, separators=(',', ':'))
+    return f"id: {event['seq']}\nevent: {event['op']}\ndata: {data}\n\n".encode()
+
+
+def format_reset(seq):
+    """SSE message telling the client to re-fetch everything"""
+    return format_event({'seq': seq, 'op': 'reset', 'id': None, 'transaction': None})
+
+
+class Subscriber:
+    """A client connection and the bytes still to be written to it"""
+
+    def __init__(self, sock, since):
+        self.sock = sock
+        self.since = since
+        self.pending = bytearray()
+
+
+class ChangeBroadcaster:
+    """Streams store change events to any number of SSE subscribers from one thread"""
+
+    def __init__(self, store, poll_interval=POLL_INTERVAL, heartbeat_interval=HEARTBEAT_INTERVAL):
+        """
+        Args:
+            store: Transaction store providing changes_since(), last_change_seq()
+                and change_listeners
+            poll_interval (float): Seconds between checks for writes from other processes
+            heartbeat_interval (float): Seconds between keep-alive comments
+        """
+        self.store = store
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.last_seq = store.last_change_seq()
+        self.subscribers = {}  # socket -> Subscriber
+        self._new_subscribers = deque()
+        self._selector = selectors.DefaultSelector()
+        self._wake_reader, self._wake_writer = socket.socketpair()
+        self._wake_reader.setblocking(False)
+        self._wake_writer.setblocking(False)
+        self._selector.register(self._wake_reader, selectors.EVENT_READ)
+        store.change_listeners.append(self.notify)
+        self._thread = threading.Thread(target=self._run, name='change-feed', daemon=True)
+        self._thread.start()
+
+    def notify(self):
+        """Wake the broadcaster thread (called by the store after a change)"""
+        try:
+            self._wake_writer.send(b'\0')
+        except BlockingIOError:
+            pass  # A wake-up is already pending
+
+    def subscribe(self, sock, since=None):
+        """
+        Hand over a client socket whose SSE response headers were already sent
+
+        Args:
+            sock (socket.socket): Client connection
+            since (int): Last sequence number the client saw, or None for new events only
+        """
+        sock.setblocking(False)
+        self._new_subscribers.append(Subscriber(sock, since))
+        self.notify()
+
+    def _run(self):
+        last_heartbeat = time.monotonic()
+        while True:
+            for key, mask in self._selector.select(self.poll_interval):
+                if key.fileobj is self._wake_reader:
+                    try:
+                        while self._wake_reader.recv(4096):
+                            pass
+                    except BlockingIOError:
+                        pass
+                    continue
+                if mask & selectors.EVENT_READ:
+                    self._read(key.fileobj)
+                if mask & selectors.EVENT_WRITE:
+                    self._flush(self.subscribers.get(key.fileobj))
+
+            self._publish_new_events()
+            while self._new_subscribers:
+                self._add(self._new_subscribers.popleft())
+
+            if time.monotonic() - last_heartbeat >= self.heartbeat_interval:
+                last_heartbeat = time.monotonic()
+                for subscriber in list(self.subscribers.values()):
+                    self._send(subscriber, b': keep-alive\n\n')
+
+    def _publish_new_events(self):
+        """Queue events recorded since the last round to every subscriber"""
+        events = self.store.changes_since(self.last_seq)
+        if events is None:
+            # Too far behind the retained history; everyone must re-fetch
+            self.last_seq = self.store.last_change_seq()
+            messages = [format_reset(self.last_seq)]
+        else:
+            if not events:
+                return
+            self.last_seq = events[-1]['seq']
+            messages = [format_event(event) for event in events]
+
+        payload = b''.join(messages)
+        for subscriber in list(self.subscribers.values()):
+            self._send(subscriber, payload)
+
+    def _add(self, subscriber):
+        """Send a new subscriber what it missed, then include it in the live stream"""
+        self.subscribers[subscriber.sock] = subscriber
+        self._selector.register(subscriber.sock, selectors.EVENT_READ)
+        self._send(subscriber, b'retry: 2000\n\n')
+        if subscriber.since is None or subscriber.since == self.last_seq:
+            return
+
+        missed = self.store.changes_since(subscriber.since)
+        if missed is None:
+            self._send(subscriber, format_reset(self.last_seq))
+            return
+        self._send(subscriber, b''.join(
+            format_event(event) for event in missed if event['seq'] <= self.last_seq
+        ))
+
+    def _send(self, subscriber, data):
+        if subscriber is None or subscriber.sock not in self.subscribers:
+            return
+        subscriber.pending += data
+        if len(subscriber.pending) > MAX_PENDING_BYTES:
+            self._remove(subscriber.sock)
+            return
+        self._flush(subscriber)
+
+    def _flush(self, subscriber):
+        """Write as much pending data as the socket accepts"""
+        if subscriber is None or subscriber.sock not in self.subscribers:
+            return
+        try:
+            sent = subscriber.sock.send(subscriber.pending)
+        except BlockingIOError:
+            sent = 0
+        except OSError:
+            self._remove(subscriber.sock)
+            return
+        del subscriber.pending[:sent]
+
+        events = selectors.EVENT_READ
+        if subscriber.pending:
+            events |= selectors.EVENT_WRITE
+        self._selector.modify(subscriber.sock, events)
+
+    def _read(self, sock):
+        """Clients never send anything after the request; EOF means they left"""
+        try:
+            data = sock.recv(4096)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b''
+        if not data:
+            self._remove(sock)
+
+    def _remove(self, sock):
+        self.subscribers.pop(sock, None)
+        try:
+            self._selector.unregister(sock)
+        except (KeyError, ValueError):
+            pass
+        sock.close()
+
+
+class AsyncSubscriber:
+    """Queue of encoded events for one FastAPI change feed response"""
+
+    def __init__(self):
+        self.queue = asyncio.Queue()
+        self.pending = 0  # Bytes queued but not yet taken by the response
+
+    def put(self, data):
+        """Queue data; False if the subscriber fell too far behind"""
+        if self.pending + len(data) > MAX_PENDING_BYTES:
+            return False
+        self.pending += len(data)
+        self.queue.put_nowait(data)
+        return True
+
+    async def get(self, timeout=None):
+        """
+        Wait for the next data to send
+
+        Returns:
+            bytes or None: Data, b'' on timeout, or None once the subscriber was dropped
+        """
+        try:
+            data = await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return b''
+        if data is not None:
+            self.pending -= len(data)
+        return data
+
+
+class AsyncChangeBroadcaster:
+    """
+    Streams store change events to SSE subscribers from one asyncio task
+
+    The task polls the store only while someone is subscribed; store calls run
+    in worker threads so a slow SQLite read never blocks the event loop.
+    """
+
+    def __init__(self, store, poll_interval=POLL_INTERVAL):
+        """
+        Args:
+            store: Transaction store providing changes_since(), last_change_seq()
+                and change_listeners
+            poll_interval (float): Seconds between checks for writes from other processes
+        """
+        self.store = store
+        self.poll_interval = poll_interval
+        self.last_seq = None
+        self.subscribers = set()
+        self._loop = None
+        self._lock = None
+        self._wake = None
+        self._task = None
+        store.change_listeners.append(self.notify)
+
+    def notify(self):
+        """Wake the polling task (called by the store, from any thread, after a change)"""
+        loop = self._loop
+        if loop is None:
+            return
+        try:
+            loop.call_soon_threadsafe(self._wake.set)
+        except RuntimeError:
+            pass  # The event loop was closed
+
+    async def subscribe(self, since=None):
+        """
+        Add a subscriber, queueing what it missed since a sequence number
+
+        Args:
+            since (int): Last sequence number the client saw, or None for new events only
+
+        Returns:
+            AsyncSubscriber: Call unsubscribe() with it when the response ends
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # First use, or the app is running on a new event loop
+            self._loop = loop
+            self._lock = asyncio.Lock()
+            self._wake = asyncio.Event()
+            self._task = None
+            self.subscribers = set()
+
+        subscriber = AsyncSubscriber()
+        subscriber.put(b'retry: 2000\n\n')
+        # The lock keeps the poller from publishing between the catch-up and
+        # the subscriber joining the live stream
+        async with self._lock:
+            if self._task is None:
+                self.last_seq = await asyncio.to_thread(self.store.last_change_seq)
+                self._task = loop.create_task(self._run())
+
+            if since is not None and since != self.last_seq:
+                missed = await asyncio.to_thread(self.store.changes_since, since)
+                if missed is None:
+                    subscriber.put(format_reset(self.last_seq))
+                else:
+                    subscriber.put(b''.join(
+                        format_event(event) for event in missed if event['seq'] <= self.last_seq
+                    ))
+            self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        self.subscribers.discard(subscriber)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+            async with self._lock:
+                if not self.subscribers:
+                    # The next subscribe() starts a new task
+                    self._task = None
+                    return
+                await self._publish_new_events()
+
+    async def _publish_new_events(self):
+        """Queue events recorded since the last round to every subscriber"""
+        events = await asyncio.to_thread(self.store.changes_since, self.last_seq)
+        if events is None:
+            # Too far behind the retained history; everyone must re-fetch
+            self.last_seq = await asyncio.to_thread(self.store.last_change_seq)
+            payload = format_reset(self.last_seq)
+        else:
+            if not events:
+                return
+            self.last_seq = events[-1]['seq']
+            payload = b''.join(format_event(event) for event in events)
+
+        for subscriber in list(self.subscribers):
+            if not subscriber.put(payload):
+                # Slow subscribers are dropped and must reconnect
+                self.subscribers.discard(subscriber)
+                subscriber.queue.put_nowait(None)
@@ -0,0 +1,120 @@
+"""
+Response Compression
+Accept-Encoding negotiation and a cache of encoded response bodies
+
+Transaction lists compress roughly 10:1, but compressing them costs more than
+serving them, so encoded bodies are cached per request path and store version
+and reused until the store changes. Small bodies are sent uncompressed.
+"""
+
+import threading
+import zlib
+from collections import OrderedDict
+
+MIN_COMPRESS_SIZE = 1024  # bytes; below this the headers cost more than is saved
+COMPRESS_LEVEL = 6
+STREAM_COMPRESS_LEVEL = 1  # Streamed bodies aren't cached, so favour speed
+MAX_CACHED_RESPONSES = 64
+
+# zlib window bits for each supported Content-Encoding
+ENCODING_WBITS = {
+    'gzip': 16 + zlib.MAX_WBITS,
+    'deflate': zlib.MAX_WBITS,  # HTTP 'deflate' is the zlib format
+}
+
+
+def negotiate_encoding(accept_encoding):
+    """
+    Pick the Content-Encoding for a request
+
+    Args:
+        accept_encoding (str): Accept-Encoding header value, or None
+
+    Returns:
+        str or None: 'gzip', 'deflate', or None for identity
+    """
+    if not accept_encoding:
+        return None
+
+    qualities = {}
+    for item in accept_encoding.split(','):
+        name, _, params = item.strip().partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        qualities[name.strip().lower()] = quality
+
+    best = None
+    for encoding in ENCODING_WBITS:  # Preference order on ties: gzip, deflate
+        quality = qualities.get(encoding, qualities.get('*', 0.0))
+        if quality > 0 and (best is None or quality > best[1]):
+            best = (encoding, quality)
+    return best[0] if best else None
+
+
+def compress(body, encoding):
+    """
+    Encode a response body
+
+    Args:
+        body (bytes): Uncompressed body
+        encoding (str): Negotiated encoding, or None
+
+    Returns:
+        tuple: (body, encoding actually applied or None)
+    """
+    if encoding is None or len(body) < MIN_COMPRESS_SIZE:
+        return body, None
+    compressor = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, ENCODING_WBITS[encoding])
+    return compressor.compress(body) + compressor.flush(), encoding
+
+
+def compress_stream(chunks, encoding):
+    """
+    Encode a streamed response body chunk by chunk
+
+    Args:
+        chunks (iterable): Uncompressed body chunks
+        encoding (str): Negotiated encoding, or None
+
+    Yields:
+        bytes: Encoded chunks
+    """
+    if encoding is None:
+        yield from chunks
+        return
+    compressor = zlib.compressobj(STREAM_COMPRESS_LEVEL, zlib.DEFLATED, ENCODING_WBITS[encoding])
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+class ResponseCache:
+    """Encoded bodies keyed on (path, encoding), valid for one store version"""
+
+    def __init__(self, max_entries=MAX_CACHED_RESPONSES):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # (path, encoding) -> (version, body, applied encoding)
+        self._lock = threading.Lock()
+
+    def get(self, path, encoding, version):
+        """Get (body, applied encoding) if cached for this store version"""
+        with self._lock:
+            entry = self.entries.get((path, encoding))
+            if entry is None or entry[0] != version:
+                return None
+            self.entries.move_to_end((path, encoding))
+            return entry[1], entry[2]
+
+    def put(self, path, encoding, version, body, applied_encoding):
+        with self._lock:
+            self.entries[(path, encoding)] = (version, body, applied_encoding)
+            self.entries.move_to_end((path, encoding))
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
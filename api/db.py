@@ -0,0 +1,396 @@
+"""
+SQLite Transaction Store
+Disk-backed alternative to the in-memory TransactionStore in api_server.py
+
+Uses a local SQLite file with the transactions/categories tables of momo_db
+(database/database_setup.sql), adapted to SQLite types and extended with the
+SMS fields the API returns. Data survives restarts, so the server starts
+without re-parsing the XML, and memory use does not grow with the dataset.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+
+from change_feed import MAX_EVENTS
+from timestamps import timestamp_to_epoch_ms
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS categories (
+    category_id INTEGER PRIMARY KEY,
+    category_name TEXT NOT NULL,
+    category_type TEXT NOT NULL CHECK (category_type IN ('Income', 'Expense'))
+);
+
+CREATE TABLE IF NOT EXISTS transactions (
+    transaction_id INTEGER PRIMARY KEY,
+    txn_code TEXT,
+    category_id INTEGER REFERENCES categories(category_id),
+    amount REAL CHECK (amount >= 0),
+    transaction_date TEXT,
+    message TEXT,
+    type TEXT,
+    fee REAL,
+    new_balance REAL,
+    sender TEXT,
+    receiver TEXT,
+    status TEXT,
+    address TEXT,
+    readable_date TEXT,
+    read TEXT,
+    service_center TEXT,
+    body TEXT,
+    extra TEXT,
+    epoch_ms INTEGER
+);
+
+-- Change feed: one row per mutation, pruned to the latest MAX_EVENTS
+CREATE TABLE IF NOT EXISTS changes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    op TEXT NOT NULL,
+    transaction_id INTEGER,
+    data TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_txn_code ON transactions (txn_code);
+CREATE INDEX IF NOT EXISTS idx_category_id ON transactions (category_id);
+CREATE INDEX IF NOT EXISTS idx_transaction_date ON transactions (transaction_date);
+CREATE INDEX IF NOT EXISTS idx_type ON transactions (type);
+CREATE INDEX IF NOT EXISTS idx_epoch_ms ON transactions (epoch_ms);
+
+INSERT OR IGNORE INTO categories (category_id, category_name, category_type) VALUES
+    (1, 'Received Money', 'Income'),
+    (2, 'Sent Money', 'Expense'),
+    (3, 'Airtime', 'Expense'),
+    (4, 'Bill Payment', 'Expense'),
+    (5, 'Cashback', 'Income');
+"""
+
+# Transaction dictionary key -> transactions column
+FIELD_COLUMNS = [
+    ('id', 'transaction_id'),
+    ('txid', 'txn_code'),
+    ('category_id', 'category_id'),
+    ('amount', 'amount'),
+    ('timestamp', 'transaction_date'),
+    ('message', 'message'),
+    ('type', 'type'),
+    ('fee', 'fee'),
+    ('new_balance', 'new_balance'),
+    ('sender', 'sender'),
+    ('receiver', 'receiver'),
+    ('status', 'status'),
+    ('address', 'address'),
+    ('readable_date', 'readable_date'),
+    ('read', 'read'),
+    ('service_center', 'service_center'),
+    ('body', 'body'),
+]
+FIELDS = [field for field, _ in FIELD_COLUMNS]
+COLUMNS = [column for _, column in FIELD_COLUMNS] + ['extra']
+# transaction_date holds epoch milliseconds or ISO text; epoch_ms normalizes
+# it so date ranges can use an index
+WRITE_COLUMNS = COLUMNS + ['epoch_ms']
+
+SELECT_COLUMNS = ', '.join(COLUMNS)
+SELECT_BY_ID = f'SELECT {SELECT_COLUMNS} FROM transactions WHERE transaction_id = ?'
+SELECT_ALL = f'SELECT {SELECT_COLUMNS} FROM transactions ORDER BY transaction_id'
+SELECT_PAGE = SELECT_ALL + ' LIMIT ? OFFSET ?'
+# Keyset pages for iterators: each page is a separate statement, so no cursor
+# is held between pages (or tied to the thread that started the iteration)
+SELECT_ALL_AFTER = (f'SELECT {SELECT_COLUMNS} FROM transactions '
+                    f'WHERE transaction_id > ? ORDER BY transaction_id LIMIT ?')
+SELECT_RANGE_AFTER = (f'SELECT epoch_ms, {SELECT_COLUMNS} FROM transactions '
+                      f'WHERE epoch_ms >= ? AND epoch_ms < ? AND (epoch_ms, transaction_id) > (?, ?) '
+                      f'ORDER BY epoch_ms, transaction_id LIMIT ?')
+SELECT_RANGE_PAGE = (f'SELECT {SELECT_COLUMNS} FROM transactions WHERE epoch_ms >= ? AND epoch_ms < ? '
+                     f'ORDER BY epoch_ms, transaction_id LIMIT ? OFFSET ?')
+INSERT = (f'INSERT INTO transactions ({", ".join(WRITE_COLUMNS)}) '
+          f'VALUES ({", ".join("?" for _ in WRITE_COLUMNS)})')
+UPDATE = (f'UPDATE transactions SET {", ".join(f"{column} = ?" for column in WRITE_COLUMNS[1:])} '
+          f'WHERE transaction_id = ?')
+DELETE = 'DELETE FROM transactions WHERE transaction_id = ?'
+COUNT = 'SELECT COUNT(*) FROM transactions'
+COUNT_RANGE = COUNT + ' WHERE epoch_ms >= ? AND epoch_ms < ?'
+INSERT_CHANGE = 'INSERT INTO changes (op, transaction_id, data) VALUES (?, ?, ?)'
+SELECT_CHANGES = 'SELECT seq, op, transaction_id, data FROM changes WHERE seq > ? ORDER BY seq'
+CHANGE_RANGE = 'SELECT MIN(seq), MAX(seq) FROM changes'
+
+FETCH_SIZE = 1000
+
+
+def transaction_to_row(transaction):
+    """Convert a transaction dictionary to a transactions row tuple"""
+    row = [transaction.get(field) for field in FIELDS]
+    if row[FIELDS.index('message')] == transaction.get('body'):
+        # Parsed SMS have message == body; store the text once
+        row[FIELDS.index('message')] = None
+
+    extra = {key: value for key, value in transaction.items() if key not in FIELDS}
+    row.append(json.dumps(extra) if extra else None)
+    row.append(timestamp_to_epoch_ms(transaction.get('timestamp')))
+    return tuple(row)
+
+
+def row_to_transaction(row):
+    """Convert a transactions row tuple back to a transaction dictionary"""
+    transaction = {field: value for field, value in zip(FIELDS, row) if value is not None}
+    if 'message' not in transaction and 'body' in transaction:
+        transaction['message'] = transaction['body']
+    if row[-1]:
+        transaction.update(json.loads(row[-1]))
+    return transaction
+
+
+def range_bounds(start_ms, end_ms):
+    """Replace open range bounds with the smallest/largest SQLite integers"""
+    return (-2 ** 63 if start_ms is None else start_ms,
+            2 ** 63 - 1 if end_ms is None else end_ms)
+
+
+class SQLiteTransactionStore:
+    """TransactionStore backed by a local SQLite database"""
+
+    # The API streams unpaginated lists from iter_all() instead of get_all()
+    stream_lists = True
+
+    def __init__(self, db_path):
+        """
+        Args:
+            db_path (str): SQLite database file (created if missing)
+        """
+        self.db_path = db_path
+        self._local = threading.local()
+        self.change_listeners = []  # Called after every committed change
+
+        db = self._connection()
+        columns = [row[1] for row in db.execute('PRAGMA table_info(transactions)')]
+        if columns and 'epoch_ms' not in columns:
+            self._add_epoch_column(db)
+        db.executescript(SCHEMA)
+        db.commit()
+
+    @staticmethod
+    def _add_epoch_column(db):
+        """Upgrade a database created before the epoch_ms column existed"""
+        db.execute('ALTER TABLE transactions ADD COLUMN epoch_ms INTEGER')
+        rows = db.execute('SELECT transaction_id, transaction_date FROM transactions').fetchall()
+        db.executemany('UPDATE transactions SET epoch_ms = ? WHERE transaction_id = ?',
+                       [(timestamp_to_epoch_ms(date), trans_id) for trans_id, date in rows])
+
+    def _connection(self):
+        """Get this thread's connection, opening it on first use"""
+        local = self._local
+        # Connections must not be shared across threads or forked processes
+        if getattr(local, 'pid', None) != os.getpid():
+            db = sqlite3.connect(self.db_path, cached_statements=64, timeout=30)
+            db.execute('PRAGMA journal_mode = WAL')
+            db.execute('PRAGMA synchronous = NORMAL')
+            db.execute('PRAGMA foreign_keys = ON')
+            local.db = db
+            local.pid = os.getpid()
+        return local.db
+
+    def _record_change(self, db, op, trans_id=None, transaction=None):
+        """Add a change feed row, inside the caller's transaction"""
+        data = json.dumps(transaction) if transaction is not None else None
+        seq = db.execute(INSERT_CHANGE, (op, trans_id, data)).lastrowid
+        if seq % 1000 == 0:
+            db.execute('DELETE FROM changes WHERE seq <= ?', (seq - MAX_EVENTS,))
+
+    def _changed(self):
+        """Notify change listeners of a committed write"""
+        for listener in self.change_listeners:
+            listener()
+
+    def changes_since(self, seq):
+        """Get change events after a sequence number (None if the client must re-fetch)"""
+        db = self._connection()
+        first_seq, last_seq = db.execute(CHANGE_RANGE).fetchone()
+        if seq == (last_seq or 0):
+            return []
+        if last_seq is None or seq > last_seq or seq < first_seq - 1:
+            return None
+        return [
+            {'seq': row[0], 'op': row[1], 'id': row[2],
+             'transaction': json.loads(row[3]) if row[3] else None}
+            for row in db.execute(SELECT_CHANGES, (seq,))
+        ]
+
+    def last_change_seq(self):
+        """Get the sequence number of the latest change event"""
+        return self._connection().execute(CHANGE_RANGE).fetchone()[1] or 0
+
+    @property
+    def version(self):
+        """
+        Changes whenever the data may have changed
+
+        Every write records a change feed row in the same transaction, so the
+        latest sequence number is the same for all threads and worker
+        processes and moves with every commit.
+        """
+        return self.last_change_seq()
+
+    def load_from_xml(self, xml_path):
+        """Load transactions from XML file, dropping duplicate messages"""
+        from dsa.deduplicator import Deduplicator
+        from dsa.xml_parser import parse_xml_to_json
+
+        deduplicator = Deduplicator()
+        transactions = parse_xml_to_json(xml_path, deduplicator=deduplicator)
+        deduplicator.close()
+
+        db = self._connection()
+        with db:
+            db.execute('DELETE FROM transactions')
+            db.executemany(INSERT, (transaction_to_row(trans) for trans in transactions))
+            self._record_change(db, 'reset')
+        self._changed()
+
+    def count(self):
+        """Get the number of transactions"""
+        return self._connection().execute(COUNT).fetchone()[0]
+
+    def iter_all(self):
+        """
+        Yield all transactions without loading them all at once
+
+        Pages are read with the connection of whichever thread advances the
+        iterator (e.g. a different threadpool thread for each chunk of a
+        streamed response).
+        """
+        last_id = 0
+        while True:
+            rows = self._connection().execute(SELECT_ALL_AFTER, (last_id, FETCH_SIZE)).fetchall()
+            for row in rows:
+                yield row_to_transaction(row)
+            if len(rows) < FETCH_SIZE:
+                return
+            last_id = rows[-1][0]
+
+    def get_all(self):
+        """Get all transactions"""
+        return list(self.iter_all())
+
+    def get_page(self, offset, limit):
+        """Get transactions ordered by ID, starting at offset"""
+        rows = self._connection().execute(SELECT_PAGE, (limit, offset)).fetchall()
+        return [row_to_transaction(row) for row in rows]
+
+    def iter_range(self, start_ms=None, end_ms=None):
+        """Yield transactions with start_ms <= timestamp < end_ms, oldest first"""
+        if start_ms is None and end_ms is None:
+            return self.iter_all()
+        return self._iter_range(*range_bounds(start_ms, end_ms))
+
+    def _iter_range(self, start_ms, end_ms):
+        after = (start_ms, -1)  # (epoch_ms, transaction_id) of the last row read
+        while True:
+            rows = self._connection().execute(
+                SELECT_RANGE_AFTER, (start_ms, end_ms, *after, FETCH_SIZE)
+            ).fetchall()
+            for row in rows:
+                yield row_to_transaction(row[1:])
+            if len(rows) < FETCH_SIZE:
+                return
+            after = rows[-1][:2]
+
+    def get_range(self, start_ms=None, end_ms=None):
+        """Get transactions with start_ms <= timestamp < end_ms, oldest first"""
+        return list(self.iter_range(start_ms, end_ms))
+
+    def get_range_page(self, start_ms, end_ms, offset, limit):
+        """Get one page of get_range(), starting at offset"""
+        if start_ms is None and end_ms is None:
+            return self.get_page(offset, limit)
+        rows = self._connection().execute(
+            SELECT_RANGE_PAGE, (*range_bounds(start_ms, end_ms), limit, offset)
+        ).fetchall()
+        return [row_to_transaction(row) for row in rows]
+
+    def count_range(self, start_ms=None, end_ms=None):
+        """Get the number of transactions with start_ms <= timestamp < end_ms"""
+        if start_ms is None and end_ms is None:
+            return self.count()
+        return self._connection().execute(COUNT_RANGE, range_bounds(start_ms, end_ms)).fetchone()[0]
+
+    def get_by_id(self, trans_id):
+        """Get transaction by ID"""
+        row = self._connection().execute(SELECT_BY_ID, (trans_id,)).fetchone()
+        return row_to_transaction(row) if row else None
+
+    def add(self, transaction):
+        """Add new transaction"""
+        transaction.pop('id', None)
+        db = self._connection()
+        with db:
+            cursor = db.execute(INSERT, transaction_to_row(transaction))
+            transaction['id'] = cursor.lastrowid
+            self._record_change(db, 'create', transaction['id'], transaction)
+        self._changed()
+        return transaction
+
+    def update(self, trans_id, updated_data):
+        """Update existing transaction"""
+        db = self._connection()
+        with db:
+            row = db.execute(SELECT_BY_ID, (trans_id,)).fetchone()
+            if row is None:
+                return None
+
+            transaction = row_to_transaction(row)
+            for key, value in updated_data.items():
+                if key != 'id':  # Don't allow ID changes
+                    transaction[key] = value
+            db.execute(UPDATE, transaction_to_row(transaction)[1:] + (trans_id,))
+            self._record_change(db, 'update', trans_id, transaction)
+        self._changed()
+
+        return transaction
+
+    def delete(self, trans_id):
+        """Delete transaction"""
+        db = self._connection()
+        with db:
+            cursor = db.execute(DELETE, (trans_id,))
+            if cursor.rowcount:
+                self._record_change(db, 'delete', trans_id)
+        self._changed()
+        return cursor.rowcount > 0
+
+    def recalculate_fees(self):
+        """Recalculate historical fees with the fee engine, in batches"""
+        from fee_engine import get_fee_engine
+
+        engine = get_fee_engine()
+        types = list(engine.type_fee_codes)
+        if not types:
+            return 0
+        db = self._connection()
+        changed = 0
+        last_id = 0
+        with db:
+            while True:
+                # Skip types without a fee type and fees reported in the SMS
+                rows = db.execute(
+                    'SELECT transaction_id, amount, type, fee FROM transactions '
+                    'WHERE transaction_id > ? AND amount IS NOT NULL '
+                    f'AND type IN ({", ".join("?" * len(types))}) '
+                    'AND (body IS NULL OR fee IS NULL) '
+                    'ORDER BY transaction_id LIMIT ?', (last_id, *types, FETCH_SIZE * 10)
+                ).fetchall()
+                if not rows:
+                    break
+
+                fees = engine.calculate_batch([row[1] for row in rows], [row[2] for row in rows])
+                updates = [(float(fee), row[0]) for row, fee in zip(rows, fees) if row[3] != fee]
+                db.executemany('UPDATE transactions SET fee = ? WHERE transaction_id = ?', updates)
+                changed += len(updates)
+                last_id = rows[-1][0]
+            if changed:
+                self._record_change(db, 'reset')
+        if changed:
+            self._changed()
+        return changed
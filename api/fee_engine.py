@@ -0,0 +1,271 @@
+"""
+Fee Calculation Engine
+Computes transaction fees from the fee_types table (fixed, percentage, tiered)
+
+Fee types are loaded once and compiled into one function per fee code. Tiered
+fee types keep their boundaries in a sorted array that is searched with bisect,
+or with numpy.searchsorted when recalculating fees in bulk.
+"""
+
+import bisect
+import time
+
+_numpy = False  # Not imported yet
+
+
+def load_numpy():
+    """
+    Import numpy on first use
+
+    Only batch recalculation needs numpy, so the API server does not pay for
+    the import at startup.
+
+    Returns:
+        module or None: numpy, or None when it is not installed (batch jobs
+            then fall back to a plain Python loop)
+    """
+    global _numpy
+    if _numpy is False:
+        try:
+            import numpy as _numpy
+        except ImportError:
+            _numpy = None
+    return _numpy
+
+
+# Mirrors the fee_types seed rows in database/database_setup.sql
+FEE_TYPES = [
+    {'fee_type_id': 1, 'fee_name': 'Standard Transfer Fee', 'fee_code': 'STF001',
+     'calculation_method': 'percentage', 'fee_value': 1.5, 'min_fee': 0.50, 'max_fee': 15.00,
+     'is_active': True},
+    {'fee_type_id': 2, 'fee_name': 'Airtime Purchase Fee', 'fee_code': 'APF002',
+     'calculation_method': 'fixed', 'fee_value': 0.75, 'min_fee': None, 'max_fee': None,
+     'is_active': True},
+    {'fee_type_id': 3, 'fee_name': 'Bill Payment Fee', 'fee_code': 'BPF003',
+     'calculation_method': 'tiered', 'fee_value': 2.0, 'min_fee': 1.00, 'max_fee': 20.00,
+     'is_active': True},
+]
+
+# Tier tables for tiered fee types: (amount upper bound, fee), ascending.
+# The last tier has no upper bound.
+FEE_TIERS = {
+    'BPF003': [(1000, 1.00), (10000, 5.00), (50000, 10.00), (None, 20.00)],
+}
+
+# Which fee type applies to each transaction type
+TYPE_FEE_CODES = {
+    'TRANSFER': 'STF001',
+    'WITHDRAWAL': 'STF001',
+    'PAYMENT': 'BPF003',
+}
+
+# Charged on new transactions whose type has no fee type (the old flat 1% fee).
+# Recalculation leaves those transactions alone.
+DEFAULT_FEE_TYPE = {
+    'fee_code': 'DEFAULT', 'calculation_method': 'percentage', 'fee_value': 1.0,
+    'min_fee': None, 'max_fee': None, 'is_active': True,
+}
+
+
+class FeeEngine:
+    """Precomputed fee lookup for every active fee type"""
+
+    def __init__(self, fee_types=FEE_TYPES, tiers=FEE_TIERS, type_fee_codes=TYPE_FEE_CODES):
+        """
+        Args:
+            fee_types (list): fee_types rows as dictionaries
+            tiers (dict): fee_code -> list of (upper_bound, fee) tiers
+            type_fee_codes (dict): transaction type -> fee_code
+        """
+        self.fee_types = {row['fee_code']: row for row in fee_types if row.get('is_active', True)}
+        self.fee_types[DEFAULT_FEE_TYPE['fee_code']] = DEFAULT_FEE_TYPE
+
+        # fee_code -> (sorted tier upper bounds, fee per tier)
+        self.tier_tables = {}
+        for code, code_tiers in tiers.items():
+            bounds = [bound for bound, _ in code_tiers if bound is not None]
+            fees = [fee for _, fee in code_tiers]
+            self.tier_tables[code] = (bounds, fees)
+
+        self.functions = {code: self._compile(row) for code, row in self.fee_types.items()}
+        self.type_fee_codes = {
+            txn_type: code for txn_type, code in type_fee_codes.items() if code in self.fee_types
+        }
+
+    def _compile(self, fee_type):
+        """Build the fee function for one fee type"""
+        method = fee_type['calculation_method']
+        value = float(fee_type['fee_value'])
+        min_fee = fee_type.get('min_fee')
+        max_fee = fee_type.get('max_fee')
+
+        if method == 'fixed':
+            def base_fee(amount):
+                return value
+        elif method == 'percentage':
+            rate = value / 100
+
+            def base_fee(amount):
+                return amount * rate
+        elif method == 'tiered' and fee_type['fee_code'] in self.tier_tables:
+            bounds, fees = self.tier_tables[fee_type['fee_code']]
+
+            def base_fee(amount):
+                return fees[bisect.bisect_left(bounds, amount)]
+        elif method == 'tiered':
+            # No tier table configured: charge the base value
+            def base_fee(amount):
+                return value
+        else:
+            raise ValueError(f"Unknown fee calculation method: {method}")
+
+        def fee(amount):
+            result = base_fee(amount)
+            if min_fee is not None and result < min_fee:
+                result = min_fee
+            if max_fee is not None and result > max_fee:
+                result = max_fee
+            return round(result, 2)
+
+        return fee
+
+    def has_fee_type(self, txn_type):
+        """Check whether a fee type is configured for a transaction type"""
+        return txn_type in self.type_fee_codes
+
+    def fee_code_for(self, txn_type):
+        """Get the fee code that applies to a transaction type"""
+        return self.type_fee_codes.get(txn_type, DEFAULT_FEE_TYPE['fee_code'])
+
+    def calculate(self, amount, txn_type=None):
+        """
+        Calculate the fee for one transaction
+
+        Args:
+            amount (float): Transaction amount
+            txn_type (str): Transaction type, e.g. 'TRANSFER'
+
+        Returns:
+            float: Fee rounded to 2 decimals
+        """
+        return self.functions[self.fee_code_for(txn_type)](float(amount))
+
+    def calculate_batch(self, amounts, txn_types):
+        """
+        Calculate fees for many transactions at once
+
+        Args:
+            amounts (sequence): Transaction amounts
+            txn_types (sequence): Transaction type for each amount
+
+        Returns:
+            list or numpy.ndarray: Fees rounded to 2 decimals
+        """
+        np = load_numpy()
+        if np is None:
+            functions = {txn_type: self.functions[self.fee_code_for(txn_type)]
+                         for txn_type in set(txn_types)}
+            return [functions[txn_type](float(amount))
+                    for amount, txn_type in zip(amounts, txn_types)]
+
+        amounts = np.asarray(amounts, dtype=np.float64)
+        codes = list(self.fee_types)
+        code_index = {code: i for i, code in enumerate(codes)}
+        type_index = {}
+        for txn_type in set(txn_types):
+            type_index[txn_type] = code_index[self.fee_code_for(txn_type)]
+        fee_ids = np.fromiter((type_index[txn_type] for txn_type in txn_types),
+                              dtype=np.int16, count=len(amounts))
+
+        fees = np.zeros(len(amounts), dtype=np.float64)
+        for i, code in enumerate(codes):
+            mask = fee_ids == i
+            if mask.any():
+                fees[mask] = self._calculate_vector(self.fee_types[code], amounts[mask])
+        return fees
+
+    def _calculate_vector(self, fee_type, amounts):
+        """numpy version of the compiled fee function for one fee type"""
+        np = load_numpy()
+        method = fee_type['calculation_method']
+        value = float(fee_type['fee_value'])
+
+        if method == 'percentage':
+            result = amounts * (value / 100)
+        elif method == 'tiered' and fee_type['fee_code'] in self.tier_tables:
+            bounds, fees = self.tier_tables[fee_type['fee_code']]
+            result = np.asarray(fees)[np.searchsorted(bounds, amounts, side='left')]
+        else:
+            result = np.full(len(amounts), value)
+
+        if fee_type.get('min_fee') is not None or fee_type.get('max_fee') is not None:
+            result = np.clip(result, fee_type.get('min_fee'), fee_type.get('max_fee'))
+        return np.round(result, 2)
+
+
+_engine = None
+
+
+def get_fee_engine():
+    """Get the shared FeeEngine, building it on first use"""
+    global _engine
+    if _engine is None:
+        _engine = FeeEngine()
+    return _engine
+
+
+def fee_reported(transaction):
+    """Check whether the fee of a transaction was read from its SMS"""
+    return transaction.get('body') is not None and transaction.get('fee') is not None
+
+
+def recalculate_fees(transactions, engine=None):
+    """
+    Recalculate fees with a batch job
+
+    Only transactions whose type has a fee type are priced, and fees reported
+    in the SMS are kept.
+
+    Args:
+        transactions (list): Transaction dictionaries (updated in place)
+        engine (FeeEngine): Engine to use, defaults to the shared one
+
+    Returns:
+        int: Number of transactions whose fee changed
+    """
+    engine = engine or get_fee_engine()
+    priced = [trans for trans in transactions
+              if trans.get('amount') is not None and engine.has_fee_type(trans.get('type'))
+              and not fee_reported(trans)]
+    fees = engine.calculate_batch([trans['amount'] for trans in priced],
+                                  [trans.get('type') for trans in priced])
+
+    changed = 0
+    for trans, fee in zip(priced, fees):
+        fee = float(fee)
+        if trans.get('fee') != fee:
+            trans['fee'] = fee
+            changed += 1
+    return changed
+
+
+if __name__ == '__main__':
+    import random
+
+    np = load_numpy()
+    engine = get_fee_engine()
+    print("Fee examples:")
+    for txn_type, amount in [('TRANSFER', 5000), ('PAYMENT', 600), ('PAYMENT', 20000),
+                             ('WITHDRAWAL', 1000), ('DEPOSIT', 50000)]:
+        print(f"  {txn_type:<10} {amount:>8} RWF -> fee {engine.calculate(amount, txn_type)}")
+
+    size = 10_000_000 if np is not None else 1_000_000
+    types = list(TYPE_FEE_CODES) + ['DEPOSIT', 'RECEIVED']
+    amounts = [random.uniform(100, 500_000) for _ in range(size)]
+    txn_types = [random.choice(types) for _ in range(size)]
+
+    start = time.perf_counter()
+    engine.calculate_batch(amounts, txn_types)
+    elapsed = time.perf_counter() - start
+    backend = 'numpy' if np is not None else 'pure Python'
+    print(f"\nRecalculated {size:,} fees in {elapsed:.2f}s ({backend})")
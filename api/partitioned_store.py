@@ -0,0 +1,578 @@
+"""
+Time-Partitioned Transaction Store
+Keeps transactions on disk in one JSON file per month of the SMS 'date'
+
+A small manifest records each partition's size and its id and time ranges,
+plus an index of id runs -> month, so the store opens without reading any
+transactions and finds a transaction's partition without loading others. The
+most recent (hot) partitions are loaded eagerly; older (cold) ones are read on
+first access and evicted, least recently used first, when loaded partitions
+exceed the memory budget. Date-range queries only open partitions whose time
+range overlaps.
+
+Writes are appended to a journal instead of rewriting the month file and the
+manifest each time. Changed partitions stay loaded until FLUSH_WRITES journal
+entries have accumulated; they and the manifest are then written out and the
+journal cleared. Opening the store replays any journal left behind.
+"""
+
+import bisect
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from change_feed import ChangeLog
+from timestamps import in_range, month_key, timestamp_to_epoch_ms
+
+MANIFEST_NAME = 'manifest.json'
+JOURNAL_NAME = 'journal.ndjson'
+FLUSH_WRITES = 1000  # Journal entries before partitions and manifest are rewritten
+HOT_PARTITIONS = 3
+MEMORY_BUDGET_BYTES = 64 * 1024 * 1024
+
+
+def transaction_epoch_ms(transaction):
+    """Get the epoch milliseconds a transaction is partitioned on"""
+    return timestamp_to_epoch_ms(transaction.get('timestamp'))
+
+
+def write_json_atomic(path, data):
+    """Write JSON to a temporary file and move it into place"""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+
+class IdIndex:
+    """Maps transaction IDs to months as sorted runs of consecutive IDs"""
+
+    def __init__(self, runs=()):
+        """
+        Args:
+            runs (iterable): [first_id, last_id, month] runs, as in the manifest
+        """
+        runs = sorted(runs)
+        self.starts = [run[0] for run in runs]
+        self.ends = [run[1] for run in runs]
+        self.months = [run[2] for run in runs]
+
+    def runs(self):
+        return [[start, end, month] for start, end, month in zip(self.starts, self.ends, self.months)]
+
+    def _run_of(self, trans_id):
+        i = bisect.bisect_right(self.starts, trans_id) - 1
+        return i if i >= 0 and trans_id <= self.ends[i] else None
+
+    def month_of(self, trans_id):
+        i = self._run_of(trans_id)
+        return self.months[i] if i is not None else None
+
+    def add(self, trans_id, month):
+        if self._run_of(trans_id) is not None:
+            return
+        i = bisect.bisect_right(self.starts, trans_id)
+        joins_previous = i > 0 and self.ends[i - 1] == trans_id - 1 and self.months[i - 1] == month
+        joins_next = (i < len(self.starts) and self.starts[i] == trans_id + 1
+                      and self.months[i] == month)
+        if joins_previous and joins_next:
+            self.ends[i - 1] = self.ends[i]
+            del self.starts[i], self.ends[i], self.months[i]
+        elif joins_previous:
+            self.ends[i - 1] = trans_id
+        elif joins_next:
+            self.starts[i] = trans_id
+        else:
+            self.starts.insert(i, trans_id)
+            self.ends.insert(i, trans_id)
+            self.months.insert(i, month)
+
+    def remove(self, trans_id):
+        i = self._run_of(trans_id)
+        if i is None:
+            return
+        start, end = self.starts[i], self.ends[i]
+        if start == end:
+            del self.starts[i], self.ends[i], self.months[i]
+        elif trans_id == start:
+            self.starts[i] += 1
+        elif trans_id == end:
+            self.ends[i] -= 1
+        else:
+            self.ends[i] = trans_id - 1
+            self.starts.insert(i + 1, trans_id + 1)
+            self.ends.insert(i + 1, end)
+            self.months.insert(i + 1, self.months[i])
+
+
+class PartitionedTransactionStore:
+    """TransactionStore split into monthly partitions loaded on demand"""
+
+    def __init__(self, partition_dir, hot_partitions=HOT_PARTITIONS,
+                 memory_budget=MEMORY_BUDGET_BYTES):
+        """
+        Args:
+            partition_dir (str): Directory holding the partition files
+            hot_partitions (int): Number of most recent months kept loaded
+            memory_budget (int): Size (bytes of partition JSON) of cold
+                partitions kept loaded before the least recently used are evicted
+        """
+        self.partition_dir = partition_dir
+        self.hot_partitions = hot_partitions
+        self.memory_budget = memory_budget
+        self.manifest = {}  # month -> count, bytes, id range, time range
+        self.next_id = 1
+        self.version = 0  # Bumped on every change
+        self.changes = ChangeLog()
+        self.change_listeners = self.changes.listeners
+        self.loaded = OrderedDict()  # month -> {id: transaction}, in LRU order
+        self.loaded_bytes = 0
+        self.id_index = IdIndex()
+        self.dirty = set()  # Months changed since the last flush (kept loaded)
+        self.journal_path = os.path.join(partition_dir, JOURNAL_NAME)
+        self.journal = None
+        self.journal_entries = 0
+        self.stats = {'loads': 0, 'evictions': 0, 'flushes': 0}
+        self._lock = threading.RLock()
+
+        os.makedirs(partition_dir, exist_ok=True)
+        manifest_path = os.path.join(partition_dir, MANIFEST_NAME)
+        if os.path.exists(manifest_path):
+            with open(manifest_path, encoding='utf-8') as f:
+                manifest = json.load(f)
+            self.manifest = manifest['partitions']
+            self.next_id = manifest['next_id']
+            if 'id_runs' in manifest:
+                self.id_index = IdIndex(manifest['id_runs'])
+            else:
+                # Manifest written before the index existed
+                for month in self.manifest:
+                    for trans_id in self._read_partition(month):
+                        self.id_index.add(trans_id, month)
+                self._save_manifest()
+            self._load_hot()
+        self._replay_journal()
+
+    # Partition files
+
+    def _partition_path(self, month):
+        return os.path.join(self.partition_dir, f'{month}.json')
+
+    def _hot_months(self):
+        return set(sorted(self.manifest)[-self.hot_partitions:]) if self.hot_partitions else set()
+
+    def _read_partition(self, month):
+        with open(self._partition_path(month), encoding='utf-8') as f:
+            return {trans['id']: trans for trans in json.load(f)}
+
+    def _load_hot(self):
+        for month in self._hot_months():
+            self._partition(month)
+
+    def _partition(self, month):
+        """Get a partition's transactions, loading it if it is not in memory"""
+        partition = self.loaded.get(month)
+        if partition is not None:
+            self.loaded.move_to_end(month)
+            return partition
+
+        partition = self._read_partition(month) if month in self.manifest else {}
+        self.loaded[month] = partition
+        self.loaded_bytes += self.manifest.get(month, {}).get('bytes', 0)
+        self.stats['loads'] += 1
+        self._evict(keep=month)
+        return partition
+
+    def _evict(self, keep):
+        """Drop least recently used cold partitions until within the memory budget"""
+        if self.loaded_bytes <= self.memory_budget:
+            return
+        hot = self._hot_months()
+        for month in list(self.loaded):
+            if self.loaded_bytes <= self.memory_budget:
+                return
+            if month == keep or month in hot or month in self.dirty:
+                continue
+            del self.loaded[month]
+            self.loaded_bytes -= self.manifest.get(month, {}).get('bytes', 0)
+            self.stats['evictions'] += 1
+
+    def _iter_partition(self, month):
+        """Get a partition's transactions without caching a cold partition"""
+        partition = self.loaded.get(month)
+        if partition is None:
+            partition = self._read_partition(month)
+        return partition.values()
+
+    def _save_partition(self, month, partition):
+        """Write a partition and refresh its manifest entry"""
+        path = self._partition_path(month)
+        old_bytes = self.manifest.get(month, {}).get('bytes', 0)
+        if not partition:
+            if os.path.exists(path):
+                os.remove(path)
+            self.manifest.pop(month, None)
+            self.loaded.pop(month, None)
+            self.loaded_bytes -= old_bytes
+            return
+
+        write_json_atomic(path, list(partition.values()))
+        epochs = [transaction_epoch_ms(trans) for trans in partition.values()]
+        epochs = [epoch for epoch in epochs if epoch is not None]
+        entry = {
+            'count': len(partition),
+            'bytes': os.path.getsize(path),
+            'min_id': min(partition),
+            'max_id': max(partition),
+            'min_ts': min(epochs, default=None),
+            'max_ts': max(epochs, default=None),
+        }
+        self.manifest[month] = entry
+        if month in self.loaded:
+            self.loaded_bytes += entry['bytes'] - old_bytes
+
+    def _save_manifest(self):
+        write_json_atomic(os.path.join(self.partition_dir, MANIFEST_NAME),
+                          {'next_id': self.next_id, 'partitions': self.manifest,
+                           'id_runs': self.id_index.runs()})
+
+    def _month_of_id(self, trans_id):
+        """Find the partition holding a transaction ID"""
+        return self.id_index.month_of(trans_id)
+
+    # Journal
+
+    def _put(self, month, transaction):
+        """Store a transaction in a month's partition in memory"""
+        partition = self._partition(month)
+        if transaction['id'] not in partition:
+            self._entry(month)['count'] += 1
+        partition[transaction['id']] = transaction
+        self.id_index.add(transaction['id'], month)
+
+        # Widen the ranges; flush() narrows them again
+        entry = self.manifest[month]
+        for low, high, value in (('min_id', 'max_id', transaction['id']),
+                                 ('min_ts', 'max_ts', transaction_epoch_ms(transaction))):
+            if value is not None:
+                entry[low] = value if entry[low] is None else min(entry[low], value)
+                entry[high] = value if entry[high] is None else max(entry[high], value)
+
+    def _remove(self, month, trans_id):
+        """Remove a transaction from a month's partition in memory"""
+        partition = self._partition(month)
+        if partition.pop(trans_id, None) is not None:
+            self._entry(month)['count'] -= 1
+        if self.id_index.month_of(trans_id) == month:
+            self.id_index.remove(trans_id)
+
+    def _entry(self, month):
+        """Get a partition's manifest entry, marking the partition changed"""
+        self.dirty.add(month)
+        entry = self.manifest.get(month)
+        if entry is None:
+            entry = self.manifest[month] = {
+                'count': 0, 'bytes': 0, 'min_id': None, 'max_id': None,
+                'min_ts': None, 'max_ts': None,
+            }
+        return entry
+
+    def _log(self, entries):
+        """Append journal entries, flushing partitions once enough have accumulated"""
+        if self.journal is None:
+            self.journal = open(self.journal_path, 'a', encoding='utf-8')
+        for entry in entries:
+            entry['next_id'] = self.next_id
+            self.journal.write(json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + '\n')
+        self.journal.flush()
+        self.journal_entries += len(entries)
+        self.version += 1
+        if self.journal_entries >= FLUSH_WRITES:
+            self.flush()
+
+    def _replay_journal(self):
+        """Apply writes journaled after the last flush"""
+        if not os.path.exists(self.journal_path):
+            return
+        with open(self.journal_path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break  # Torn last line of an interrupted write
+                if entry['op'] == 'put':
+                    self._put(entry['month'], entry['transaction'])
+                else:
+                    self._remove(entry['month'], entry['id'])
+                self.next_id = max(self.next_id, entry['next_id'])
+                self.journal_entries += 1
+        self.flush()
+
+    def flush(self):
+        """Write changed partitions and the manifest, then clear the journal"""
+        with self._lock:
+            for month in sorted(self.dirty):
+                self._save_partition(month, self.loaded.get(month, {}))
+            self.dirty.clear()
+            self._save_manifest()
+            self._clear_journal()
+            self.stats['flushes'] += 1
+
+    def _clear_journal(self):
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+        self.journal_entries = 0
+
+    # TransactionStore interface
+
+    def load_from_xml(self, xml_path):
+        """Load transactions from XML file into monthly partitions"""
+        from dsa.deduplicator import Deduplicator
+        from dsa.xml_parser import parse_xml_to_json
+
+        deduplicator = Deduplicator()
+        transactions = parse_xml_to_json(xml_path, deduplicator=deduplicator)
+        deduplicator.close()
+
+        partitions = {}
+        for transaction in transactions:
+            month = month_key(transaction_epoch_ms(transaction))
+            partitions.setdefault(month, {})[transaction['id']] = transaction
+
+        with self._lock:
+            self._clear_journal()
+            for month in self.manifest:
+                if os.path.exists(self._partition_path(month)):
+                    os.remove(self._partition_path(month))
+            self.manifest = {}
+            self.loaded.clear()
+            self.loaded_bytes = 0
+            self.dirty.clear()
+            self.id_index = IdIndex()
+            for month, partition in partitions.items():
+                self._save_partition(month, partition)
+                for trans_id in partition:
+                    self.id_index.add(trans_id, month)
+            self.next_id = max((trans['id'] for trans in transactions), default=0) + 1
+            self._save_manifest()
+            self.version += 1
+            self._load_hot()
+        self.changes.record('reset')
+
+    def count(self):
+        """Get the number of transactions"""
+        return sum(entry['count'] for entry in self.manifest.values())
+
+    def iter_all(self):
+        """Yield all transactions, oldest month first"""
+        for month in sorted(self.manifest):
+            with self._lock:
+                transactions = list(self._iter_partition(month))
+            yield from transactions
+
+    def get_all(self):
+        """Get all transactions"""
+        return list(self.iter_all())
+
+    def get_page(self, offset, limit):
+        """Get transactions ordered by month, starting at offset"""
+        page = []
+        with self._lock:
+            for month in sorted(self.manifest):
+                count = self.manifest[month]['count']
+                if offset >= count:
+                    offset -= count
+                    continue
+                transactions = list(self._partition(month).values())
+                page.extend(transactions[offset:offset + limit - len(page)])
+                offset = 0
+                if len(page) >= limit:
+                    break
+        return page
+
+    def _overlapping_months(self, start_ms, end_ms):
+        """Get the partitions whose time range overlaps [start_ms, end_ms), oldest first"""
+        months = []
+        for month in sorted(self.manifest):
+            entry = self.manifest[month]
+            if entry['min_ts'] is None:
+                if start_ms is None and end_ms is None:
+                    months.append(month)
+                continue
+            if start_ms is not None and entry['max_ts'] < start_ms:
+                continue
+            if end_ms is not None and entry['min_ts'] >= end_ms:
+                continue
+            months.append(month)
+        return months
+
+    def get_range(self, start_ms=None, end_ms=None):
+        """
+        Get transactions with start_ms <= timestamp < end_ms
+
+        Only partitions whose time range overlaps are read.
+        """
+        result = []
+        with self._lock:
+            for month in self._overlapping_months(start_ms, end_ms):
+                result.extend(trans for trans in self._partition(month).values()
+                              if in_range(transaction_epoch_ms(trans), start_ms, end_ms))
+        return result
+
+    @staticmethod
+    def _covers(entry, start_ms, end_ms):
+        """Whether a partition lies entirely inside [start_ms, end_ms)"""
+        if start_ms is None and end_ms is None:
+            return True
+        if entry['min_ts'] is None:
+            return False
+        return ((start_ms is None or entry['min_ts'] >= start_ms)
+                and (end_ms is None or entry['max_ts'] < end_ms))
+
+    def get_range_page(self, start_ms, end_ms, offset, limit):
+        """
+        Get one page of get_range(), starting at offset
+
+        Partitions entirely inside the range are skipped by their manifest
+        count; only partitions that straddle a bound are filtered.
+        """
+        page = []
+        with self._lock:
+            for month in self._overlapping_months(start_ms, end_ms):
+                entry = self.manifest[month]
+                if self._covers(entry, start_ms, end_ms):
+                    if offset >= entry['count']:
+                        offset -= entry['count']
+                        continue
+                    matching = list(self._partition(month).values())
+                else:
+                    matching = [trans for trans in self._iter_partition(month)
+                                if in_range(transaction_epoch_ms(trans), start_ms, end_ms)]
+                    if offset >= len(matching):
+                        offset -= len(matching)
+                        continue
+                page.extend(matching[offset:offset + limit - len(page)])
+                offset = 0
+                if len(page) >= limit:
+                    break
+        return page
+
+    def count_range(self, start_ms=None, end_ms=None):
+        """
+        Get the number of transactions with start_ms <= timestamp < end_ms
+
+        Manifest counts answer for whole partitions; only partitions that
+        straddle a bound are read.
+        """
+        total = 0
+        with self._lock:
+            for month in self._overlapping_months(start_ms, end_ms):
+                entry = self.manifest[month]
+                if self._covers(entry, start_ms, end_ms):
+                    total += entry['count']
+                else:
+                    total += sum(1 for trans in self._iter_partition(month)
+                                 if in_range(transaction_epoch_ms(trans), start_ms, end_ms))
+        return total
+
+    def iter_range(self, start_ms=None, end_ms=None):
+        """
+        Yield transactions with start_ms <= timestamp < end_ms, one partition at a time
+
+        Unlike get_range, cold partitions are not kept loaded, so a bulk export
+        does not evict the partitions other requests use.
+        """
+        with self._lock:
+            months = self._overlapping_months(start_ms, end_ms)
+        for month in months:
+            with self._lock:
+                if month not in self.manifest:
+                    continue
+                transactions = [trans for trans in self._iter_partition(month)
+                                if in_range(transaction_epoch_ms(trans), start_ms, end_ms)]
+            yield from transactions
+
+    def get_by_id(self, trans_id):
+        """Get transaction by ID"""
+        with self._lock:
+            month = self._month_of_id(trans_id)
+            return self._partition(month)[trans_id] if month else None
+
+    def add(self, transaction):
+        """Add new transaction"""
+        with self._lock:
+            transaction['id'] = self.next_id
+            self.next_id += 1
+            month = month_key(transaction_epoch_ms(transaction))
+            self._put(month, transaction)
+            self._log([{'op': 'put', 'month': month, 'transaction': transaction}])
+        self.changes.record('create', transaction['id'], transaction)
+        return transaction
+
+    def update(self, trans_id, updated_data):
+        """Update existing transaction, moving it if its month changes"""
+        with self._lock:
+            month = self._month_of_id(trans_id)
+            if month is None:
+                return None
+
+            transaction = self._partition(month)[trans_id]
+            for key, value in updated_data.items():
+                if key != 'id':  # Don't allow ID changes
+                    transaction[key] = value
+
+            entries = []
+            new_month = month_key(transaction_epoch_ms(transaction))
+            if new_month != month:
+                self._remove(month, trans_id)
+                entries.append({'op': 'delete', 'month': month, 'id': trans_id})
+            self._put(new_month, transaction)
+            entries.append({'op': 'put', 'month': new_month, 'transaction': transaction})
+            self._log(entries)
+        self.changes.record('update', trans_id, transaction)
+        return transaction
+
+    def delete(self, trans_id):
+        """Delete transaction"""
+        with self._lock:
+            month = self._month_of_id(trans_id)
+            if month is None:
+                return False
+            self._remove(month, trans_id)
+            self._log([{'op': 'delete', 'month': month, 'id': trans_id}])
+        self.changes.record('delete', trans_id)
+        return True
+
+    def recalculate_fees(self):
+        """Recalculate historical fees with the fee engine, one partition at a time"""
+        from fee_engine import recalculate_fees
+
+        changed = 0
+        with self._lock:
+            for month in sorted(self.manifest):
+                partition = self.loaded.get(month) or self._read_partition(month)
+                month_changed = recalculate_fees(list(partition.values()))
+                if month_changed:
+                    if month in self.loaded:
+                        self.dirty.add(month)
+                    else:
+                        self._save_partition(month, partition)
+                    changed += month_changed
+            self.flush()
+            if changed:
+                self.version += 1
+        if changed:
+            self.changes.record('reset')
+        return changed
+
+    def changes_since(self, seq):
+        """Get change events after a sequence number (None if the client must re-fetch)"""
+        return self.changes.since(seq)
+
+    def last_change_seq(self):
+        """Get the sequence number of the latest change event"""
+        return self.changes.last_seq
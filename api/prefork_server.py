@@ -0,0 +1,394 @@
+"""
+Pre-fork Multi-Process API Server
+Runs several APIHandler worker processes on one shared listening socket
+
+All workers read from one memory-mapped, read-only snapshot of the transactions,
+so the data is parsed once and shared between processes by the OS page cache.
+Mutations are sent to a single writer (the parent process), which appends them
+to a change log that every worker replays before serving a request.
+"""
+
+import bisect
+import itertools
+import json
+import mmap
+import os
+import shutil
+import signal
+import socket
+import struct
+import tempfile
+import threading
+from multiprocessing import Pipe
+
+import api_server
+from api_server import APIHandler, APIServer
+from change_feed import ChangeLog
+from timestamps import in_range, timestamp_to_epoch_ms
+
+SNAPSHOT_MAGIC = b'MOMOSNP1'
+HEADER = struct.Struct('=8sq')  # magic, record count
+
+
+def write_snapshot(transactions, snapshot_path):
+    """
+    Write transactions to a snapshot file
+
+    Layout: header, then three arrays of native int64 (sorted ids, record
+    offsets, record lengths), then the JSON-encoded records.
+
+    Args:
+        transactions (list): Transactions to store
+        snapshot_path (str): Output file path
+    """
+    records = sorted(transactions, key=lambda trans: trans['id'])
+    encoded = [json.dumps(trans, separators=(',', ':')).encode() for trans in records]
+
+    count = len(records)
+    data_start = HEADER.size + 3 * 8 * count
+    offsets = []
+    position = data_start
+    for record in encoded:
+        offsets.append(position)
+        position += len(record)
+
+    with open(snapshot_path, 'wb') as f:
+        f.write(HEADER.pack(SNAPSHOT_MAGIC, count))
+        f.write(struct.pack(f'={count}q', *(trans['id'] for trans in records)))
+        f.write(struct.pack(f'={count}q', *offsets))
+        f.write(struct.pack(f'={count}q', *(len(record) for record in encoded)))
+        for record in encoded:
+            f.write(record)
+
+
+class SnapshotStore:
+    """Read-only view of a snapshot file plus the changes recorded in the log"""
+
+    def __init__(self, snapshot_path, log_path):
+        with open(snapshot_path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, count = HEADER.unpack_from(self._mmap, 0)
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError(f"Not a transaction snapshot: {snapshot_path}")
+
+        # Zero-copy int64 views into the mapped index arrays
+        index = memoryview(self._mmap)[HEADER.size:HEADER.size + 3 * 8 * count].cast('q')
+        self._ids = index[:count]
+        self._offsets = index[count:2 * count]
+        self._lengths = index[2 * count:]
+
+        # Changes since the snapshot: id -> transaction, or None when deleted
+        self.overlay = {}
+        self.next_id = (self._ids[-1] + 1) if count else 1
+        self._log = open(log_path, 'rb')
+        self._log_buffer = b''
+        self._log_position = 0  # End of the last applied entry
+        self._refresh_lock = threading.Lock()
+
+        # Change events, numbered by their end offset in the shared log so the
+        # numbers agree across workers
+        self.changes = ChangeLog()
+        self.change_listeners = self.changes.listeners
+
+    def refresh(self):
+        """Apply change log entries written since the last refresh"""
+        with self._refresh_lock:
+            chunk = self._log.read()
+            if not chunk:
+                return
+
+            data = self._log_buffer + chunk
+            complete, _, self._log_buffer = data.rpartition(b'\n')
+            if not complete:
+                return
+
+            for line in complete.split(b'\n'):
+                self._log_position += len(line) + 1
+                entry = json.loads(line)
+                trans_id = entry['id']
+                transaction = entry.get('transaction')
+                if transaction is None:
+                    op = 'delete'
+                else:
+                    op = 'create' if trans_id >= self.next_id else 'update'
+                self.overlay[trans_id] = transaction
+                self.next_id = max(self.next_id, trans_id + 1)
+                self.changes.record(op, trans_id, transaction, seq=self._log_position)
+
+    @property
+    def version(self):
+        """Position in the change log; moves whenever any worker writes"""
+        self.refresh()
+        return self._log.tell()
+
+    def changes_since(self, seq):
+        """Get change events after a sequence number (None if the client must re-fetch)"""
+        self.refresh()
+        return self.changes.since(seq)
+
+    def last_change_seq(self):
+        """Get the sequence number of the latest change event"""
+        self.refresh()
+        return self.changes.last_seq
+
+    def _snapshot_get(self, trans_id):
+        """Decode a transaction from the snapshot, or None if absent"""
+        pos = bisect.bisect_left(self._ids, trans_id)
+        if pos == len(self._ids) or self._ids[pos] != trans_id:
+            return None
+        offset = self._offsets[pos]
+        return json.loads(self._mmap[offset:offset + self._lengths[pos]])
+
+    def _last_snapshot_id(self):
+        return self._ids[-1] if len(self._ids) else 0
+
+    def count(self):
+        """Get the number of transactions"""
+        self.refresh()
+        count = len(self._ids)
+        last_snapshot_id = self._last_snapshot_id()
+        for trans_id, transaction in dict(self.overlay).items():
+            if trans_id > last_snapshot_id:
+                count += transaction is not None
+            elif transaction is None and self._snapshot_get(trans_id) is not None:
+                count -= 1
+        return count
+
+    def iter_all(self):
+        """Yield all transactions, decoding them one at a time"""
+        self.refresh()
+        overlay = dict(self.overlay)
+        for pos, trans_id in enumerate(self._ids):
+            if trans_id in overlay:
+                transaction = overlay[trans_id]
+                if transaction is not None:
+                    yield transaction
+                continue
+            offset = self._offsets[pos]
+            yield json.loads(self._mmap[offset:offset + self._lengths[pos]])
+
+        last_snapshot_id = self._last_snapshot_id()
+        for trans_id in sorted(overlay):
+            if trans_id > last_snapshot_id and overlay[trans_id] is not None:
+                yield overlay[trans_id]
+
+    def get_all(self):
+        """Get all transactions"""
+        return list(self.iter_all())
+
+    def get_page(self, offset, limit):
+        """Get transactions ordered by ID, starting at offset"""
+        return list(itertools.islice(self.iter_all(), offset, offset + limit))
+
+    def iter_range(self, start_ms=None, end_ms=None):
+        """Yield transactions with start_ms <= timestamp < end_ms"""
+        return (trans for trans in self.iter_all()
+                if in_range(timestamp_to_epoch_ms(trans.get('timestamp')), start_ms, end_ms))
+
+    def get_range(self, start_ms=None, end_ms=None):
+        """Get transactions with start_ms <= timestamp < end_ms"""
+        return list(self.iter_range(start_ms, end_ms))
+
+    def get_range_page(self, start_ms, end_ms, offset, limit):
+        """Get one page of get_range() without building the whole list"""
+        return list(itertools.islice(self.iter_range(start_ms, end_ms), offset, offset + limit))
+
+    def count_range(self, start_ms=None, end_ms=None):
+        """Get the number of transactions with start_ms <= timestamp < end_ms"""
+        return sum(1 for _ in self.iter_range(start_ms, end_ms))
+
+    def get_by_id(self, trans_id):
+        """Get transaction by ID"""
+        self.refresh()
+        if trans_id in self.overlay:
+            return self.overlay[trans_id]
+        return self._snapshot_get(trans_id)
+
+
+class SnapshotWriter(SnapshotStore):
+    """The single writer: applies mutations by appending them to the change log"""
+
+    def __init__(self, snapshot_path, log_path):
+        super().__init__(snapshot_path, log_path)
+        self._log_writer = open(log_path, 'ab')
+
+    def _append(self, trans_id, transaction):
+        entry = {'id': trans_id, 'transaction': transaction}
+        self._log_writer.write(json.dumps(entry, separators=(',', ':')).encode() + b'\n')
+        self._log_writer.flush()
+        self.refresh()
+
+    def add(self, transaction):
+        """Add new transaction"""
+        self.refresh()
+        transaction['id'] = self.next_id
+        self._append(transaction['id'], transaction)
+        return transaction
+
+    def update(self, trans_id, updated_data):
+        """Update existing transaction"""
+        transaction = self.get_by_id(trans_id)
+        if transaction is None:
+            return None
+
+        transaction = dict(transaction)
+        for key, value in updated_data.items():
+            if key != 'id':  # Don't allow ID changes
+                transaction[key] = value
+        self._append(trans_id, transaction)
+        return transaction
+
+    def delete(self, trans_id):
+        """Delete transaction"""
+        if self.get_by_id(trans_id) is None:
+            return False
+        self._append(trans_id, None)
+        return True
+
+
+class WorkerStore(SnapshotStore):
+    """Store used inside a worker; mutations are forwarded to the writer"""
+
+    def __init__(self, snapshot_path, log_path, writer_conn):
+        super().__init__(snapshot_path, log_path)
+        self._writer_conn = writer_conn
+        self._writer_lock = threading.Lock()  # One request at a time on the pipe
+
+    def _call_writer(self, method, *args):
+        with self._writer_lock:
+            self._writer_conn.send((method, args))
+            result = self._writer_conn.recv()
+        # Make our own write visible before answering the client
+        self.refresh()
+        return result
+
+    def add(self, transaction):
+        return self._call_writer('add', transaction)
+
+    def update(self, trans_id, updated_data):
+        return self._call_writer('update', trans_id, updated_data)
+
+    def delete(self, trans_id):
+        return self._call_writer('delete', trans_id)
+
+
+def raise_keyboard_interrupt(signum, frame):
+    """Treat SIGTERM like Ctrl+C so workers and the snapshot get cleaned up"""
+    raise KeyboardInterrupt
+
+
+def serve_writer_requests(writer, conn, lock):
+    """Apply mutations sent by one worker until its pipe closes"""
+    while True:
+        try:
+            method, args = conn.recv()
+        except EOFError:
+            return
+        with lock:
+            result = getattr(writer, method)(*args)
+        conn.send(result)
+
+
+def run_worker(listen_sock, snapshot_path, log_path, writer_conn, shared_store=None):
+    """Serve requests in a forked worker process"""
+    signal.signal(signal.SIGTERM, raise_keyboard_interrupt)
+    if shared_store is not None:
+        api_server.store = shared_store
+    else:
+        api_server.store = WorkerStore(snapshot_path, log_path, writer_conn)
+    api_server.resolve_handlers()
+    api_server.store_ready.set()
+
+    httpd = APIServer(listen_sock.getsockname(), APIHandler, bind_and_activate=False)
+    httpd.socket.close()
+    httpd.socket = listen_sock
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        os._exit(0)
+
+
+def run_prefork_server(xml_path, port=8000, workers=4, shared_store=None):
+    """
+    Load the XML once, then serve it from several worker processes
+
+    Args:
+        xml_path (str): Path to the SMS XML backup
+        port (int): Port to listen on
+        workers (int): Number of worker processes
+        shared_store: A store every process can open on its own (the SQLite
+            store). When given, no snapshot is built and workers use it directly.
+    """
+    snapshot_dir = None
+    snapshot_path = log_path = None
+    if shared_store is None:
+        snapshot_dir = tempfile.mkdtemp(prefix='momo_snapshot_')
+        snapshot_path = os.path.join(snapshot_dir, 'transactions.snapshot')
+        log_path = os.path.join(snapshot_dir, 'changes.log')
+
+        # Parse once, write the snapshot, and drop the parsed objects before forking
+        loader = api_server.TransactionStore()
+        loader.load_from_xml(xml_path)
+        transactions = loader.get_all()
+        del loader
+        count = len(transactions)
+        write_snapshot(transactions, snapshot_path)
+        del transactions
+        open(log_path, 'wb').close()
+        print(f"Loaded {count} transactions into shared snapshot")
+
+    listen_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listen_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listen_sock.bind(('', port))
+    listen_sock.listen(APIServer.request_queue_size * workers)
+
+    if shared_store is None:
+        pipes = [Pipe() for _ in range(workers)]
+    else:
+        pipes = [(None, None) for _ in range(workers)]
+
+    children = []
+    for worker_conn, _ in pipes:
+        pid = os.fork()
+        if pid == 0:
+            for other_worker_conn, writer_end in pipes:
+                if writer_end is not None:
+                    writer_end.close()
+                if other_worker_conn is not None and other_worker_conn is not worker_conn:
+                    other_worker_conn.close()
+            run_worker(listen_sock, snapshot_path, log_path, worker_conn, shared_store)
+        children.append(pid)
+
+    signal.signal(signal.SIGTERM, raise_keyboard_interrupt)
+    listen_sock.close()
+
+    if shared_store is None:
+        # Parent: single writer serving every worker's mutations
+        writer = SnapshotWriter(snapshot_path, log_path)
+        lock = threading.Lock()
+        for worker_conn, writer_end in pipes:
+            worker_conn.close()
+            threading.Thread(target=serve_writer_requests, args=(writer, writer_end, lock),
+                             daemon=True).start()
+
+    print(f"Started {workers} workers on http://localhost:{port} (pids: {children})")
+
+    try:
+        for pid in children:
+            os.waitpid(pid, 0)
+    except KeyboardInterrupt:
+        print("\n\nShutting down workers...")
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+                os.waitpid(pid, 0)
+            except (ChildProcessError, ProcessLookupError):
+                pass
+    finally:
+        if snapshot_dir:
+            shutil.rmtree(snapshot_dir, ignore_errors=True)
@@ -0,0 +1,83 @@
+"""
+Balance Reconciliation Endpoint
+Keeps a reconciliation report of the store up to date between requests
+
+The first request reconciles every transaction. Later ones only reconcile
+the transactions created since, read from the store's change feed, as long as
+they are newer than everything already checked; updates, deletes, resets and
+back-dated messages trigger a full run again.
+"""
+
+import threading
+
+DEFAULT_ISSUE_LIMIT = 100
+
+
+class BalanceReconciler:
+    """Incrementally maintained reconciliation report for one store"""
+
+    def __init__(self, store):
+        self.store = store
+        self.seq = None  # Change sequence number the report is up to date with
+        self.state = None
+        self.max_id = 0
+        self.checked = 0
+        self.issues = []
+        self.stats = {'full_runs': 0, 'incremental_runs': 0}
+        self._lock = threading.Lock()
+
+    def report(self, issue_limit=DEFAULT_ISSUE_LIMIT):
+        """
+        Get the reconciliation report for the store's current contents
+
+        Args:
+            issue_limit (int): Maximum number of issues to include (newest last)
+
+        Returns:
+            dict: Totals, issue counts and the most recent issues
+        """
+        with self._lock:
+            self._refresh()
+            issues = self.issues[-issue_limit:] if issue_limit else []
+            counts = {}
+            for issue in self.issues:
+                counts[issue['issue']] = counts.get(issue['issue'], 0) + 1
+            return {
+                'transactions': self.state['transactions'],
+                'checked': self.checked,
+                'closing_balance': self.state['balance'],
+                'issue_counts': counts,
+                'issue_total': len(self.issues),
+                'issues': issues,
+            }
+
+    def _refresh(self):
+        from dsa.reconcile import continues_state, reconcile
+
+        seq = self.store.last_change_seq()
+        if seq == self.seq:
+            return
+        events = self.store.changes_since(self.seq) if self.seq is not None else None
+        if events is not None and all(event['op'] == 'create' for event in events):
+            # IDs only increase, so skip creates a full run already read
+            created = [event['transaction'] for event in events
+                       if event['seq'] <= seq and event['id'] > self.max_id]
+            if continues_state(created, self.state):
+                report, self.state = reconcile(created, self.state)
+                self._merge(report, created, seq)
+                self.stats['incremental_runs'] += 1
+                return
+
+        transactions = list(self.store.iter_all())
+        report, self.state = reconcile(transactions)
+        self.checked = 0
+        self.issues = []
+        self.max_id = 0
+        self._merge(report, transactions, seq)
+        self.stats['full_runs'] += 1
+
+    def _merge(self, report, transactions, seq):
+        self.checked += report['checked']
+        self.issues.extend(report['issues'])
+        self.max_id = max((trans['id'] for trans in transactions), default=self.max_id)
+        self.seq = seq
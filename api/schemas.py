@@ -0,0 +1,88 @@
+"""
+API Response Schemas
+Pydantic models describing the transaction payloads served by api/app.py
+"""
+
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel
+
+
+class Transaction(BaseModel):
+    """A single transaction as stored in the TransactionStore"""
+
+    id: int
+    type: Optional[str] = None
+    amount: Optional[float] = None
+    fee: Optional[float] = None
+    new_balance: Optional[float] = None
+    sender: Optional[str] = None
+    receiver: Optional[str] = None
+    txid: Optional[str] = None
+    timestamp: Optional[str] = None
+    readable_date: Optional[str] = None
+    status: Optional[str] = None
+    address: Optional[str] = None
+    body: Optional[str] = None
+    message: Optional[str] = None
+    read: Optional[str] = None
+    service_center: Optional[str] = None
+
+    class Config:
+        # Stored transactions may carry extra fields added by clients
+        extra = 'allow'
+
+
+class TransactionList(BaseModel):
+    """Response for GET /transactions (total/offset/limit only when paginated)"""
+
+    count: int
+    transactions: List[Transaction]
+    total: Optional[int] = None
+    offset: Optional[int] = None
+    limit: Optional[int] = None
+
+
+class TransactionMessage(BaseModel):
+    """Response for POST/PUT /transactions"""
+
+    message: str
+    transaction: Transaction
+
+
+class DeleteMessage(BaseModel):
+    """Response for DELETE /transactions/{id}"""
+
+    message: str
+    id: int
+
+
+class BalanceIssue(BaseModel):
+    """A transaction whose reported balance does not reconcile"""
+
+    id: Optional[int] = None
+    timestamp: Optional[str] = None
+    type: Optional[str] = None
+    issue: str
+    new_balance: float
+    expected_balance: Optional[float] = None
+    discrepancy: Optional[float] = None
+    previous_id: Optional[int] = None
+
+
+class ReconciliationReport(BaseModel):
+    """Response for GET /transactions/reconciliation"""
+
+    transactions: int
+    checked: int
+    closing_balance: Optional[float] = None
+    issue_counts: Dict[str, int]
+    issue_total: int
+    issues: List[BalanceIssue]
+
+
+class ErrorResponse(BaseModel):
+    """Error body shared by every endpoint"""
+
+    error: str
+    status_code: int
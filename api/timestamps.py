@@ -0,0 +1,77 @@
+"""
+Timestamp Helpers
+Transactions carry either the SMS 'date' (epoch milliseconds, as a string) or an
+ISO timestamp for transactions created through the API
+"""
+
+from datetime import datetime, timezone
+
+
+def timestamp_to_epoch_ms(value):
+    """
+    Convert a transaction timestamp to epoch milliseconds
+
+    Args:
+        value: Epoch milliseconds (int or digit string) or ISO date/datetime string
+
+    Returns:
+        int or None: Epoch milliseconds, or None if the value is missing/invalid
+    """
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+
+    value = str(value).strip()
+    if value.isdigit():
+        return int(value)
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp() * 1000)
+
+
+def month_key(epoch_ms):
+    """Get the 'YYYY-MM' (UTC) month of an epoch milliseconds value"""
+    if epoch_ms is None:
+        return 'undated'
+    return datetime.fromtimestamp(epoch_ms / 1000, tz=timezone.utc).strftime('%Y-%m')
+
+
+def parse_time_range(query):
+    """
+    Read start/end filters from parsed query parameters
+
+    Args:
+        query (dict): parse_qs() result
+
+    Returns:
+        tuple: (start_ms, end_ms), either may be None; start is inclusive, end exclusive
+
+    Raises:
+        ValueError: If a value is not epoch milliseconds or an ISO date
+    """
+    bounds = []
+    for name in ('start', 'end'):
+        if name not in query:
+            bounds.append(None)
+            continue
+        epoch_ms = timestamp_to_epoch_ms(query[name][0])
+        if epoch_ms is None:
+            raise ValueError(f'{name} must be epoch milliseconds or an ISO date')
+        bounds.append(epoch_ms)
+    return tuple(bounds)
+
+
+def in_range(epoch_ms, start_ms, end_ms):
+    """Check an epoch milliseconds value against an optional [start, end) range"""
+    if epoch_ms is None:
+        return start_ms is None and end_ms is None
+    if start_ms is not None and epoch_ms < start_ms:
+        return False
+    if end_ms is not None and epoch_ms >= end_ms:
+        return False
+    return True
@@ -0,0 +1,187 @@
+"""
+Ingest Deduplication
+Detects SMS messages that were already ingested (overlapping exports, duplicate deliveries)
+
+Each message is keyed on its transaction ID (TxId or Financial Transaction Id),
+or on a hash of its body and send time when it has none. A Bloom filter in
+memory answers "definitely new" for almost every fresh message; only when it
+says "maybe seen" is the exact key set, kept in SQLite on disk, consulted.
+New keys are held in memory and written to SQLite in batches. Both are saved
+so duplicates are also detected across runs.
+"""
+
+import hashlib
+import math
+import os
+import re
+import sqlite3
+import struct
+
+TXID_PATTERN = re.compile(r'TxId:\s*(\d+)')
+FINANCIAL_TXID_PATTERN = re.compile(r'Financial Transaction Id:\s*(\d+)')
+
+BLOOM_HEADER = struct.Struct('=QQQ')  # bit count, hash count, items added
+
+# New keys are inserted into the key set this many at a time
+PENDING_BATCH = 1000
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter using double hashing over a blake2b digest"""
+
+    def __init__(self, capacity=1_000_000, error_rate=0.01):
+        """
+        Args:
+            capacity (int): Expected number of keys
+            error_rate (float): False positive rate at full capacity
+        """
+        self.num_bits = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1, h2 = struct.unpack('=QQ', digest)
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            f.write(BLOOM_HEADER.pack(self.num_bits, self.num_hashes, self.count))
+            f.write(self.bits)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            num_bits, num_hashes, count = BLOOM_HEADER.unpack(f.read(BLOOM_HEADER.size))
+            bits = bytearray(f.read())
+
+        bloom = cls.__new__(cls)
+        bloom.num_bits, bloom.num_hashes, bloom.count = num_bits, num_hashes, count
+        bloom.bits = bits
+        return bloom
+
+
+def dedup_key(transaction, sms_data):
+    """
+    Get the deduplication key of a parsed SMS
+
+    Args:
+        transaction (dict): Extracted transaction
+        sms_data (dict): Raw SMS attributes from XML
+
+    Returns:
+        str: 'txid:<id>' or 'body:<hash>'
+    """
+    if transaction.get('txid'):
+        return 'txid:' + transaction['txid']
+
+    body = transaction.get('body') or ''
+    match = FINANCIAL_TXID_PATTERN.search(body) or TXID_PATTERN.search(body)
+    if match:
+        return 'txid:' + match.group(1)
+
+    # The same text can legitimately repeat (e.g. bundle purchases), so
+    # include the time the message was sent
+    sent = sms_data.get('date_sent') or sms_data.get('date') or ''
+    digest = hashlib.blake2b(f'{body}\x00{sent}'.encode(), digest_size=16).hexdigest()
+    return 'body:' + digest
+
+
+class Deduplicator:
+    """Bloom filter in front of an exact, persistent set of seen keys"""
+
+    def __init__(self, db_path=':memory:', bloom_path=None, capacity=1_000_000, error_rate=0.01):
+        """
+        Args:
+            db_path (str): SQLite file holding the exact key set (':memory:'
+                to deduplicate within a single run only)
+            bloom_path (str): File the Bloom filter is saved to, or None
+            capacity (int): Expected number of distinct messages
+            error_rate (float): Bloom filter false positive rate
+        """
+        self.bloom_path = bloom_path
+        self.db = sqlite3.connect(db_path)
+        self.db.execute('CREATE TABLE IF NOT EXISTS seen_keys (key TEXT PRIMARY KEY) WITHOUT ROWID')
+
+        # Keys seen since the last batch insert
+        self.pending = set()
+
+        self.bloom = None
+        if bloom_path and os.path.exists(bloom_path):
+            self.bloom = BloomFilter.load(bloom_path)
+            # A stale filter file (e.g. an older copy) would call keys in the
+            # set "definitely new", so only trust one that saw every key
+            if self.bloom.count != self.db.execute('SELECT COUNT(*) FROM seen_keys').fetchone()[0]:
+                self.bloom = None
+        if self.bloom is None:
+            self.bloom = BloomFilter(capacity, error_rate)
+            for (key,) in self.db.execute('SELECT key FROM seen_keys'):
+                self.bloom.add(key)
+
+        self.stats = {
+            'checked': 0,
+            'duplicates': 0,
+            'duplicates_by_txid': 0,
+            'duplicates_by_body': 0,
+            'bloom_false_positives': 0,
+        }
+
+    def is_duplicate(self, transaction, sms_data):
+        """
+        Check a parsed SMS and remember it if it is new
+
+        Args:
+            transaction (dict): Extracted transaction
+            sms_data (dict): Raw SMS attributes from XML
+
+        Returns:
+            bool: True if the message was already seen
+        """
+        key = dedup_key(transaction, sms_data)
+        self.stats['checked'] += 1
+
+        if key in self.bloom:
+            if (key in self.pending
+                    or self.db.execute('SELECT 1 FROM seen_keys WHERE key = ?', (key,)).fetchone()):
+                return self._duplicate(key)
+            self.stats['bloom_false_positives'] += 1
+
+        self.bloom.add(key)
+        self.pending.add(key)
+        if len(self.pending) >= PENDING_BATCH:
+            self._flush()
+        return False
+
+    def _flush(self):
+        """Insert the pending keys into the key set"""
+        self.db.executemany('INSERT INTO seen_keys (key) VALUES (?)', ((key,) for key in self.pending))
+        self.pending.clear()
+
+    def _duplicate(self, key):
+        self.stats['duplicates'] += 1
+        if key.startswith('txid:'):
+            self.stats['duplicates_by_txid'] += 1
+        else:
+            self.stats['duplicates_by_body'] += 1
+        return True
+
+    def save(self):
+        """Persist the exact key set and the Bloom filter"""
+        self._flush()
+        self.db.commit()
+        if self.bloom_path:
+            self.bloom.save(self.bloom_path)
+
+    def close(self):
+        self.save()
+        self.db.close()
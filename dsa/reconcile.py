@@ -0,0 +1,234 @@
+"""
+Balance Reconciliation
+Checks that the new_balance reported by consecutive SMS agrees with the
+amounts and fees in between
+
+Transactions are ordered by timestamp and each gets an expected balance
+change from its type (credits add the amount, debits subtract amount + fee).
+Between two messages that report a balance, the reported change must equal
+the sum of the expected changes; when it does not, the second message is
+flagged:
+
+    duplicate        - the balance did not move: the message was likely counted twice
+    reversed         - the balance moved the opposite way: wrong transaction type
+    missing_activity - the balance moved by an unexplained amount: SMS are missing
+
+Transactions whose effect is unknown (type OTHER) break the chain; the next
+reported balance starts a new one. With numpy the check is vectorized
+(cumulative sums over the sorted arrays); without it a plain loop is used.
+
+Runs can be incremental: reconcile() returns a state describing the end of
+the chain, and passing it back with only newer transactions continues from
+there.
+"""
+
+from collections import Counter
+from datetime import datetime, timezone
+
+try:
+    import numpy as np
+except ImportError:  # Fall back to a plain Python loop
+    np = None
+
+# Sign of the balance change per transaction type; debits also pay the fee
+BALANCE_EFFECTS = {
+    'RECEIVED': 1,
+    'DEPOSIT': 1,
+    'TRANSFER': -1,
+    'PAYMENT': -1,
+    'WITHDRAWAL': -1,
+}
+BALANCE_TOLERANCE = 1.0  # RWF
+
+
+def epoch_ms(timestamp):
+    """Convert an SMS 'date' (epoch ms) or ISO timestamp to epoch milliseconds"""
+    try:
+        return int(timestamp)
+    except (TypeError, ValueError):
+        pass
+    try:
+        parsed = datetime.fromisoformat(str(timestamp))
+    except ValueError:
+        return 0
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp() * 1000)
+
+
+def expected_delta(effect, amount, fee):
+    """Get the balance change of a transaction with a known effect"""
+    return effect * amount - fee if effect < 0 else effect * amount
+
+
+def classify_discrepancy(discrepancy, delta, tolerance):
+    """Name the likely cause of a balance that differs from the expected one"""
+    if delta and abs(discrepancy + delta) <= tolerance:
+        return 'duplicate'
+    if delta and abs(discrepancy + 2 * delta) <= tolerance:
+        return 'reversed'
+    return 'missing_activity'
+
+
+def _check_chain(columns, start, tolerance):
+    """
+    Walk the transactions in time order comparing each reported balance with
+    the one expected from the previous
+
+    Args:
+        columns (tuple): Lists of epochs, effects, amounts, fees and balances
+        start (tuple): (balance, change, broken) the chain continues from, or None
+        tolerance (float): Allowed difference
+
+    Returns:
+        tuple: (mismatches as (index, previous index or None, expected balance,
+            delta) with indexes into the columns, number of balances checked,
+            end of the chain as (index or None, balance, change, broken))
+    """
+    if np is not None:
+        return _check_chain_vector(columns, start, tolerance)
+
+    epochs, effects, amounts, fees, balances = columns
+    mismatches = []
+    checked = 0
+    anchor, balance_before, change, broken = (None, *start) if start else (None, None, 0.0, False)
+    for i in sorted(range(len(epochs)), key=epochs.__getitem__):
+        delta = expected_delta(effects[i], amounts[i], fees[i])
+        if effects[i]:
+            change += delta
+        else:
+            broken = True
+        if balances[i] is None:
+            continue
+        if balance_before is not None and not broken:
+            checked += 1
+            expected = balance_before + change
+            if abs(balances[i] - expected) > tolerance:
+                mismatches.append((i, anchor, expected, delta))
+        anchor, balance_before, change, broken = i, balances[i], 0.0, False
+    return mismatches, checked, (anchor, balance_before, change, broken)
+
+
+def _check_chain_vector(columns, start, tolerance):
+    """numpy version of _check_chain"""
+    epochs, effects, amounts, fees, balances = columns
+    order = np.argsort(np.array(epochs, dtype=np.int64), kind='stable')
+    effects = np.array(effects, dtype=np.int8)[order]
+    amounts = np.array(amounts, dtype=np.float64)[order]
+    fees = np.array(fees, dtype=np.float64)[order]
+    balances = np.array(balances, dtype=np.float64)[order]  # None -> nan
+
+    deltas = effects * amounts - np.where(effects < 0, fees, 0.0)
+    unknown = effects == 0
+    if start:
+        # Continue the previous chain through two synthetic rows: its last
+        # reported balance, then the change accumulated after it
+        order = np.concatenate(([-1, -1], order))
+        balances = np.concatenate(([start[0], np.nan], balances))
+        deltas = np.concatenate(([0.0, start[1]], deltas))
+        unknown = np.concatenate(([False, start[2]], unknown))
+
+    change = np.cumsum(np.where(unknown, 0.0, deltas))
+    breaks = np.cumsum(unknown)
+    reported = np.flatnonzero(~np.isnan(balances))
+    current, previous = reported[1:], reported[:-1]
+
+    # Only compare across stretches where every transaction has a known effect
+    checkable = breaks[current] == breaks[previous]
+    expected = balances[previous] + change[current] - change[previous]
+    wrong = checkable & (np.abs(balances[current] - expected) > tolerance)
+    current, previous, expected = current[wrong], previous[wrong], expected[wrong]
+
+    mismatches = [
+        (i, j if j >= 0 else None, exp, delta)
+        for i, j, exp, delta in zip(order[current].tolist(), order[previous].tolist(),
+                                    expected.tolist(), deltas[current].tolist())
+    ]
+
+    if not len(reported):
+        end = (None, None, float(change[-1]) if len(change) else 0.0, bool(unknown.any()))
+    else:
+        last = reported[-1]
+        end = (int(order[last]) if order[last] >= 0 else None, float(balances[last]),
+               float(change[-1] - change[last]), bool(breaks[-1] != breaks[last]))
+    return mismatches, int(checkable.sum()), end
+
+
+def reconcile(transactions, state=None, tolerance=BALANCE_TOLERANCE):
+    """
+    Reconcile reported balances against transaction amounts and fees
+
+    Args:
+        transactions (iterable): Transaction dictionaries; with a state, only
+            those newer than state['last_timestamp'] (see continues_state)
+        state (dict): State returned by a previous run, to continue from
+        tolerance (float): Allowed balance difference in RWF
+
+    Returns:
+        tuple: (report dict, state dict for the next incremental run)
+    """
+    transactions = list(transactions)
+    columns = (
+        [epoch_ms(trans.get('timestamp')) for trans in transactions],
+        [BALANCE_EFFECTS.get(trans.get('type'), 0) for trans in transactions],
+        [trans.get('amount') or 0.0 for trans in transactions],
+        [trans.get('fee') or 0.0 for trans in transactions],
+        [trans.get('new_balance') for trans in transactions],
+    )
+    start = None
+    if state and state['balance'] is not None:
+        start = (state['balance'], state['change'], state['broken'])
+
+    mismatches, checked, end = _check_chain(columns, start, tolerance)
+
+    issues = []
+    for i, j, expected, delta in mismatches:
+        transaction = transactions[i]
+        discrepancy = transaction['new_balance'] - expected
+        issues.append({
+            'id': transaction.get('id'),
+            'timestamp': transaction.get('timestamp'),
+            'type': transaction.get('type'),
+            'issue': classify_discrepancy(discrepancy, delta, tolerance),
+            'new_balance': transaction['new_balance'],
+            'expected_balance': round(expected, 2),
+            'discrepancy': round(discrepancy, 2),
+            'previous_id': transactions[j].get('id') if j is not None else state['id'],
+        })
+    for transaction in transactions:
+        if (transaction.get('new_balance') or 0) < 0:
+            issues.append({
+                'id': transaction.get('id'),
+                'timestamp': transaction.get('timestamp'),
+                'type': transaction.get('type'),
+                'issue': 'negative_balance',
+                'new_balance': transaction['new_balance'],
+            })
+    issues.sort(key=lambda issue: epoch_ms(issue['timestamp']))
+
+    new_state = dict(state or {'balance': None, 'id': None, 'change': 0.0, 'broken': False,
+                               'last_timestamp': 0, 'transactions': 0})
+    index, balance, change, broken = end
+    if index is not None:
+        new_state.update(balance=balance, id=transactions[index].get('id'))
+    new_state.update(change=change, broken=broken)
+    new_state['transactions'] += len(transactions)
+    new_state['last_timestamp'] = max(columns[0], default=new_state['last_timestamp'])
+
+    report = {
+        'transactions': len(transactions),
+        'with_balance': sum(balance is not None for balance in columns[4]),
+        'checked': checked,
+        'issue_counts': dict(Counter(issue['issue'] for issue in issues)),
+        'issues': issues,
+        'closing_balance': new_state['balance'],
+    }
+    return report, new_state
+
+
+def continues_state(transactions, state):
+    """Check that transactions all come after a state's chain (else re-run in full)"""
+    if not state:
+        return False
+    last = state['last_timestamp']
+    return all(epoch_ms(trans.get('timestamp')) >= last for trans in transactions)
@@ -2,28 +2,96 @@
 XML Parser Module
 Parses modified_sms_v2.xml and converts SMS records to JSON format
 Extracts transaction information from SMS message bodies
+
+Backups may be gzip or zstd compressed; they are decompressed while being
+parsed, without a temporary file.
 """
 
 import xml.etree.ElementTree as ET
+import gzip
 import json
 import re
+from collections import Counter
 from datetime import datetime
 
+try:
+    import zstandard
+except ImportError:  # Only needed for .zst backups
+    zstandard = None
 
-def extract_transaction_from_sms(sms_body, sms_data):
+
+# Field patterns used to extract transaction details from SMS bodies
+TXID_PATTERN = re.compile(r'TxId:\s*(\d+)')
+AMOUNT_PATTERN = re.compile(r'([\d,]+)\s*RWF')
+FEE_PATTERN = re.compile(r'Fee\s+(?:was)?:?\s*([\d,]+)\s*RWF')
+BALANCE_PATTERN = re.compile(r'[Nn]ew\s+balance:?\s*([\d,]+)\s*RWF')
+TRANSFER_RECEIVER_PATTERN = re.compile(r'transferred.*?to\s+([A-Za-z\s]+)\s*\(')
+PAYMENT_RECEIVER_PATTERN = re.compile(r'payment of.*?to\s+([A-Za-z\s\d]+)')
+RECEIVED_SENDER_PATTERN = re.compile(r'received\s+[\d,]+\s+RWF\s+from\s+([A-Za-z\s]+)\s*\(')
+
+# Regex-extracted fields per transaction type, in output order
+COMMON_FIELDS_BEFORE_TYPE = [('txid', TXID_PATTERN), ('amount', AMOUNT_PATTERN)]
+TYPE_FIELDS = {
+    'TRANSFER': [('receiver', TRANSFER_RECEIVER_PATTERN)],
+    'PAYMENT': [('receiver', PAYMENT_RECEIVER_PATTERN)],
+    'RECEIVED': [('sender', RECEIVED_SENDER_PATTERN)],
+}
+COMMON_FIELDS_AFTER_TYPE = [('fee', FEE_PATTERN), ('new_balance', BALANCE_PATTERN)]
+
+# Receivers that do not come from the message text
+FIXED_RECEIVERS = {'DEPOSIT': 'Self', 'WITHDRAWAL': 'Withdrawal'}
+
+def classify_sms(sms_body):
     """
-    Extract transaction details from SMS message body.
+    Get the transaction type of an SMS body from its keywords
     
     Args:
         sms_body (str): The SMS message text
-        sms_data (dict): Raw SMS data from XML
         
     Returns:
-        dict: Extracted transaction data or None if not a transaction
+        str: TRANSFER, PAYMENT, DEPOSIT, WITHDRAWAL, RECEIVED or OTHER
     """
-    if not sms_body:
-        return None
+    body = sms_body.lower()
+    if 'transferred' in body:
+        return 'TRANSFER'
+    elif 'payment' in body or 'paid' in body:
+        return 'PAYMENT'
+    elif 'deposit' in body:
+        return 'DEPOSIT'
+    elif 'withdrawal' in body or 'withdrawn' in body:
+        return 'WITHDRAWAL'
+    elif 'received' in body:
+        return 'RECEIVED'
+    return 'OTHER'
+
+
+def field_patterns(txn_type):
+    """Get the (field, pattern) pairs to extract for a transaction type"""
+    return COMMON_FIELDS_BEFORE_TYPE + TYPE_FIELDS.get(txn_type, []) + COMMON_FIELDS_AFTER_TYPE
+
+
+def convert_field(field, raw_value):
+    """Convert a raw field string to its stored value"""
+    if field in ('amount', 'fee', 'new_balance'):
+        return float(raw_value.replace(',', ''))
+    if field in ('sender', 'receiver'):
+        return raw_value.strip()
+    return raw_value
+
+
+def build_transaction(sms_body, sms_data, txn_type, raw_fields):
+    """
+    Assemble a transaction dictionary from extracted raw field values
     
+    Args:
+        sms_body (str): The SMS message text
+        sms_data (dict): Raw SMS data from XML
+        txn_type (str): Transaction type
+        raw_fields (dict): field -> raw string value
+        
+    Returns:
+        dict: Transaction data
+    """
     transaction = {
         'address': sms_data.get('address'),
         'timestamp': sms_data.get('date'),
@@ -35,102 +103,244 @@ def extract_transaction_from_sms(sms_body, sms_data):
         'service_center': sms_data.get('service_center')
     }
     
-    # Extract transaction ID (TxId)
-    txid_match = re.search(r'TxId:\s*(\d+)', sms_body)
-    if txid_match:
-        transaction['txid'] = txid_match.group(1)
-    
-    # Extract amount - look for patterns like "X,XXX RWF" or "X RWF"
-    amount_match = re.search(r'([\d,]+)\s*RWF', sms_body)
-    if amount_match:
-        amount_str = amount_match.group(1).replace(',', '')
-        transaction['amount'] = float(amount_str)
-    
-    # Extract transaction type from context
-    if 'transferred' in sms_body.lower():
-        transaction['type'] = 'TRANSFER'
-        # Extract receiver name
-        receiver_match = re.search(r'transferred.*?to\s+([A-Za-z\s]+)\s*\(', sms_body)
-        if receiver_match:
-            transaction['receiver'] = receiver_match.group(1).strip()
-    elif 'payment' in sms_body.lower() or 'paid' in sms_body.lower():
-        transaction['type'] = 'PAYMENT'
-        # Extract receiver name
-        receiver_match = re.search(r'payment of.*?to\s+([A-Za-z\s\d]+)', sms_body)
-        if receiver_match:
-            transaction['receiver'] = receiver_match.group(1).strip()
-    elif 'deposit' in sms_body.lower():
-        transaction['type'] = 'DEPOSIT'
-        transaction['receiver'] = 'Self'
-    elif 'withdrawal' in sms_body.lower() or 'withdrawn' in sms_body.lower():
-        transaction['type'] = 'WITHDRAWAL'
-        transaction['receiver'] = 'Withdrawal'
-    elif 'received' in sms_body.lower():
-        transaction['type'] = 'RECEIVED'
-        # Extract sender name
-        sender_match = re.search(r'received\s+[\d,]+\s+RWF\s+from\s+([A-Za-z\s]+)\s*\(', sms_body)
-        if sender_match:
-            transaction['sender'] = sender_match.group(1).strip()
-    else:
-        transaction['type'] = 'OTHER'
-    
-    # Extract fee if present
-    fee_match = re.search(r'Fee\s+(?:was)?:?\s*([\d,]+)\s*RWF', sms_body)
-    if fee_match:
-        fee_str = fee_match.group(1).replace(',', '')
-        transaction['fee'] = float(fee_str)
-    
-    # Extract new balance if present
-    balance_match = re.search(r'[Nn]ew\s+balance:?\s*([\d,]+)\s*RWF', sms_body)
-    if balance_match:
-        balance_str = balance_match.group(1).replace(',', '')
-        transaction['new_balance'] = float(balance_str)
+    for field in ('txid', 'amount'):
+        if field in raw_fields:
+            transaction[field] = convert_field(field, raw_fields[field])
+    
+    transaction['type'] = txn_type
+    if txn_type in FIXED_RECEIVERS:
+        transaction['receiver'] = FIXED_RECEIVERS[txn_type]
+    
+    for field in ('receiver', 'sender', 'fee', 'new_balance'):
+        if field in raw_fields:
+            transaction[field] = convert_field(field, raw_fields[field])
     
     return transaction
 
 
-def parse_xml_to_json(xml_file_path):
+def extract_transaction_from_sms(sms_body, sms_data):
+    """
+    Extract transaction details from SMS message body.
+    
+    Args:
+        sms_body (str): The SMS message text
+        sms_data (dict): Raw SMS data from XML
+        
+    Returns:
+        dict: Extracted transaction data or None if not a transaction
+    """
+    if not sms_body:
+        return None
+    
+    txn_type = classify_sms(sms_body)
+    raw_fields = {}
+    for field, pattern in field_patterns(txn_type):
+        match = pattern.search(sms_body)
+        if match:
+            raw_fields[field] = match.group(1)
+    
+    return build_transaction(sms_body, sms_data, txn_type, raw_fields)
+
+
+# Variable tokens in SMS templates: numbers (amounts, dates, IDs) or
+# capitalized name runs
+VARIABLE_TOKEN = re.compile(r'(\d[\d,.:\-]*)|([A-Z][a-z]+(?: [A-Z][a-z]+)*)')
+
+
+def _mask_token(match):
+    return '<#>' if match.group(1) else '<name>'
+
+
+def message_template(sms_body):
+    """
+    Get the template of an SMS body by masking its numbers and names
+    
+    Args:
+        sms_body (str): The SMS message text
+        
+    Returns:
+        str: The body with numbers replaced by <#> and names by <name>
+    """
+    return VARIABLE_TOKEN.sub(_mask_token, sms_body)
+
+
+class TemplateParser:
+    """
+    SMS parser that reports the templates it cannot extract a transaction from
+    
+    Fields are extracted with the precompiled regexes of
+    extract_transaction_from_sms. Messages that give no type or no amount are
+    counted per template so new MoMo message formats show up after an ingest.
+    """
+    
+    def __init__(self):
+        # Templates that produced no type or no amount: template -> count
+        self.unmatched = Counter()
+        self.unmatched_examples = {}
+    
+    def parse(self, sms_body, sms_data):
+        """
+        Extract transaction details from an SMS body, recording unmatched templates
+        
+        Args:
+            sms_body (str): The SMS message text
+            sms_data (dict): Raw SMS data from XML
+            
+        Returns:
+            dict: Extracted transaction data or None if not a transaction
+        """
+        transaction = extract_transaction_from_sms(sms_body, sms_data)
+        if transaction and (transaction['type'] == 'OTHER' or 'amount' not in transaction):
+            template = message_template(sms_body)
+            self.unmatched[template] += 1
+            self.unmatched_examples.setdefault(template, sms_body)
+        return transaction
+    
+    def reset_stats(self):
+        """Clear the unmatched template counts"""
+        self.unmatched = Counter()
+        self.unmatched_examples = {}
+    
+    def report(self):
+        """
+        Summarize unmatched templates
+        
+        Returns:
+            dict: Unmatched templates, most common first
+        """
+        return {
+            'unmatched_templates': [
+                {'template': template, 'count': count, 'example': self.unmatched_examples[template]}
+                for template, count in self.unmatched.most_common()
+            ]
+        }
+
+
+def merge_reports(reports):
+    """
+    Combine TemplateParser reports, e.g. from parsers in several processes
+    
+    Args:
+        reports (iterable): report() results
+        
+    Returns:
+        dict: One report with the unmatched template counts summed
+    """
+    unmatched = Counter()
+    examples = {}
+    for report in reports:
+        for entry in report['unmatched_templates']:
+            unmatched[entry['template']] += entry['count']
+            examples.setdefault(entry['template'], entry['example'])
+    return {
+        'unmatched_templates': [
+            {'template': template, 'count': count, 'example': examples[template]}
+            for template, count in unmatched.most_common()
+        ]
+    }
+
+
+# Shared by every parse unless a caller passes its own parser
+default_parser = TemplateParser()
+
+GZIP_MAGIC = b'\x1f\x8b'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+
+def open_backup(xml_file_path):
+    """
+    Open an SMS backup for reading, decompressing it on the fly
+
+    The compression is detected from the file's first bytes, so the name
+    does not matter.
+
+    Args:
+        xml_file_path (str): Path to a .xml, .xml.gz or .xml.zst file
+
+    Returns:
+        file: Binary file object with the XML
+    """
+    f = open(xml_file_path, 'rb')
+    magic = f.read(4)
+    f.seek(0)
+    if magic.startswith(GZIP_MAGIC):
+        f.close()
+        return gzip.open(xml_file_path, 'rb')
+    if magic == ZSTD_MAGIC:
+        if zstandard is None:
+            f.close()
+            raise ImportError(f"zstandard is required to read {xml_file_path} "
+                              f"(pip install zstandard)")
+        return zstandard.ZstdDecompressor().stream_reader(f, read_across_frames=True,
+                                                           closefd=True)
+    return f
+
+
+def iter_sms(xml_file_path):
+    """
+    Yield the attributes of each <sms> element without building the whole tree
+
+    Args:
+        xml_file_path (str): Path to the (possibly compressed) XML file
+
+    Yields:
+        dict: SMS attributes (address, date, readable_date, body, status, ...)
+    """
+    with open_backup(xml_file_path) as f:
+        events = ET.iterparse(f, events=('start', 'end'))
+        _, root = next(events)
+        for event, elem in events:
+            if event == 'end' and elem.tag == 'sms':
+                yield elem.attrib
+                # Drop parsed elements so memory does not grow with the file
+                root.clear()
+
+
+def iter_transactions(xml_file_path, parser=None):
+    """
+    Yield (transaction, SMS attributes) for each SMS a transaction is extracted from
+
+    Args:
+        xml_file_path (str): Path to the (possibly compressed) XML file
+        parser (TemplateParser): Parser to use (defaults to the shared
+            default_parser)
+    """
+    if parser is None:
+        parser = default_parser
+    for sms_data in iter_sms(xml_file_path):
+        transaction = parser.parse(sms_data.get('body'), sms_data)
+        if transaction:
+            yield transaction, sms_data
+
+
+def parse_xml_to_json(xml_file_path, parser=None, deduplicator=None):
     """
     Parse XML file containing SMS transactions and convert to JSON format
     
     Args:
-        xml_file_path (str): Path to the XML file
+        xml_file_path (str): Path to the XML file (.xml, .xml.gz or .xml.zst)
+        parser (TemplateParser): Parser to use (defaults to the shared
+            default_parser)
+        deduplicator (Deduplicator): If given, messages it has already seen
+            are skipped
         
     Returns:
         list: List of transaction dictionaries
     """
     try:
-        # Parse the XML file
-        tree = ET.parse(xml_file_path)
-        root = tree.getroot()
-        
         transactions = []
         transaction_id = 1
         
-        # Iterate through each SMS element
-        for idx, sms in enumerate(root.findall('sms'), 1):
-            # Extract SMS attributes
-            sms_data = {
-                'address': sms.get('address'),
-                'date': sms.get('date'),
-                'readable_date': sms.get('readable_date'),
-                'type': sms.get('type'),
-                'body': sms.get('body'),
-                'status': sms.get('status'),
-                'read': sms.get('read'),
-                'service_center': sms.get('service_center'),
-                'date_sent': sms.get('date_sent'),
-                'contact_name': sms.get('contact_name')
-            }
-            
-            # Extract transaction from SMS body
-            transaction = extract_transaction_from_sms(sms_data.get('body'), sms_data)
+        # SMS attributes (address, date, readable_date, body, status,
+        # read, service_center, ...) are used as-is
+        for transaction, sms_data in iter_transactions(xml_file_path, parser):
+            if deduplicator is not None and deduplicator.is_duplicate(transaction, sms_data):
+                continue
             
-            if transaction:
-                # Add unique ID
-                transaction['id'] = transaction_id
-                transaction_id += 1
-                transactions.append(transaction)
+            # Add unique ID
+            transaction['id'] = transaction_id
+            transaction_id += 1
+            transactions.append(transaction)
         
         return transactions
     
@@ -0,0 +1,179 @@
+"""
+Transaction Categorization
+Maps SMS transactions onto the categories table using a configurable rule set
+
+Rules are read from category_rules.json and compiled into a single regular
+expression, so each message is classified with one matcher call. Decisions are
+memoized per normalized message template, and the rules file is re-read when it
+changes so categories can be updated without re-running the whole pipeline.
+
+Templates are masked the same way as the parser's unmatched-template report:
+numbers become <#> and capitalized names <name>, so rule patterns are written
+against that form (e.g. "<name> have received <#> rwf from").
+"""
+
+import json
+import os
+import re
+import sys
+from collections import Counter
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from dsa.xml_parser import message_template
+
+from config import CATEGORIES, CATEGORY_RULES_PATH
+
+WHITESPACE = re.compile(r'\s+')
+
+MAX_CACHE_SIZE = 50_000
+
+
+def normalize_message(body):
+    """
+    Reduce an SMS body to its template: numbers masked as <#>, names as <name>, lowercase
+
+    Args:
+        body (str): SMS message text
+
+    Returns:
+        str: Normalized template text
+    """
+    text = message_template(body).lower()
+    return WHITESPACE.sub(' ', text).strip()
+
+
+def compile_rules(rules):
+    """
+    Compile rules into one pattern with a named group per rule
+
+    Every alternative is a lookahead anchored at the start of the text, so the
+    first rule in the file that matches anywhere wins.
+
+    Args:
+        rules (list): [{'category': name, 'patterns': [regex, ...]}, ...]
+
+    Returns:
+        tuple: (compiled pattern, {group name: category name})
+    """
+    alternatives = []
+    group_categories = {}
+    for i, rule in enumerate(rules):
+        group = f'rule{i}'
+        patterns = '|'.join(f'(?:{pattern})' for pattern in rule['patterns'])
+        alternatives.append(f'(?=.*?(?:{patterns}))(?P<{group}>)')
+        group_categories[group] = rule['category']
+
+    if not alternatives:
+        return None, group_categories
+    return re.compile('|'.join(alternatives), re.DOTALL), group_categories
+
+
+class Categorizer:
+    """Rule-based categorizer with per-template memoization"""
+
+    def __init__(self, rules_path=CATEGORY_RULES_PATH, categories=CATEGORIES):
+        """
+        Args:
+            rules_path (str): Path to the JSON rules file
+            categories (list): categories rows as dictionaries
+        """
+        self.rules_path = rules_path
+        self.categories = {cat['category_name']: cat for cat in categories}
+        self.cache = {}
+        self._rules_mtime = None
+        self.reload_if_changed()
+
+    def load_rules(self, rules):
+        """Compile a rule set and drop decisions made with the old one"""
+        unknown = [rule['category'] for rule in rules if rule['category'] not in self.categories]
+        if unknown:
+            raise ValueError(f"Unknown categories in rules: {', '.join(unknown)}")
+
+        self.matcher, self.group_categories = compile_rules(rules)
+        self.cache.clear()
+
+    def reload_if_changed(self):
+        """
+        Re-read the rules file if it changed since it was last loaded
+
+        Returns:
+            bool: True if the rules were reloaded
+        """
+        mtime = os.path.getmtime(self.rules_path)
+        if mtime == self._rules_mtime:
+            return False
+
+        with open(self.rules_path) as f:
+            self.load_rules(json.load(f))
+        self._rules_mtime = mtime
+        return True
+
+    def categorize(self, body):
+        """
+        Get the category for one SMS body
+
+        Args:
+            body (str): SMS message text
+
+        Returns:
+            dict or None: categories row, or None if no rule matches
+        """
+        if not body:
+            return None
+
+        template = normalize_message(body)
+        if template in self.cache:
+            return self.cache[template]
+
+        category = None
+        match = self.matcher.match(template) if self.matcher else None
+        if match:
+            category = self.categories[self.group_categories[match.lastgroup]]
+
+        if len(self.cache) >= MAX_CACHE_SIZE:
+            self.cache.clear()
+        self.cache[template] = category
+        return category
+
+    def categorize_stream(self, transactions):
+        """
+        Categorize transactions as they stream through the pipeline
+
+        Args:
+            transactions (iterable): Transaction dictionaries
+
+        Yields:
+            dict: Each transaction with 'category_id' and 'category' set
+        """
+        for transaction in transactions:
+            category = self.categorize(transaction.get('body'))
+            transaction['category_id'] = category['category_id'] if category else None
+            transaction['category'] = category['category_name'] if category else None
+            yield transaction
+
+    def categorize_batch(self, transactions):
+        """
+        Categorize a list of transactions in place
+
+        Args:
+            transactions (list): Transaction dictionaries
+
+        Returns:
+            Counter: Number of transactions per category name
+        """
+        self.reload_if_changed()
+        return Counter(trans['category'] for trans in self.categorize_stream(transactions))
+
+
+if __name__ == '__main__':
+    from config import XML_PATH
+    from dsa.xml_parser import parse_xml_to_json
+
+    transactions = parse_xml_to_json(XML_PATH)
+    categorizer = Categorizer()
+    counts = categorizer.categorize_batch(transactions)
+
+    print(f"Categorized {len(transactions)} transactions "
+          f"({len(categorizer.cache)} distinct templates)")
+    for name, count in counts.most_common():
+        print(f"  {name or 'Uncategorized':<16} {count}")
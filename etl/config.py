@@ -0,0 +1,35 @@
+"""
+ETL Configuration
+Paths and settings shared by the ETL pipeline scripts
+"""
+
+import os
+
+BASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+XML_PATH = os.path.join(BASE_DIR, 'modified_sms_v2.xml')
+RAW_DIR = os.path.join(BASE_DIR, 'data', 'raw')
+PROCESSED_DIR = os.path.join(BASE_DIR, 'data', 'processed')
+PROCESSED_JSON_PATH = os.path.join(PROCESSED_DIR, 'transactions.json')
+
+# Watch mode: backups dropped into RAW_DIR are ingested once they have not
+# been modified for SETTLE_SECONDS (so half-copied files are left alone)
+BACKUP_SUFFIXES = ('.xml', '.xml.gz', '.xml.zst')
+WATCH_INTERVAL = 10  # seconds between polls
+SETTLE_SECONDS = 5
+WATCH_WORKERS = os.cpu_count() or 1  # backups parsed concurrently
+
+# Expected number of distinct messages, used to size the dedup Bloom filter
+DEDUP_CAPACITY = 10_000_000
+
+# Categorization rules, re-read whenever the file changes
+CATEGORY_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'category_rules.json')
+
+# Mirrors the categories seed rows in database/database_setup.sql
+CATEGORIES = [
+    {'category_id': 1, 'category_name': 'Received Money', 'category_type': 'Income'},
+    {'category_id': 2, 'category_name': 'Sent Money', 'category_type': 'Expense'},
+    {'category_id': 3, 'category_name': 'Airtime', 'category_type': 'Expense'},
+    {'category_id': 4, 'category_name': 'Bill Payment', 'category_type': 'Expense'},
+    {'category_id': 5, 'category_name': 'Cashback', 'category_type': 'Income'},
+]
@@ -0,0 +1,360 @@
+"""
+ETL Pipeline Runner
+Parses the SMS XML backup, categorizes transactions and saves them as JSON,
+then reconciles reported balances
+
+Each backup is recorded (by content hash) once ingested, so the same file is
+never parsed twice, even if it is copied or renamed.
+
+Usage:
+    python run.py                  # Parse, dedupe, categorize, append new rows
+    python run.py --watch          # Keep ingesting backups dropped into data/raw/
+    python run.py --watch --once   # Ingest what is in data/raw/ now, then exit
+    python run.py --recategorize   # Re-apply category rules to saved output
+    python run.py --reconcile      # Re-run balance reconciliation over saved output
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from dsa.deduplicator import Deduplicator
+from dsa.reconcile import continues_state, reconcile
+from dsa.xml_parser import default_parser, iter_transactions, merge_reports, save_to_json_file
+
+from categorize import Categorizer
+from config import (BACKUP_SUFFIXES, DEDUP_CAPACITY, PROCESSED_JSON_PATH, RAW_DIR,
+                    SETTLE_SECONDS, WATCH_INTERVAL, WATCH_WORKERS, XML_PATH)
+
+
+def dedup_paths(output_path):
+    """Get the dedup key set and Bloom filter files that belong to an output file"""
+    base = os.path.splitext(output_path)[0]
+    return base + '_dedup.sqlite', base + '_dedup.bloom'
+
+
+def reconciliation_paths(output_path):
+    """Get the reconciliation state and report files that belong to an output file"""
+    base = os.path.splitext(output_path)[0]
+    return base + '_reconciliation_state.json', base + '_reconciliation.json'
+
+
+def ingest_log_path(output_path):
+    """Get the file recording which backups were ingested into an output file"""
+    return os.path.splitext(output_path)[0] + '_ingested.json'
+
+
+def file_digest(path):
+    """Hash a backup's (compressed) contents"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def parse_backup(path):
+    """
+    Extract the transactions of one backup (run in a worker process by the watcher)
+
+    Returns:
+        tuple: (list of (transaction, SMS send times for deduplication), error or None,
+            template report of this backup)
+    """
+    # The unmatched template counts cover this backup only
+    default_parser.reset_stats()
+    try:
+        messages = [(transaction, {'date': sms_data.get('date'), 'date_sent': sms_data.get('date_sent')})
+                    for transaction, sms_data in iter_transactions(path)]
+    except Exception as e:
+        return [], f"{type(e).__name__}: {e}", default_parser.report()
+    return messages, None, default_parser.report()
+
+
+def run_pipeline(xml_path=XML_PATH, output_path=PROCESSED_JSON_PATH):
+    """
+    Run the ETL pipeline on one backup, appending new messages to the processed output
+
+    Args:
+        xml_path (str): Path to the SMS XML backup (.xml, .xml.gz or .xml.zst)
+        output_path (str): Where to save the processed transactions
+
+    Returns:
+        list: Newly added transactions
+    """
+    return ingest_backups([xml_path], output_path)
+
+
+def ingest_backups(backup_paths, output_path=PROCESSED_JSON_PATH, pool=None):
+    """
+    Parse backups and append their new messages to the processed output
+
+    Backups already recorded in the ingest log are skipped without being
+    parsed. Messages already present in the output (same transaction ID, or
+    same body and send time) are skipped, so overlapping backups can be
+    ingested safely.
+
+    Args:
+        backup_paths (list): SMS backups, in the order their messages are appended
+        output_path (str): Where to save the processed transactions
+        pool (Executor): If given, backups are parsed concurrently in it;
+            deduplication, IDs and saving stay in this process
+
+    Returns:
+        list: Newly added transactions
+    """
+    dedup_db_path, dedup_bloom_path = dedup_paths(output_path)
+    log_path = ingest_log_path(output_path)
+    existing = []
+    if os.path.exists(output_path):
+        with open(output_path) as f:
+            existing = json.load(f)
+    else:
+        # Dedup, reconciliation and ingest state describe the output file, so start over without it
+        for path in (dedup_db_path, dedup_bloom_path, log_path, *reconciliation_paths(output_path)):
+            if os.path.exists(path):
+                os.remove(path)
+
+    ingested = {}
+    if os.path.exists(log_path):
+        with open(log_path) as f:
+            ingested = json.load(f)
+
+    backups = []  # (path, digest) of backups not ingested yet
+    for path in backup_paths:
+        try:
+            digest = file_digest(path)
+        except OSError as e:
+            print(f"Error: cannot read {path}: {e}")
+            continue
+        if digest in (known for _, known in backups):
+            print(f"Skipped {path}: same contents as another new backup")
+            continue
+        if digest in ingested:
+            error = ingested[digest].get('error')
+            print(f"Skipped {path}: " + (f"failed before ({error})" if error else "already ingested"))
+            continue
+        backups.append((path, digest))
+    if not backups:
+        return []
+
+    deduplicator = Deduplicator(dedup_db_path, dedup_bloom_path, capacity=DEDUP_CAPACITY)
+    paths = [path for path, _ in backups]
+    parsed = pool.map(parse_backup, paths) if pool is not None else map(parse_backup, paths)
+
+    transactions = []
+    reports = []
+    for (path, digest), (messages, error, report) in zip(backups, parsed):
+        reports.append(report)
+        entry = {
+            'file': os.path.basename(path),
+            'size': os.path.getsize(path),
+            'ingested_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        }
+        if error:
+            # Recorded so a broken file is not retried until its contents change
+            print(f"Error parsing {path}: {error}")
+            entry['error'] = error
+        else:
+            added = [transaction for transaction, sms_data in messages
+                     if not deduplicator.is_duplicate(transaction, sms_data)]
+            print(f"Parsed {len(added)} new transactions from {path}")
+            entry['transactions'] = len(added)
+            transactions.extend(added)
+        ingested[digest] = entry
+
+    counts = Categorizer().categorize_batch(transactions)
+    next_id = max((trans['id'] for trans in existing), default=0) + 1
+    for trans_id, transaction in enumerate(transactions, next_id):
+        transaction['id'] = trans_id
+
+    print_dedup_stats(deduplicator.stats)
+    print_category_counts(counts)
+    print_unmatched_templates(merge_reports(reports))
+
+    save_to_json_file(existing + transactions, output_path)
+    # Only record the keys and files once the output that contains them is saved
+    deduplicator.close()
+    with open(log_path, 'w') as f:
+        json.dump(ingested, f, indent=2)
+    reconcile_output(existing, transactions, output_path)
+    return transactions
+
+
+def settled_backups(raw_dir, settle_seconds=SETTLE_SECONDS):
+    """
+    List the backups in a directory that are no longer being written, oldest first
+
+    Returns:
+        list: (path, size, modification time) tuples
+    """
+    backups = []
+    now = time.time()
+    for name in os.listdir(raw_dir):
+        if name.startswith('.') or not name.lower().endswith(BACKUP_SUFFIXES):
+            continue
+        path = os.path.join(raw_dir, name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue  # Removed since listing
+        if now - stat.st_mtime >= settle_seconds:
+            backups.append((path, stat.st_size, stat.st_mtime))
+    return sorted(backups, key=lambda backup: backup[2])
+
+
+def watch(raw_dir=RAW_DIR, output_path=PROCESSED_JSON_PATH, interval=WATCH_INTERVAL,
+          workers=WATCH_WORKERS, once=False):
+    """
+    Poll a directory and ingest the backups dropped into it
+
+    New backups found in the same poll are parsed concurrently in worker
+    processes; a backup is only hashed again when its size or modification
+    time changes.
+
+    Args:
+        raw_dir (str): Directory to watch
+        output_path (str): Processed transactions JSON file
+        interval (float): Seconds between polls
+        workers (int): Backups parsed concurrently
+        once (bool): Ingest what is there now and return instead of polling
+    """
+    os.makedirs(raw_dir, exist_ok=True)
+    seen = set()  # (path, size, mtime) of backups handled by this watcher
+    if not once:
+        print(f"Watching {raw_dir} every {interval}s (Ctrl+C to stop)")
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while True:
+            backups = [backup for backup in settled_backups(raw_dir, 0 if once else SETTLE_SECONDS)
+                       if backup not in seen]
+            if backups:
+                ingest_backups([path for path, _, _ in backups], output_path, pool)
+                seen.update(backups)
+            if once:
+                return
+            time.sleep(interval)
+
+
+def reconcile_output(existing, transactions, output_path=PROCESSED_JSON_PATH, full=False):
+    """
+    Reconcile balances, continuing the previous run when only newer messages were added
+
+    Args:
+        existing (list): Transactions reconciled by earlier runs
+        transactions (list): Newly added transactions
+        output_path (str): Processed transactions JSON file the state belongs to
+        full (bool): Re-check every transaction even if the previous run could be continued
+
+    Returns:
+        dict: Report for this run
+    """
+    state_path, report_path = reconciliation_paths(output_path)
+    state, issues = None, []
+    if os.path.exists(state_path) and os.path.exists(report_path):
+        with open(state_path) as f:
+            state = json.load(f)
+        with open(report_path) as f:
+            issues = json.load(f)['issues']
+
+    if not full and continues_state(transactions, state):
+        report, state = reconcile(transactions, state)
+        print(f"Reconciled {len(transactions)} new transactions")
+    else:
+        # Older messages (or no previous run): the whole chain has to be re-checked
+        report, state = reconcile(existing + transactions)
+        issues = []
+        print(f"Reconciled all {len(existing) + len(transactions)} transactions")
+    print_reconciliation(report)
+
+    issues += report['issues']
+    with open(state_path, 'w') as f:
+        json.dump(state, f)
+    with open(report_path, 'w') as f:
+        json.dump({'closing_balance': state['balance'], 'issues': issues}, f, indent=2)
+    return report
+
+
+def recategorize(output_path=PROCESSED_JSON_PATH):
+    """
+    Re-apply the current category rules to already processed transactions
+
+    Args:
+        output_path (str): Processed transactions JSON file
+
+    Returns:
+        list: Recategorized transactions
+    """
+    with open(output_path) as f:
+        transactions = json.load(f)
+
+    counts = Categorizer().categorize_batch(transactions)
+    print(f"Recategorized {len(transactions)} transactions")
+    print_category_counts(counts)
+    save_to_json_file(transactions, output_path)
+    return transactions
+
+
+def print_reconciliation(report):
+    print(f"  Checked {report['checked']} of {report['with_balance']} reported balances")
+    for name, count in sorted(report['issue_counts'].items()):
+        print(f"  {name:<16} {count}")
+
+
+def print_dedup_stats(stats):
+    print(f"  Skipped {stats['duplicates']} duplicates "
+          f"({stats['duplicates_by_txid']} by transaction ID, "
+          f"{stats['duplicates_by_body']} by message body)")
+
+
+def print_category_counts(counts):
+    for name, count in counts.most_common():
+        print(f"  {name or 'Uncategorized':<16} {count}")
+
+
+def print_unmatched_templates(report, limit=5):
+    """Show SMS templates the parser could not extract a transaction from"""
+    unmatched = report['unmatched_templates']
+    if not unmatched:
+        return
+    print(f"{len(unmatched)} unmatched SMS templates:")
+    for entry in unmatched[:limit]:
+        print(f"  {entry['count']:>5}x  {entry['template'][:100]}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='MoMo SMS ETL pipeline')
+    parser.add_argument('--xml', default=XML_PATH, help='SMS XML backup to parse')
+    parser.add_argument('--output', default=PROCESSED_JSON_PATH, help='Processed JSON output')
+    parser.add_argument('--recategorize', action='store_true',
+                        help='Re-apply category rules to the existing output only')
+    parser.add_argument('--reconcile', action='store_true',
+                        help='Re-run balance reconciliation over the existing output only')
+    parser.add_argument('--watch', action='store_true',
+                        help='Ingest backups dropped into --raw-dir as they arrive')
+    parser.add_argument('--raw-dir', default=RAW_DIR, help='Directory watched for backups')
+    parser.add_argument('--interval', type=float, default=WATCH_INTERVAL,
+                        help='Seconds between polls of --raw-dir')
+    parser.add_argument('--workers', type=int, default=WATCH_WORKERS,
+                        help='Backups parsed concurrently in watch mode')
+    parser.add_argument('--once', action='store_true',
+                        help='With --watch, ingest the backups present now and exit')
+    args = parser.parse_args()
+
+    if args.watch:
+        try:
+            watch(args.raw_dir, args.output, args.interval, args.workers, args.once)
+        except KeyboardInterrupt:
+            pass
+    elif args.recategorize:
+        recategorize(args.output)
+    elif args.reconcile:
+        with open(args.output) as f:
+            reconcile_output(json.load(f), [], args.output, full=True)
+    else:
+        run_pipeline(args.xml, args.output)
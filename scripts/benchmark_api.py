@@ -0,0 +1,126 @@
+"""
+API Load Benchmark
+Compares the stdlib api_server.py against the async FastAPI app (api/app.py)
+under the same concurrent GET load
+
+Usage:
+    python scripts/benchmark_api.py [--requests 2000] [--concurrency 16]
+"""
+
+import argparse
+import base64
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+API_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api')
+
+AUTH_HEADER = 'Basic ' + base64.b64encode(b'admin:momo2024').decode()
+
+
+def fetch(url):
+    """Send one authenticated GET and return its latency in milliseconds"""
+    request = urllib.request.Request(url, headers={'Authorization': AUTH_HEADER})
+    start = time.perf_counter()
+    with urllib.request.urlopen(request) as response:
+        response.read()
+    return (time.perf_counter() - start) * 1000
+
+
+def wait_until_up(url, timeout=15):
+    """Poll a URL until the server answers"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            fetch(url)
+            return True
+        except Exception:
+            time.sleep(0.1)
+    return False
+
+
+def run_load(url, total_requests, concurrency):
+    """
+    Hit a URL with concurrent requests
+
+    Returns:
+        dict: Throughput and latency percentiles
+    """
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = sorted(pool.map(fetch, [url] * total_requests))
+    elapsed = time.perf_counter() - start
+
+    return {
+        'requests_per_sec': total_requests / elapsed,
+        'p50_ms': statistics.median(latencies),
+        'p99_ms': latencies[int(len(latencies) * 0.99) - 1],
+    }
+
+
+def start_stdlib_server(port):
+    """Run api_server.py in a subprocess, like the FastAPI app, without request logs"""
+    return subprocess.Popen(
+        [sys.executable, 'api_server.py', '--port', str(port), '--quiet'],
+        cwd=API_DIR, stdout=subprocess.DEVNULL,
+    )
+
+
+def start_fastapi_server(port):
+    """Run api/app.py under uvicorn in a subprocess"""
+    return subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'app:app', '--port', str(port),
+         '--log-level', 'warning'],
+        cwd=API_DIR, stdout=subprocess.DEVNULL,
+    )
+
+
+def print_results(name, endpoint, results):
+    print(f"  {name:<10} {endpoint:<18} "
+          f"{results['requests_per_sec']:>9.1f} req/s   "
+          f"p50 {results['p50_ms']:>7.2f} ms   p99 {results['p99_ms']:>7.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--stdlib-port', type=int, default=8100)
+    parser.add_argument('--fastapi-port', type=int, default=8101)
+    args = parser.parse_args()
+
+    servers = {
+        'stdlib': f'http://127.0.0.1:{args.stdlib_port}',
+        'fastapi': f'http://127.0.0.1:{args.fastapi_port}',
+    }
+
+    processes = [start_stdlib_server(args.stdlib_port), start_fastapi_server(args.fastapi_port)]
+
+    try:
+        for name, base_url in servers.items():
+            if not wait_until_up(base_url + '/transactions/1'):
+                print(f"❌ {name} server did not start")
+                return
+
+        print("=" * 70)
+        print("API LOAD BENCHMARK")
+        print("=" * 70)
+        print(f"{args.requests} requests per run, concurrency {args.concurrency}\n")
+
+        for endpoint in ['/transactions/1', '/transactions']:
+            for name, base_url in servers.items():
+                results = run_load(base_url + endpoint, args.requests, args.concurrency)
+                print_results(name, endpoint, results)
+        print("=" * 70)
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""
+API Overload Benchmark
+Measures single-id lookup latency while other clients flood the server with
+full-list requests, and how many requests admission control turned away
+
+Usage:
+    python scripts/benchmark_overload.py [--seconds 10] [--heavy-clients 32]
+"""
+
+import argparse
+import base64
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+API_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api')
+AUTH_HEADER = 'Basic ' + base64.b64encode(b'admin:momo2024').decode()
+
+
+def fetch(url):
+    """Send one authenticated GET; return (status, latency in milliseconds)"""
+    request = urllib.request.Request(url, headers={'Authorization': AUTH_HEADER})
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except OSError:
+        status = None
+    return status, (time.perf_counter() - start) * 1000
+
+
+def wait_until_ready(base_url, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(base_url + '/ready', timeout=1):
+                return True
+        except OSError:
+            time.sleep(0.05)
+    return False
+
+
+def hammer(url, stop, results):
+    """Request a URL in a loop until stopped, collecting (status, latency)"""
+    while not stop.is_set():
+        results.append(fetch(url))
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--heavy-clients', type=int, default=32)
+    parser.add_argument('--light-clients', type=int, default=2)
+    parser.add_argument('--port', type=int, default=8103)
+    args = parser.parse_args()
+
+    base_url = f'http://127.0.0.1:{args.port}'
+    server = subprocess.Popen(
+        [sys.executable, 'api_server.py', '--port', str(args.port)],
+        cwd=API_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        if not wait_until_ready(base_url):
+            print("❌ server did not start")
+            return
+
+        heavy, light = [], []
+        stop = threading.Event()
+        threads = [threading.Thread(target=hammer, args=(base_url + '/transactions', stop, heavy))
+                   for _ in range(args.heavy_clients)]
+        threads += [threading.Thread(target=hammer, args=(base_url + '/transactions/1', stop, light))
+                    for _ in range(args.light_clients)]
+        for thread in threads:
+            thread.start()
+        time.sleep(args.seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+    finally:
+        server.terminate()
+        server.wait()
+
+    print("=" * 70)
+    print("API OVERLOAD BENCHMARK")
+    print("=" * 70)
+    print(f"{args.heavy_clients} clients on /transactions, "
+          f"{args.light_clients} on /transactions/1, {args.seconds:.0f}s\n")
+    for name, results in [('/transactions', heavy), ('/transactions/1', light)]:
+        served = [latency for status, latency in results if status == 200]
+        shed = sum(1 for status, _ in results if status == 503)
+        failed = len(results) - len(served) - shed
+        print(f"  {name:<16} {len(served):>6} ok  {shed:>6} shed (503)  {failed:>4} failed", end='')
+        if served:
+            print(f"   p50 {statistics.median(served):>7.1f} ms   "
+                  f"p99 {percentile(served, 0.99):>7.1f} ms")
+        else:
+            print()
+    print("=" * 70)
+
+
+if __name__ == '__main__':
+    main()
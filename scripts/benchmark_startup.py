@@ -0,0 +1,89 @@
+"""
+API Startup Benchmark
+Measures how long api_server.py takes to accept connections (/health) and to
+finish loading transactions (/ready) after it is launched
+
+Usage:
+    python scripts/benchmark_startup.py [--runs 5] [--store memory]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+API_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api')
+
+
+def probe(url):
+    """Get the status code of an unauthenticated GET, or None if nothing answers"""
+    try:
+        with urllib.request.urlopen(url, timeout=1) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except OSError:
+        return None
+
+
+def wait_for(url, status, start, timeout):
+    """Poll a URL until it returns a status; return seconds since start"""
+    deadline = start + timeout
+    while time.perf_counter() < deadline:
+        if probe(url) == status:
+            return time.perf_counter() - start
+        time.sleep(0.002)
+    raise TimeoutError(f"{url} did not return {status} within {timeout}s")
+
+
+def measure_startup(port, store, timeout=60):
+    """
+    Launch the server once
+
+    Returns:
+        tuple: (seconds until /health answers, seconds until /ready answers 200)
+    """
+    base_url = f'http://127.0.0.1:{port}'
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, 'api_server.py', '--port', str(port), '--store', store],
+        cwd=API_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        listening = wait_for(base_url + '/health', 200, start, timeout)
+        ready = wait_for(base_url + '/ready', 200, start, timeout)
+    finally:
+        process.terminate()
+        process.wait()
+    return listening, ready
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--port', type=int, default=8102)
+    parser.add_argument('--store', choices=['memory', 'sqlite', 'partitioned'], default='memory')
+    args = parser.parse_args()
+
+    results = [measure_startup(args.port, args.store) for _ in range(args.runs)]
+    listening = [result[0] * 1000 for result in results]
+    ready = [result[1] * 1000 for result in results]
+
+    print("=" * 70)
+    print("API STARTUP BENCHMARK")
+    print("=" * 70)
+    print(f"{args.runs} launches of api_server.py --store {args.store} "
+          f"(including interpreter start)\n")
+    print(f"  time to listening (/health)  median {statistics.median(listening):>8.1f} ms   "
+          f"max {max(listening):>8.1f} ms")
+    print(f"  time to ready     (/ready)   median {statistics.median(ready):>8.1f} ms   "
+          f"max {max(ready):>8.1f} ms")
+    print("=" * 70)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+Shared test setup
+
+The API and ETL modules import their neighbours as top-level modules (they
+run from api/ and etl/), while the DSA code is imported as a package from the
+repository root.
+"""
+
+import base64
+import json
+import os
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+XML_PATH = os.path.join(REPO_DIR, 'modified_sms_v2.xml')
+
+for path in (REPO_DIR, os.path.join(REPO_DIR, 'api'), os.path.join(REPO_DIR, 'etl')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+AUTH_HEADERS = {'Authorization': 'Basic ' + base64.b64encode(b'admin:momo2024').decode()}
+
+
+@pytest.fixture(scope='session')
+def api_url():
+    """Base URL of a stdlib API server on the memory store, loaded from the sample backup"""
+    import api_server
+
+    api_server.warm_up('memory')
+    httpd = api_server.APIServer(('127.0.0.1', 0), api_server.APIHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{httpd.server_address[1]}'
+    httpd.shutdown()
+
+
+def http_get(url, headers=AUTH_HEADERS):
+    """GET a URL; return (status, headers, body bytes) for errors as well"""
+    request = urllib.request.Request(url, headers=headers)
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            return response.status, response.headers, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers, e.read()
+
+
+def http_get_json(url, headers=AUTH_HEADERS):
+    status, _, body = http_get(url, headers)
+    return status, json.loads(body)
+
+
+@pytest.fixture(scope='session')
+def fastapi_url(api_url):
+    """Base URL of the FastAPI app served by uvicorn, sharing the stdlib server's store"""
+    uvicorn = pytest.importorskip('uvicorn')
+    pytest.importorskip('fastapi')
+    import app
+
+    server = uvicorn.Server(uvicorn.Config(app.app, host='127.0.0.1', port=0, log_level='warning'))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    yield f'http://127.0.0.1:{port}'
+    server.should_exit = True
+    thread.join()
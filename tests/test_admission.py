@@ -0,0 +1,183 @@
+"""Admission control and per-client rate limiting"""
+
+import sys
+import threading
+import time
+import urllib.request
+
+import pytest
+
+import admission as admission_module
+import api_server
+from admission import (CHEAP_COST, LIST_COST, PAGE_COST, WRITE_COST, AdmissionController,
+                       RateLimiter, client_key, retry_after, route_cost)
+from conftest import AUTH_HEADERS, http_get
+
+
+def settles(condition, timeout=2):
+    """Wait for a condition that holds once servers have finished their requests"""
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+@pytest.mark.parametrize('method, path, query, cost', [
+    ('GET', '/health', '', 0),
+    ('OPTIONS', '/transactions', '', 0),
+    ('GET', '/transactions', '', LIST_COST),
+    ('GET', '/transactions/', 'offset=0&limit=10', PAGE_COST),
+    ('GET', '/transactions/export', 'format=csv', LIST_COST),
+    ('GET', '/transactions/reconciliation', '', LIST_COST),
+    ('GET', '/transactions/7', '', CHEAP_COST),
+    ('POST', '/transactions', '', WRITE_COST),
+])
+def test_route_cost(method, path, query, cost):
+    assert route_cost(method, path, query) == cost
+
+
+def test_expensive_requests_leave_room_for_cheap_ones():
+    controller = AdmissionController(capacity=40, heavy_share=0.75, wait=0)
+    assert controller.try_acquire(LIST_COST)
+    assert controller.try_acquire(LIST_COST)
+    assert controller.try_acquire(LIST_COST)
+    assert not controller.try_acquire(LIST_COST)  # Over the heavy share (30)
+
+    for _ in range(10):
+        assert controller.try_acquire(CHEAP_COST)
+    assert not controller.try_acquire(CHEAP_COST)
+    assert controller.in_flight == 40
+
+
+def test_idle_server_admits_any_cost():
+    controller = AdmissionController(capacity=5, wait=0)
+    assert controller.try_acquire(LIST_COST)
+    controller.release(LIST_COST)
+    assert controller.in_flight == 0
+
+
+def test_waits_for_released_capacity():
+    controller = AdmissionController(capacity=10, heavy_share=1.0, wait=5)
+    assert controller.try_acquire(LIST_COST)
+    timer = threading.Timer(0.1, controller.release, args=(LIST_COST,))
+    timer.start()
+
+    start = time.monotonic()
+    assert controller.try_acquire(LIST_COST)
+    assert time.monotonic() - start < 2
+    assert controller.stats == {'admitted': 2, 'waited': 1, 'rejected': 0}
+
+
+def test_rejects_after_waiting():
+    controller = AdmissionController(capacity=10, heavy_share=1.0, wait=0.05)
+    assert controller.try_acquire(LIST_COST)
+    assert not controller.try_acquire(LIST_COST, timeout=0)  # Probe: not counted
+    assert not controller.try_acquire(LIST_COST)
+    assert controller.stats['rejected'] == 1
+
+
+def test_rate_limiter_buckets_refill(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(admission_module.time, 'monotonic', lambda: now[0])
+    limiter = RateLimiter(rate=2, burst=4)
+
+    assert limiter.consume('alice@10.0.0.1', 2) == 0
+    assert limiter.consume('alice@10.0.0.1', 2) == 0
+    assert limiter.consume('alice@10.0.0.1', 1) == pytest.approx(0.5)
+    assert limiter.consume('alice@10.0.0.2', 4) == 0  # Same user, other address
+
+    now[0] += 0.5
+    assert limiter.consume('alice@10.0.0.1', 1) == 0
+
+
+def test_rate_limiter_is_off_without_a_rate():
+    limiter = RateLimiter(rate=0)
+    assert all(limiter.consume('client', LIST_COST) == 0 for _ in range(1000))
+
+
+def test_client_key_and_retry_after():
+    assert client_key('admin', '127.0.0.1') == 'admin@127.0.0.1'
+    assert client_key(None, '127.0.0.1') == '-@127.0.0.1'
+    assert retry_after(0) == '1'
+    assert retry_after(2.1) == '3'
+
+
+def test_server_sheds_expensive_requests_when_saturated(api_url, monkeypatch):
+    controller = AdmissionController(capacity=20, heavy_share=0.5, wait=0.05)
+    monkeypatch.setattr(api_server, 'admission', controller)
+    assert controller.try_acquire(LIST_COST)  # An export is already running
+
+    status, headers, _ = http_get(api_url + '/transactions?start=2024-05-01')
+    assert status == 503
+    assert headers['Retry-After'] == '1'
+
+    status, _, _ = http_get(api_url + '/transactions/1')
+    assert status == 200
+    assert settles(lambda: controller.in_flight == LIST_COST)  # The lookup released its cost
+
+    controller.release(LIST_COST)
+    status, _, _ = http_get(api_url + '/transactions?start=2024-05-01')
+    assert status == 200
+
+
+def test_server_rate_limits_each_client(api_url, monkeypatch):
+    monkeypatch.setattr(api_server, 'rate_limiter', RateLimiter(rate=0.5, burst=2))
+
+    assert http_get(api_url + '/transactions/1')[0] == 200
+    assert http_get(api_url + '/transactions/2')[0] == 200
+    status, headers, _ = http_get(api_url + '/transactions/3')
+    assert status == 429
+    assert int(headers['Retry-After']) >= 1
+
+    # Unauthenticated requests from the same address have their own bucket
+    assert http_get(api_url + '/transactions/3', headers={})[0] == 401
+
+
+def test_fastapi_app_sheds_and_rate_limits(api_url, monkeypatch):
+    pytest.importorskip('fastapi')
+    from fastapi.testclient import TestClient
+
+    import app
+
+    controller = AdmissionController(capacity=20, heavy_share=0.5, wait=0.05)
+    monkeypatch.setattr(app, 'admission', controller)
+    client = TestClient(app.app)
+    assert controller.try_acquire(LIST_COST)
+
+    response = client.get('/transactions?start=2024-05-01', headers=AUTH_HEADERS)
+    assert response.status_code == 503
+    assert client.get('/transactions/1', headers=AUTH_HEADERS).status_code == 200
+    assert settles(lambda: controller.in_flight == LIST_COST)
+
+    monkeypatch.setattr(app, 'rate_limiter', RateLimiter(rate=0.5, burst=1))
+    assert client.get('/transactions/1', headers=AUTH_HEADERS).status_code == 200
+    response = client.get('/transactions/1', headers=AUTH_HEADERS)
+    assert response.status_code == 429
+    assert 'Retry-After' in response.headers
+
+
+@pytest.mark.parametrize('server', ['api_url', 'fastapi_url'])
+def test_change_feed_subscribers_do_not_hold_capacity(request, server, monkeypatch):
+    base_url = request.getfixturevalue(server)
+    controller = AdmissionController(capacity=4, wait=0.05)
+    monkeypatch.setattr(api_server, 'admission', controller)
+    if 'app' in sys.modules:
+        monkeypatch.setattr(sys.modules['app'], 'admission', controller)
+
+    subscribers = []
+    try:
+        for _ in range(4):
+            feed = urllib.request.urlopen(
+                urllib.request.Request(base_url + '/transactions/changes', headers=AUTH_HEADERS),
+                timeout=10)
+            assert feed.readline() == b'retry: 2000\n'
+            subscribers.append(feed)
+
+        assert http_get(base_url + '/transactions/1')[0] == 200
+        assert http_get(base_url + '/transactions?limit=1')[0] == 200
+        assert settles(lambda: controller.in_flight == 0)
+    finally:
+        for feed in subscribers:
+            feed.close()
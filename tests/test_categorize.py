@@ -0,0 +1,87 @@
+"""Category rules: template normalization, rule order and hot reload"""
+
+import json
+import os
+
+import pytest
+
+from categorize import Categorizer, compile_rules, normalize_message
+from conftest import XML_PATH
+from dsa.xml_parser import iter_sms
+
+RECEIVED = 'You have received 2000 RWF from Jane Smith (*********013) at 2024-05-10 16:30:51.'
+PAYMENT = 'Your payment of 1,000 RWF to Airtime with token  has been completed.'
+
+
+def write_rules(path, rules, mtime=None):
+    with open(path, 'w') as f:
+        json.dump(rules, f)
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+    return str(path)
+
+
+def test_normalize_masks_numbers_and_names():
+    assert normalize_message(RECEIVED) == ('<name> have received <#> rwf from <name> (*********<#>) '
+                                           'at <#> <#>')
+    # Different payers share one template, so one cached decision
+    assert normalize_message(RECEIVED.replace('Jane Smith', 'Eric Mugisha')) == normalize_message(RECEIVED)
+    assert normalize_message(PAYMENT) == '<name> payment of <#> rwf to <name> with token has been completed.'
+
+
+def test_first_matching_rule_wins():
+    matcher, groups = compile_rules([
+        {'category': 'Airtime', 'patterns': ['with token']},
+        {'category': 'Sent Money', 'patterns': ['payment of', 'transferred']},
+    ])
+    template = normalize_message(PAYMENT)
+
+    assert groups[matcher.match(template).lastgroup] == 'Airtime'
+    assert groups[matcher.match('you have transferred <#> rwf').lastgroup] == 'Sent Money'
+    assert matcher.match('nothing to see') is None
+    assert compile_rules([]) == (None, {})
+
+
+def test_rule_order_comes_from_the_file(tmp_path):
+    rules = [{'category': 'Sent Money', 'patterns': ['payment of']},
+             {'category': 'Airtime', 'patterns': ['with token']}]
+    categorizer = Categorizer(write_rules(tmp_path / 'rules.json', rules))
+
+    assert categorizer.categorize(PAYMENT)['category_name'] == 'Sent Money'
+
+
+def test_unknown_categories_are_rejected(tmp_path):
+    rules = [{'category': 'Lottery', 'patterns': ['jackpot']},
+             {'category': 'Airtime', 'patterns': ['with token']}]
+    with pytest.raises(ValueError, match='Lottery'):
+        Categorizer(write_rules(tmp_path / 'rules.json', rules))
+
+
+def test_rules_reload_when_the_file_changes(tmp_path):
+    path = write_rules(tmp_path / 'rules.json',
+                       [{'category': 'Airtime', 'patterns': ['with token']}], mtime=1_700_000_000)
+    categorizer = Categorizer(path)
+    assert categorizer.categorize(PAYMENT)['category_name'] == 'Airtime'
+    assert not categorizer.reload_if_changed()
+    assert categorizer.cache
+
+    write_rules(path, [{'category': 'Bill Payment', 'patterns': ['with token']}], mtime=1_700_000_060)
+    assert categorizer.reload_if_changed()
+    assert not categorizer.cache
+    assert categorizer.categorize(PAYMENT)['category_name'] == 'Bill Payment'
+
+    # A bad edit is refused and the previous rules stay in force
+    write_rules(path, [{'category': 'Lottery', 'patterns': ['with token']}], mtime=1_700_000_120)
+    with pytest.raises(ValueError):
+        categorizer.reload_if_changed()
+    assert categorizer.categorize(PAYMENT)['category_name'] == 'Bill Payment'
+
+
+def test_shipped_rules_categorize_the_sample():
+    categorizer = Categorizer()
+    counts = categorizer.categorize_batch(
+        [{'body': sms.get('body')} for sms in iter_sms(XML_PATH)])
+
+    assert counts == {'Sent Money': 1254, 'Received Money': 311, 'Airtime': 76,
+                      'Bill Payment': 37, None: 13}
+    assert len(categorizer.cache) < 50
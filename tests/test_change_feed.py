@@ -0,0 +1,173 @@
+"""Change log history and the thread and asyncio change feed broadcasters"""
+
+import asyncio
+import re
+import socket
+import time
+import urllib.request
+
+from conftest import AUTH_HEADERS
+from change_feed import AsyncChangeBroadcaster, ChangeBroadcaster, ChangeLog
+
+
+class LogStore:
+    """Just the change feed part of a transaction store"""
+
+    def __init__(self, max_events=100):
+        self.changes = ChangeLog(max_events)
+        self.change_listeners = self.changes.listeners
+
+    def changes_since(self, seq):
+        return self.changes.since(seq)
+
+    def last_change_seq(self):
+        return self.changes.last_seq
+
+    def record(self, count=1):
+        for _ in range(count):
+            self.changes.record('create', self.changes.last_seq + 1, {'amount': 1.0})
+
+
+def event_ids(data):
+    return [int(seq) for seq in re.findall(rb'^id: (\d+)$', data, re.M)]
+
+
+def test_since_returns_newer_events():
+    changes = ChangeLog()
+    for trans_id in (1, 2, 3):
+        changes.record('create', trans_id, {'id': trans_id})
+
+    assert [event['seq'] for event in changes.since(1)] == [2, 3]
+    assert changes.since(3) == []
+    assert changes.since(0)[0]['op'] == 'create'
+
+
+def test_since_discarded_history_needs_a_reset():
+    changes = ChangeLog(max_events=3)
+    for trans_id in range(1, 6):
+        changes.record('update', trans_id)
+
+    assert changes.discarded_seq == 2
+    assert changes.since(1) is None
+    assert [event['seq'] for event in changes.since(2)] == [3, 4, 5]
+
+
+def test_since_a_future_sequence_needs_a_reset():
+    # e.g. a client that saw a server before it restarted
+    changes = ChangeLog()
+    changes.record('delete', 1)
+
+    assert changes.since(7) is None
+
+
+def read_until(sock, count, timeout=2):
+    """Read from a subscriber's socket until it holds count events"""
+    sock.settimeout(timeout)
+    data = b''
+    deadline = time.monotonic() + timeout
+    while len(event_ids(data)) < count and time.monotonic() < deadline:
+        data += sock.recv(65536)
+    return data
+
+
+def test_broadcaster_catch_up_and_fan_out():
+    store = LogStore(max_events=5)
+    store.record(3)
+    broadcaster = ChangeBroadcaster(store, poll_interval=0.05)
+    pairs = [socket.socketpair() for _ in range(3)]
+    try:
+        caught_up, live, stale = (client for _, client in pairs)
+        broadcaster.subscribe(pairs[0][0], since=1)
+        broadcaster.subscribe(pairs[1][0])
+        data = read_until(caught_up, 2)
+        assert data.startswith(b'retry: 2000\n\n')
+        assert event_ids(data) == [2, 3]
+
+        store.record(4)
+        assert event_ids(read_until(caught_up, 4)) == [4, 5, 6, 7]
+        assert event_ids(read_until(live, 4)) == [4, 5, 6, 7]
+
+        # Seq 1 has left the five-event history
+        broadcaster.subscribe(pairs[2][0], since=1)
+        data = read_until(stale, 1)
+        assert b'event: reset' in data and event_ids(data) == [7]
+    finally:
+        for server_sock, client_sock in pairs:
+            client_sock.close()
+
+
+def test_async_broadcaster_shares_one_poller():
+    store = LogStore()
+    store.record(3)
+    broadcaster = AsyncChangeBroadcaster(store, poll_interval=0.05)
+
+    async def read(subscriber, count):
+        data = b''
+        while len(event_ids(data)) < count:
+            data += await asyncio.wait_for(subscriber.get(), 2)
+        return data
+
+    async def scenario():
+        caught_up = await broadcaster.subscribe(since=1)
+        live = await broadcaster.subscribe()
+        task = broadcaster._task
+        data = await read(caught_up, 2)
+        assert data.startswith(b'retry: 2000\n\n')
+        assert event_ids(data) == [2, 3]
+
+        # Writes happen on request threads; the listener wakes the poller
+        await asyncio.to_thread(store.record, 2)
+        assert event_ids(await read(caught_up, 2)) == [4, 5]
+        assert event_ids(await read(live, 2)) == [4, 5]
+        assert broadcaster._task is task
+
+        broadcaster.unsubscribe(caught_up)
+        broadcaster.unsubscribe(live)
+        await asyncio.wait_for(task, 2)
+        assert broadcaster._task is None
+
+        # Seq 1 is still retained, so a late subscriber gets everything after it
+        late = await broadcaster.subscribe(since=1)
+        assert event_ids(await read(late, 4)) == [2, 3, 4, 5]
+        broadcaster.unsubscribe(late)
+
+    asyncio.run(scenario())
+
+
+def settles(condition, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_fastapi_subscribers_share_the_broadcaster(fastapi_url):
+    import api_server
+    import app
+
+    seq = api_server.store.last_change_seq()
+    feeds = [urllib.request.urlopen(urllib.request.Request(
+        f'{fastapi_url}/transactions/changes?since={seq}', headers=AUTH_HEADERS), timeout=10)
+        for _ in range(3)]
+    created = None
+    try:
+        for feed in feeds:
+            assert feed.readline() == b'retry: 2000\n'
+        broadcaster = app.get_change_broadcaster()
+        assert settles(lambda: len(broadcaster.subscribers) == 3)
+
+        created = api_server.store.add({'type': 'PAYMENT', 'amount': 5.0})
+        for feed in feeds:
+            assert feed.readline() == b'\n'
+            assert feed.readline() == f'id: {seq + 1}\n'.encode()
+            assert feed.readline() == b'event: create\n'
+            assert f'"id":{created["id"]}'.encode() in feed.readline()
+    finally:
+        for feed in feeds:
+            feed.close()
+        if created:
+            api_server.store.delete(created['id'])
+    # Disconnected clients leave, and the poller stops with the last one
+    assert settles(lambda: not broadcaster.subscribers and broadcaster._task is None)
@@ -0,0 +1,105 @@
+"""Accept-Encoding negotiation, the encoded body cache and compressed responses"""
+
+import gzip
+import json
+import zlib
+
+import pytest
+
+import api_server
+from conftest import AUTH_HEADERS, http_get
+from compression import MIN_COMPRESS_SIZE, ResponseCache, compress, compress_stream, negotiate_encoding
+
+
+@pytest.mark.parametrize('header, expected', [
+    (None, None),
+    ('', None),
+    ('identity', None),
+    ('gzip', 'gzip'),
+    ('deflate, gzip', 'gzip'),
+    ('gzip;q=0.5, deflate', 'deflate'),
+    ('gzip;q=0, *', 'deflate'),
+    ('*;q=0', None),
+    ('GZIP;q=0.8', 'gzip'),
+    ('gzip;q=abc, deflate;q=0.1', 'deflate'),
+    ('br', None),
+])
+def test_negotiate_encoding(header, expected):
+    assert negotiate_encoding(header) == expected
+
+
+def test_small_bodies_are_not_compressed():
+    small = b'x' * (MIN_COMPRESS_SIZE - 1)
+    large = b'x' * MIN_COMPRESS_SIZE
+
+    assert compress(small, 'gzip') == (small, None)
+    assert compress(large, None) == (large, None)
+    body, applied = compress(large, 'gzip')
+    assert applied == 'gzip' and gzip.decompress(body) == large
+    body, applied = compress(large, 'deflate')
+    assert applied == 'deflate' and zlib.decompress(body) == large
+
+
+def test_compress_stream_round_trip():
+    chunks = [b'{"n":%d}\n' % i for i in range(2000)]
+
+    assert gzip.decompress(b''.join(compress_stream(iter(chunks), 'gzip'))) == b''.join(chunks)
+    assert list(compress_stream(iter(chunks), None)) == chunks
+
+
+def test_cache_entries_are_per_path_encoding_and_version():
+    cache = ResponseCache(max_entries=2)
+    cache.put('/transactions', 'gzip', 1, b'gz', 'gzip')
+    cache.put('/transactions', None, 1, b'plain', None)
+
+    assert cache.get('/transactions', 'gzip', 1) == (b'gz', 'gzip')
+    assert cache.get('/transactions', None, 1) == (b'plain', None)
+    assert cache.get('/transactions', 'deflate', 1) is None
+    assert cache.get('/transactions', 'gzip', 2) is None
+
+    cache.get('/transactions', 'gzip', 1)
+    cache.put('/transactions/1', 'gzip', 1, b'one', None)
+    # The least recently used entry made room
+    assert cache.get('/transactions', None, 1) is None
+    assert cache.get('/transactions', 'gzip', 1) == (b'gz', 'gzip')
+
+
+def test_server_headers(api_url):
+    status, headers, body = http_get(api_url + '/transactions?limit=20',
+                                     dict(AUTH_HEADERS, **{'Accept-Encoding': 'gzip'}))
+    assert status == 200
+    assert headers['Content-Encoding'] == 'gzip'
+    assert headers['Vary'] == 'Accept-Encoding'
+    assert json.loads(gzip.decompress(body))['count'] == 20
+
+    status, headers, body = http_get(api_url + '/transactions?limit=20',
+                                     dict(AUTH_HEADERS, **{'Accept-Encoding': 'gzip;q=0, identity'}))
+    assert 'Content-Encoding' not in headers
+    assert headers['Vary'] == 'Accept-Encoding'
+    assert json.loads(body)['count'] == 20
+
+    # Below MIN_COMPRESS_SIZE
+    status, headers, body = http_get(api_url + '/health', dict(AUTH_HEADERS, **{'Accept-Encoding': 'gzip'}))
+    assert status == 200 and len(body) < MIN_COMPRESS_SIZE
+    assert 'Content-Encoding' not in headers
+
+
+def test_server_reuses_encoded_bodies_until_a_write(api_url, monkeypatch):
+    encoded = []
+    monkeypatch.setattr(api_server, 'compress',
+                        lambda body, encoding: encoded.append(encoding) or compress(body, encoding))
+    url = api_url + '/transactions?limit=30&offset=11'
+    gzip_headers = dict(AUTH_HEADERS, **{'Accept-Encoding': 'gzip'})
+
+    first = http_get(url, gzip_headers)[2]
+    assert http_get(url, gzip_headers)[2] == first
+    assert encoded == ['gzip']
+
+    http_get(url)
+    http_get(url)
+    assert encoded == ['gzip', None]
+
+    created = api_server.store.add({'type': 'PAYMENT', 'amount': 5.0})
+    api_server.store.delete(created['id'])
+    assert http_get(url, gzip_headers)[2] == first
+    assert encoded == ['gzip', None, 'gzip']
@@ -0,0 +1,107 @@
+"""Ingest deduplication, including Bloom filter files that fell behind the key set"""
+
+import shutil
+
+from dsa import deduplicator as deduplicator_module
+from dsa.deduplicator import BloomFilter, Deduplicator, dedup_key
+
+
+def message(txid=None, body='Your payment of 1,000 RWF has been completed', sent='1715000000000'):
+    transaction = {'body': body}
+    if txid:
+        transaction['txid'] = txid
+    return transaction, {'date_sent': sent}
+
+
+def test_keys_prefer_transaction_ids():
+    assert dedup_key(*message(txid='123')) == 'txid:123'
+    assert dedup_key(*message(body='Financial Transaction Id: 456. Done')) == 'txid:456'
+    assert dedup_key(*message()) != dedup_key(*message(sent='1715000000001'))
+
+
+def test_duplicates_within_a_run():
+    deduplicator = Deduplicator()
+
+    assert not deduplicator.is_duplicate(*message(txid='1'))
+    assert deduplicator.is_duplicate(*message(txid='1'))
+    assert not deduplicator.is_duplicate(*message())
+    assert deduplicator.is_duplicate(*message())
+    assert deduplicator.stats['duplicates_by_txid'] == 1
+    assert deduplicator.stats['duplicates_by_body'] == 1
+
+
+def test_duplicates_across_runs(tmp_path):
+    db_path, bloom_path = str(tmp_path / 'keys.sqlite'), str(tmp_path / 'keys.bloom')
+    first = Deduplicator(db_path, bloom_path, capacity=1000)
+    assert not first.is_duplicate(*message(txid='1'))
+    first.close()
+
+    second = Deduplicator(db_path, bloom_path, capacity=1000)
+    assert second.is_duplicate(*message(txid='1'))
+    assert not second.is_duplicate(*message(txid='2'))
+
+
+def test_stale_bloom_file(tmp_path):
+    db_path, bloom_path = str(tmp_path / 'keys.sqlite'), str(tmp_path / 'keys.bloom')
+    first = Deduplicator(db_path, bloom_path, capacity=1000)
+    first.save()
+    shutil.copy(bloom_path, tmp_path / 'old.bloom')
+    for txid in ('1', '2', '3'):
+        first.is_duplicate(*message(txid=txid))
+    first.close()
+
+    # The key set has three keys the restored filter never saw, so it is rebuilt
+    shutil.copy(tmp_path / 'old.bloom', bloom_path)
+    second = Deduplicator(db_path, bloom_path, capacity=1000)
+    assert 'txid:1' in second.bloom
+
+    assert second.is_duplicate(*message(txid='1'))
+    assert second.is_duplicate(*message(txid='1'))
+    assert not second.is_duplicate(*message(txid='4'))
+    assert second.stats['duplicates'] == 2
+    second.close()
+
+
+def test_new_keys_are_inserted_in_batches(monkeypatch):
+    monkeypatch.setattr(deduplicator_module, 'PENDING_BATCH', 4)
+    deduplicator = Deduplicator()
+
+    def stored():
+        return deduplicator.db.execute('SELECT COUNT(*) FROM seen_keys').fetchone()[0]
+
+    for txid in ('1', '2', '3'):
+        assert not deduplicator.is_duplicate(*message(txid=txid))
+    assert stored() == 0
+    # Keys still waiting for the batch are duplicates too
+    assert deduplicator.is_duplicate(*message(txid='2'))
+
+    assert not deduplicator.is_duplicate(*message(txid='4'))
+    assert stored() == 4 and not deduplicator.pending
+    assert deduplicator.is_duplicate(*message(txid='4'))
+
+    assert not deduplicator.is_duplicate(*message(txid='5'))
+    deduplicator.save()
+    assert stored() == 5
+
+
+def test_lost_bloom_file_is_rebuilt(tmp_path):
+    db_path, bloom_path = tmp_path / 'keys.sqlite', tmp_path / 'keys.bloom'
+    first = Deduplicator(str(db_path), str(bloom_path), capacity=1000)
+    first.is_duplicate(*message(txid='1'))
+    first.close()
+    bloom_path.unlink()
+
+    second = Deduplicator(str(db_path), str(bloom_path), capacity=1000)
+    assert 'txid:1' in second.bloom
+    assert second.is_duplicate(*message(txid='1'))
+
+
+def test_bloom_filter_round_trip(tmp_path):
+    bloom = BloomFilter(capacity=100)
+    for i in range(100):
+        bloom.add(f'key{i}')
+    bloom.save(str(tmp_path / 'filter'))
+
+    loaded = BloomFilter.load(str(tmp_path / 'filter'))
+    assert all(f'key{i}' in loaded for i in range(100))
+    assert loaded.count == 100
@@ -0,0 +1,129 @@
+"""Streaming CSV/NDJSON export"""
+
+import csv
+import gzip
+import io
+import json
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import export
+from conftest import AUTH_HEADERS, XML_PATH, http_get
+from export import EXPORT_COLUMNS, iter_export, iter_transaction_list, parse_export_query
+
+TRANSACTIONS = [
+    {'id': 1, 'type': 'PAYMENT', 'amount': 1500.0, 'body': 'Paid, "quoted", twice\nok'},
+    {'id': 2, 'type': 'DEPOSIT', 'amount': 20000.0, 'sender': 'Agent Ü'},
+    {'id': 3, 'type': 'TRANSFER', 'amount': 700.0, 'extra': {'nested': True}},
+]
+
+
+def test_parse_export_query():
+    export_format, start_ms, end_ms, types = parse_export_query(
+        {'format': ['CSV'], 'start': ['2024-06-01'], 'type': ['payment,transfer', 'DEPOSIT']})
+    assert export_format == 'csv'
+    assert start_ms is not None and end_ms is None
+    assert types == {'PAYMENT', 'TRANSFER', 'DEPOSIT'}
+
+    assert parse_export_query({})[0] == 'ndjson'
+    with pytest.raises(ValueError):
+        parse_export_query({'format': ['xml']})
+
+
+def test_ndjson_rows_carry_every_field():
+    body = b''.join(iter_export(TRANSACTIONS, 'ndjson')).decode()
+    assert [json.loads(line) for line in body.splitlines()] == TRANSACTIONS
+    assert body.endswith('\n')
+
+
+def test_csv_rows_use_export_columns():
+    body = b''.join(iter_export(TRANSACTIONS, 'csv')).decode()
+    rows = list(csv.DictReader(io.StringIO(body)))
+    assert list(rows[0]) == EXPORT_COLUMNS
+    assert [row['id'] for row in rows] == ['1', '2', '3']
+    assert rows[0]['body'] == TRANSACTIONS[0]['body']
+    assert rows[1]['sender'] == 'Agent Ü'
+
+
+def test_type_filter():
+    body = b''.join(iter_export(TRANSACTIONS, 'ndjson', types={'PAYMENT', 'TRANSFER'}))
+    assert [json.loads(line)['id'] for line in body.splitlines()] == [1, 3]
+
+
+def test_output_is_chunked(monkeypatch):
+    monkeypatch.setattr(export, 'CHUNK_SIZE', 100)
+    transactions = [{'id': i, 'body': 'x' * 50} for i in range(20)]
+    for export_format in ('ndjson', 'csv'):
+        chunks = list(iter_export(transactions, export_format))
+        assert len(chunks) > 5
+        assert all(len(chunk) < 300 for chunk in chunks)
+    chunks = list(iter_transaction_list(transactions))
+    assert len(chunks) > 5
+    assert json.loads(b''.join(chunks)) == {'transactions': transactions, 'count': 20}
+
+
+def test_empty_list_body():
+    assert json.loads(b''.join(iter_transaction_list([]))) == {'transactions': [], 'count': 0}
+
+
+@pytest.mark.parametrize('accept_encoding', [None, 'gzip'])
+def test_export_endpoint(api_url, accept_encoding):
+    headers = dict(AUTH_HEADERS)
+    if accept_encoding:
+        headers['Accept-Encoding'] = accept_encoding
+    status, response_headers, body = http_get(
+        api_url + '/transactions/export?format=csv&type=PAYMENT&start=2024-06-01&end=2024-07-01',
+        headers)
+    assert status == 200
+    assert response_headers['Content-Type'].startswith('text/csv')
+    assert 'transactions.csv' in response_headers['Content-Disposition']
+    if accept_encoding:
+        assert response_headers['Content-Encoding'] == 'gzip'
+        body = gzip.decompress(body)
+
+    rows = list(csv.DictReader(io.StringIO(body.decode())))
+    _, _, listed = http_get(api_url + '/transactions?start=2024-06-01&end=2024-07-01')
+    expected = [trans['id'] for trans in json.loads(listed)['transactions']
+                if trans['type'] == 'PAYMENT']
+    assert rows and [int(row['id']) for row in rows] == expected
+
+
+def test_export_endpoint_rejects_unknown_format(api_url):
+    assert http_get(api_url + '/transactions/export?format=xml')[0] == 400
+
+
+
+@pytest.fixture
+def sqlite_store(tmp_path, monkeypatch):
+    """Serve both servers from a SQLite store, with room for every concurrent export"""
+    import api_server
+    from admission import AdmissionController
+    from db import SQLiteTransactionStore
+
+    store = SQLiteTransactionStore(str(tmp_path / 'momo.sqlite'))
+    store.load_from_xml(XML_PATH)
+    controller = AdmissionController(capacity=1000, heavy_share=1.0)
+    for module in (api_server, sys.modules.get('app')):
+        if module is not None:
+            monkeypatch.setattr(module, 'store', store)
+            monkeypatch.setattr(module, 'admission', controller)
+    return store
+
+
+@pytest.mark.parametrize('server', ['api_url', 'fastapi_url'])
+def test_concurrent_exports_from_sqlite(request, server):
+    base_url = request.getfixturevalue(server)
+    store = request.getfixturevalue('sqlite_store')
+    expected = [trans['id'] for trans in store.iter_all()]
+
+    def export(_):
+        status, _, body = http_get(base_url + '/transactions/export?format=ndjson')
+        return status, [json.loads(line)['id'] for line in body.splitlines()]
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        results = list(pool.map(export, range(32)))
+
+    assert [status for status, _ in results] == [200] * 32
+    assert all(ids == expected for _, ids in results)
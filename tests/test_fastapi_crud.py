@@ -0,0 +1,108 @@
+"""FastAPI create/update/delete endpoints and their error responses"""
+
+import json
+import urllib.error
+import urllib.request
+
+import pytest
+
+from conftest import AUTH_HEADERS, http_get_json
+
+NEW_TRANSACTION = {'type': 'PAYMENT', 'amount': 2500, 'sender': 'Self', 'receiver': 'Jane Smith',
+                   'fee': 0}
+
+
+def send(method, url, data=None, headers=AUTH_HEADERS):
+    """Send a request with an optional JSON body; return (status, parsed body)"""
+    body = data if isinstance(data, bytes) or data is None else json.dumps(data).encode()
+    request = urllib.request.Request(url, data=body, method=method,
+                                     headers=dict(headers, **{'Content-Type': 'application/json'}))
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+@pytest.fixture
+def created(fastapi_url):
+    status, body = send('POST', fastapi_url + '/transactions', dict(NEW_TRANSACTION))
+    assert status == 201
+    transaction = body['transaction']
+    yield transaction
+    send('DELETE', f"{fastapi_url}/transactions/{transaction['id']}")
+
+
+def test_create(fastapi_url, created):
+    assert created['amount'] == 2500
+    assert created['status'] == 'COMPLETED'
+    assert 'timestamp' in created
+    assert http_get_json(f"{fastapi_url}/transactions/{created['id']}") == (200, created)
+
+
+def test_update(fastapi_url, created):
+    url = f"{fastapi_url}/transactions/{created['id']}"
+    status, body = send('PUT', url, {'amount': 3000, 'id': 1})
+
+    assert status == 200
+    assert body['transaction']['amount'] == 3000
+    assert body['transaction']['id'] == created['id']
+    assert http_get_json(url)[1]['amount'] == 3000
+
+
+def test_delete(fastapi_url, created):
+    url = f"{fastapi_url}/transactions/{created['id']}"
+
+    assert send('DELETE', url) == (200, {'message': f"Transaction {created['id']} deleted successfully",
+                                         'id': created['id']})
+    assert http_get_json(url)[0] == 404
+    assert send('DELETE', url)[0] == 404
+
+
+@pytest.mark.parametrize('method, path, data', [
+    ('GET', '/transactions/999999999', None),
+    ('PUT', '/transactions/999999999', {'amount': 10}),
+    ('DELETE', '/transactions/999999999', None),
+])
+def test_missing_transactions_are_404(fastapi_url, method, path, data):
+    status, body = send(method, fastapi_url + path, data)
+
+    assert status == 404
+    assert body == {'error': 'Transaction with ID 999999999 not found', 'status_code': 404}
+
+
+@pytest.mark.parametrize('method, path, data, error', [
+    ('POST', '/transactions', b'{not json', 'Invalid JSON in request body'),
+    ('POST', '/transactions', [1, 2], 'Invalid JSON in request body'),
+    ('POST', '/transactions', {'type': 'PAYMENT', 'amount': 5}, 'Missing required field: sender'),
+    ('POST', '/transactions', dict(NEW_TRANSACTION, amount=-1), 'Amount must be greater than 0'),
+    ('POST', '/transactions', dict(NEW_TRANSACTION, type='LOAN'), None),
+    ('PUT', '/transactions/1', {'fee': -5}, 'Fee cannot be negative'),
+    ('PUT', '/transactions/abc', {'amount': 5}, 'Invalid transaction ID - must be an integer'),
+    ('DELETE', '/transactions/abc', None, 'Invalid transaction ID - must be an integer'),
+])
+def test_invalid_requests_are_400(fastapi_url, method, path, data, error):
+    status, body = send(method, fastapi_url + path, data)
+
+    assert status == 400
+    assert body['status_code'] == 400
+    if error:
+        assert body['error'] == error
+
+
+@pytest.mark.parametrize('headers', [
+    {},
+    {'Authorization': 'Bearer token'},
+    {'Authorization': 'Basic ' + 'YWRtaW46d3Jvbmc='},  # admin:wrong
+])
+@pytest.mark.parametrize('method, path, data', [
+    ('POST', '/transactions', NEW_TRANSACTION),
+    ('PUT', '/transactions/1', {'amount': 10}),
+    ('DELETE', '/transactions/1', None),
+])
+def test_writes_need_credentials(fastapi_url, headers, method, path, data):
+    status, body = send(method, fastapi_url + path, data, headers)
+
+    assert status == 401
+    assert body == {'error': 'Unauthorized - Invalid or missing credentials', 'status_code': 401}
+    assert http_get_json(fastapi_url + '/transactions/1')[0] == 200
@@ -0,0 +1,66 @@
+"""Fee engine tiers, batch path and historical recalculation"""
+
+import pytest
+
+import fee_engine
+from fee_engine import FeeEngine, recalculate_fees
+
+
+@pytest.fixture
+def engine():
+    return FeeEngine()
+
+
+@pytest.mark.parametrize('amount, fee', [
+    (1, 1.00), (1000, 1.00), (1000.01, 5.00), (10000, 5.00),
+    (10001, 10.00), (50000, 10.00), (50001, 20.00), (1_000_000, 20.00),
+])
+def test_payment_tiers(engine, amount, fee):
+    assert engine.calculate(amount, 'PAYMENT') == fee
+
+
+@pytest.mark.parametrize('amount, fee', [(10, 0.50), (100, 1.50), (900, 13.50), (5000, 15.00)])
+def test_transfer_percentage_is_clamped(engine, amount, fee):
+    assert engine.calculate(amount, 'TRANSFER') == fee
+    assert engine.calculate(amount, 'WITHDRAWAL') == fee
+
+
+def test_types_without_fee_type_use_default_for_new_transactions(engine):
+    assert not engine.has_fee_type('DEPOSIT')
+    assert engine.calculate(5000, 'DEPOSIT') == 50.0
+
+
+@pytest.mark.parametrize('use_numpy', [True, False])
+def test_batch_matches_single(engine, monkeypatch, use_numpy):
+    if use_numpy:
+        pytest.importorskip('numpy')
+    else:
+        monkeypatch.setattr(fee_engine, '_numpy', None)
+    amounts = [5, 999, 1000, 1000.5, 9999.99, 10000, 49999, 50000, 50001, 250000]
+    types = ['PAYMENT', 'TRANSFER', 'WITHDRAWAL', 'DEPOSIT', 'RECEIVED'] * 2
+
+    fees = engine.calculate_batch(amounts, types)
+
+    assert [float(fee) for fee in fees] == [
+        engine.calculate(amount, txn_type) for amount, txn_type in zip(amounts, types)
+    ]
+
+
+def test_recalculate_skips_unpriced_types_and_reported_fees(engine):
+    transactions = [
+        {'amount': 5000, 'type': 'RECEIVED', 'body': 'You have received 5000 RWF'},
+        {'amount': 5000, 'type': 'DEPOSIT'},
+        {'amount': 5000, 'type': 'TRANSFER', 'body': '... Fee was: 100 RWF', 'fee': 100.0},
+        {'amount': 5000, 'type': 'TRANSFER', 'body': 'no fee in this message'},
+        {'amount': 600, 'type': 'PAYMENT', 'fee': 3.0},
+        {'type': 'PAYMENT'},
+    ]
+
+    assert recalculate_fees(transactions, engine) == 2
+
+    assert 'fee' not in transactions[0] and 'fee' not in transactions[1]
+    assert transactions[2]['fee'] == 100.0
+    assert transactions[3]['fee'] == 15.0
+    assert transactions[4]['fee'] == 1.0
+    assert 'fee' not in transactions[5]
+    assert recalculate_fees(transactions, engine) == 0
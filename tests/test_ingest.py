@@ -0,0 +1,106 @@
+"""Compressed backups and directory-watch ingest"""
+
+import gzip
+import json
+import os
+import shutil
+
+import pytest
+
+import dsa.xml_parser as xml_parser
+import run
+from conftest import XML_PATH
+from dsa.xml_parser import iter_sms
+
+
+@pytest.fixture(scope='module')
+def xml_bytes():
+    with open(XML_PATH, 'rb') as f:
+        return f.read()
+
+
+@pytest.fixture(scope='module')
+def plain_messages():
+    return list(iter_sms(XML_PATH))
+
+
+def write(path, data):
+    with open(path, 'wb') as f:
+        f.write(data)
+    return str(path)
+
+
+def test_gzip_backup(tmp_path, xml_bytes, plain_messages):
+    path = write(tmp_path / 'backup.xml.gz', gzip.compress(xml_bytes))
+    assert list(iter_sms(path)) == plain_messages
+
+
+def test_compression_is_detected_from_content(tmp_path, xml_bytes, plain_messages):
+    path = write(tmp_path / 'backup.xml', gzip.compress(xml_bytes))
+    assert list(iter_sms(path)) == plain_messages
+
+
+def test_zstd_backup_with_several_frames(tmp_path, xml_bytes, plain_messages):
+    zstandard = pytest.importorskip('zstandard')
+    compressor = zstandard.ZstdCompressor()
+    middle = len(xml_bytes) // 2
+    path = write(tmp_path / 'backup.xml.zst',
+                 compressor.compress(xml_bytes[:middle]) + compressor.compress(xml_bytes[middle:]))
+    assert list(iter_sms(path)) == plain_messages
+
+
+def test_zstd_backup_without_zstandard(tmp_path, monkeypatch):
+    path = write(tmp_path / 'backup.xml.zst', b'\x28\xb5\x2f\xfd' + b'\0' * 16)
+    monkeypatch.setattr(xml_parser, 'zstandard', None)
+    with pytest.raises(ImportError, match='zstandard'):
+        list(iter_sms(path))
+
+
+def test_overlapping_backups_are_deduplicated(tmp_path, xml_bytes, plain_messages):
+    output = str(tmp_path / 'processed.json')
+    plain = write(tmp_path / 'a.xml', xml_bytes)
+    compressed = write(tmp_path / 'b.xml.gz', gzip.compress(xml_bytes))
+
+    added = run.ingest_backups([plain, compressed], output)
+    with open(output) as f:
+        saved = json.load(f)
+    assert len(saved) == len(added) > 0
+    assert [trans['id'] for trans in saved] == list(range(1, len(saved) + 1))
+
+    # Both files are in the ingest log, so neither is parsed again
+    assert run.ingest_backups([plain, compressed], output) == []
+    with open(run.ingest_log_path(output)) as f:
+        log = json.load(f)
+    assert sorted(entry['file'] for entry in log.values()) == ['a.xml', 'b.xml.gz']
+    assert [entry['transactions'] for entry in log.values()] == [len(saved), 0]
+
+
+def test_broken_backup_is_recorded_not_retried(tmp_path, capsys):
+    output = str(tmp_path / 'processed.json')
+    broken = write(tmp_path / 'broken.xml.gz', gzip.compress(b'<smses><sms')[:-4])
+
+    assert run.ingest_backups([broken], output) == []
+    with open(run.ingest_log_path(output)) as f:
+        assert 'error' in next(iter(json.load(f).values()))
+
+    capsys.readouterr()
+    run.ingest_backups([broken], output)
+    assert 'failed before' in capsys.readouterr().out
+
+
+def test_watch_once_uses_worker_processes(tmp_path, xml_bytes, capsys):
+    raw_dir = tmp_path / 'raw'
+    raw_dir.mkdir()
+    write(raw_dir / 'first.xml.gz', gzip.compress(xml_bytes))
+    shutil.copy(XML_PATH, raw_dir / 'notes.txt')
+    output = str(tmp_path / 'processed.json')
+
+    run.watch(str(raw_dir), output, workers=2, once=True)
+
+    out = capsys.readouterr().out
+    assert 'first.xml.gz' in out and 'notes.txt' not in out
+    # Template statistics come back from the workers
+    assert 'unmatched SMS templates' in out
+    with open(output) as f:
+        assert len(json.load(f)) > 0
+    assert os.path.exists(run.ingest_log_path(output))
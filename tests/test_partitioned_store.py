@@ -0,0 +1,133 @@
+"""Partitioned store: id index, lazy cold partitions and the write journal"""
+
+import json
+import os
+import random
+
+import pytest
+
+import partitioned_store
+from conftest import XML_PATH
+from partitioned_store import MANIFEST_NAME, IdIndex, PartitionedTransactionStore
+from timestamps import timestamp_to_epoch_ms
+
+
+@pytest.fixture
+def partition_dir(tmp_path):
+    path = str(tmp_path / 'partitions')
+    PartitionedTransactionStore(path).load_from_xml(XML_PATH)
+    return path
+
+
+def test_id_index_matches_a_dict():
+    rng = random.Random(7)
+    index, expected = IdIndex(), {}
+    for _ in range(5000):
+        trans_id, month = rng.randint(1, 200), rng.choice(['2024-05', '2024-06', '2024-07'])
+        if trans_id in expected:
+            index.remove(trans_id)
+            del expected[trans_id]
+        else:
+            index.add(trans_id, month)
+            expected[trans_id] = month
+    assert all(index.month_of(trans_id) == expected.get(trans_id) for trans_id in range(202))
+    assert IdIndex(index.runs()).runs() == index.runs()
+
+
+def test_consecutive_ids_share_a_run():
+    index = IdIndex()
+    for trans_id in (1, 3, 2, 4):
+        index.add(trans_id, '2024-06')
+    assert index.runs() == [[1, 4, '2024-06']]
+    index.remove(2)
+    assert index.runs() == [[1, 1, '2024-06'], [3, 4, '2024-06']]
+
+
+def test_lookup_loads_only_the_partition_holding_the_id(partition_dir):
+    store = PartitionedTransactionStore(partition_dir, hot_partitions=0)
+    oldest = min(store.manifest)
+    trans_id = store.manifest[oldest]['min_id']
+
+    assert store.get_by_id(trans_id)['id'] == trans_id
+    assert list(store.loaded) == [oldest]
+    assert store.get_by_id(10 ** 9) is None
+    assert list(store.loaded) == [oldest]
+
+
+def test_writes_are_journaled_and_replayed(partition_dir):
+    store = PartitionedTransactionStore(partition_dir)
+    with open(os.path.join(partition_dir, MANIFEST_NAME)) as f:
+        manifest = f.read()
+
+    created = store.add({'type': 'PAYMENT', 'amount': 10.0, 'timestamp': '2023-01-05T09:00:00'})
+    store.update(5, {'timestamp': '2025-03-01T00:00:00'})
+    store.delete(6)
+
+    # Nothing but the journal was written
+    with open(os.path.join(partition_dir, MANIFEST_NAME)) as f:
+        assert f.read() == manifest
+    assert not os.path.exists(os.path.join(partition_dir, '2023-01.json'))
+
+    reopened = PartitionedTransactionStore(partition_dir)
+    assert reopened.count() == store.count()
+    assert reopened.get_by_id(created['id'])['amount'] == 10.0
+    assert reopened.get_by_id(5)['timestamp'] == '2025-03-01T00:00:00'
+    assert reopened.get_by_id(6) is None
+    assert reopened.next_id == store.next_id
+    assert os.path.exists(os.path.join(partition_dir, '2023-01.json'))
+    assert not os.path.exists(reopened.journal_path)
+
+
+def test_torn_journal_line_is_ignored(partition_dir):
+    store = PartitionedTransactionStore(partition_dir)
+    created = store.add({'type': 'PAYMENT', 'amount': 10.0, 'timestamp': '2024-06-05T09:00:00'})
+    with open(store.journal_path, 'a') as f:
+        f.write('{"op":"put","mon')
+
+    reopened = PartitionedTransactionStore(partition_dir)
+    assert reopened.get_by_id(created['id'])['amount'] == 10.0
+
+
+def test_partitions_are_flushed_in_batches(partition_dir, monkeypatch):
+    monkeypatch.setattr(partitioned_store, 'FLUSH_WRITES', 10)
+    store = PartitionedTransactionStore(partition_dir)
+    for _ in range(25):
+        store.add({'type': 'PAYMENT', 'amount': 1.0, 'timestamp': '2024-06-05T09:00:00'})
+
+    assert store.stats['flushes'] == 2
+    assert store.journal_entries == 5
+    with open(os.path.join(partition_dir, MANIFEST_NAME)) as f:
+        assert json.load(f)['next_id'] == store.next_id - 5
+
+
+def test_manifest_without_index_is_indexed(partition_dir):
+    manifest_path = os.path.join(partition_dir, MANIFEST_NAME)
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    del manifest['id_runs']
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f)
+
+    store = PartitionedTransactionStore(partition_dir)
+    assert store.get_by_id(1)['id'] == 1
+    with open(manifest_path) as f:
+        assert 'id_runs' in json.load(f)
+
+
+def test_range_count_and_pages_skip_whole_partitions(partition_dir, monkeypatch):
+    store = PartitionedTransactionStore(partition_dir, hot_partitions=0)
+    reads = []
+    read_partition = store._read_partition
+    monkeypatch.setattr(store, '_read_partition', lambda month: reads.append(month) or read_partition(month))
+    # Whole months except a straddling start in mid-June
+    start_ms, end_ms = timestamp_to_epoch_ms('2024-06-15'), timestamp_to_epoch_ms('2024-10-01')
+    expected = store.get_range(start_ms, end_ms)
+    store.loaded.clear()
+    reads.clear()
+
+    assert store.count_range(start_ms, end_ms) == len(expected)
+    assert reads == ['2024-06']
+
+    reads.clear()
+    assert store.get_range_page(start_ms, end_ms, len(expected) - 5, 10) == expected[-5:]
+    assert reads == ['2024-06', '2024-09']
@@ -0,0 +1,112 @@
+"""Pre-fork snapshot: file layout, change log overlay and replay across workers"""
+
+import json
+import random
+
+import pytest
+
+from prefork_server import SnapshotStore, SnapshotWriter, write_snapshot
+
+
+def transaction(trans_id, **fields):
+    trans = {'id': trans_id, 'type': 'PAYMENT', 'amount': 100.0 * trans_id,
+             'timestamp': '2024-06-15T12:00:00'}
+    trans.update(fields)
+    return trans
+
+
+@pytest.fixture
+def paths(tmp_path):
+    snapshot_path, log_path = str(tmp_path / 'transactions.snapshot'), tmp_path / 'changes.log'
+    transactions = [transaction(trans_id) for trans_id in (1, 2, 3, 5, 8)]
+    random.Random(3).shuffle(transactions)
+    write_snapshot(transactions, snapshot_path)
+    log_path.touch()
+    return snapshot_path, str(log_path)
+
+
+def test_snapshot_round_trip(paths):
+    store = SnapshotStore(*paths)
+
+    assert store.count() == 5
+    assert store.get_all() == [transaction(trans_id) for trans_id in (1, 2, 3, 5, 8)]
+    assert store.get_by_id(5) == transaction(5)
+    assert store.get_by_id(4) is None
+    assert store.get_by_id(9) is None
+    assert store.next_id == 9
+
+
+def test_empty_snapshot(tmp_path):
+    snapshot_path, log_path = tmp_path / 'empty.snapshot', tmp_path / 'changes.log'
+    write_snapshot([], str(snapshot_path))
+    log_path.touch()
+    store = SnapshotStore(str(snapshot_path), str(log_path))
+
+    assert store.count() == 0
+    assert store.get_all() == []
+    assert store.next_id == 1
+
+
+def test_rejects_other_files(paths, tmp_path):
+    other = tmp_path / 'other'
+    other.write_bytes(b'not a snapshot at all')
+    with pytest.raises(ValueError):
+        SnapshotStore(str(other), paths[1])
+
+
+def test_writes_are_visible_to_other_stores(paths):
+    writer, reader = SnapshotWriter(*paths), SnapshotStore(*paths)
+
+    created = writer.add({'type': 'DEPOSIT', 'amount': 50.0})
+    assert created['id'] == 9
+    assert reader.get_by_id(9) == created
+
+    assert writer.update(2, {'amount': 1.0, 'id': 99})['id'] == 2
+    assert reader.get_by_id(2)['amount'] == 1.0
+    assert writer.update(4, {'amount': 1.0}) is None
+
+    assert writer.delete(3)
+    assert not writer.delete(3)
+    assert reader.get_by_id(3) is None
+    assert [trans['id'] for trans in reader.iter_all()] == [1, 2, 5, 8, 9]
+
+
+def test_count_after_deletes(paths):
+    writer, reader = SnapshotWriter(*paths), SnapshotStore(*paths)
+    added = writer.add({'type': 'DEPOSIT', 'amount': 50.0})
+    writer.update(1, {'amount': 2.0})
+    writer.delete(1)  # Updated, then deleted snapshot row
+    writer.delete(8)
+    writer.delete(added['id'])  # Row that only ever lived in the log
+
+    assert reader.count() == writer.count() == 3
+    assert [trans['id'] for trans in reader.iter_all()] == [2, 3, 5]
+    # IDs are not reused after the newest transaction is deleted
+    assert writer.add({'type': 'DEPOSIT', 'amount': 1.0})['id'] == 10
+
+
+def test_refresh_replays_complete_lines_only(paths):
+    reader = SnapshotStore(*paths)
+    entries = [{'id': 9, 'transaction': transaction(9)},
+               {'id': 2, 'transaction': transaction(2, amount=7.0)},
+               {'id': 5, 'transaction': None}]
+    log = b''.join(json.dumps(entry).encode() + b'\n' for entry in entries)
+    torn = len(log) - 10
+
+    with open(paths[1], 'ab') as f:
+        f.write(log[:torn])
+        f.flush()
+        # The last entry is half-written: only the first two apply
+        assert reader.count() == 6
+        assert reader.get_by_id(5) == transaction(5)
+        assert reader.get_by_id(2)['amount'] == 7.0
+
+        f.write(log[torn:])
+    assert reader.get_by_id(5) is None
+    assert reader.count() == 5
+
+    events = reader.changes_since(0)
+    assert [(event['op'], event['id']) for event in events] == [
+        ('create', 9), ('update', 2), ('delete', 5)]
+    # Sequence numbers are log offsets, so every worker agrees on them
+    assert events[-1]['seq'] == reader.last_change_seq() == len(log) == reader.version
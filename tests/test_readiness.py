@@ -0,0 +1,107 @@
+"""Readiness and request validation shared by the stdlib and FastAPI servers"""
+
+import json
+
+import pytest
+
+import api_server
+from conftest import AUTH_HEADERS, http_get
+
+
+@pytest.fixture
+def fastapi_get(api_url):
+    pytest.importorskip('fastapi')
+    from fastapi.testclient import TestClient
+
+    import app
+    client = TestClient(app.app)
+
+    def get(path, headers=AUTH_HEADERS):
+        response = client.get(path, headers=headers)
+        return response.status_code, response.headers, response.content
+    return get
+
+
+@pytest.fixture
+def stdlib_get(api_url):
+    def get(path, headers=AUTH_HEADERS):
+        return http_get(api_url + path, headers)
+    return get
+
+
+@pytest.fixture(params=['stdlib', 'fastapi'])
+def get(request):
+    return request.getfixturevalue(f'{request.param}_get')
+
+
+@pytest.fixture
+def not_ready(monkeypatch):
+    """Put the shared store back into its loading state for one test"""
+    api_server.store_ready.clear()
+    yield monkeypatch
+    api_server.store_ready.set()
+
+
+def test_ready(get):
+    status, _, body = get('/ready', headers={})
+    assert status == 200
+    assert json.loads(body) == {'status': 'ready', 'transactions': api_server.store.count()}
+
+
+def test_loading(get, not_ready):
+    status, headers, body = get('/ready', headers={})
+    assert status == 503
+    assert json.loads(body) == {'status': 'loading'}
+    assert headers['Retry-After'] == '1'
+
+    status, headers, _ = get('/transactions/1')
+    assert status == 503
+    assert headers['Retry-After'] == '1'
+
+
+def test_failed_load(get, not_ready):
+    not_ready.setattr(api_server, 'load_error', 'XML not found')
+
+    status, headers, body = get('/ready', headers={})
+    assert status == 503
+    assert json.loads(body) == {'status': 'failed', 'error': 'XML not found'}
+    assert 'Retry-After' not in headers
+
+    status, headers, body = get('/transactions/1')
+    assert status == 503
+    assert 'failed to load' in json.loads(body)['error']
+    assert 'Retry-After' not in headers
+
+
+@pytest.mark.parametrize('query, status', [
+    ('limit=0', 400),
+    ('offset=-1', 400),
+    ('limit=abc', 400),
+    ('offset=1.5', 400),
+    ('limit=5', 200),
+    ('offset=10', 200),
+    ('offset=0&limit=1', 200),
+])
+def test_paging_validation(stdlib_get, fastapi_get, query, status):
+    answers = []
+    for get in (stdlib_get, fastapi_get):
+        code, _, body = get('/transactions?' + query)
+        answers.append((code, json.loads(body)))
+
+    (stdlib_status, stdlib_body), (fastapi_status, fastapi_body) = answers
+    assert stdlib_status == fastapi_status == status
+    if status == 200:
+        for field in ('count', 'total', 'offset', 'limit'):
+            assert stdlib_body[field] == fastapi_body[field]
+        assert stdlib_body['limit'] == (5 if 'limit=5' in query else
+                                        1 if 'limit=1' in query else api_server.DEFAULT_PAGE_SIZE)
+    else:
+        assert stdlib_body['error'] == fastapi_body['error']
+
+
+@pytest.mark.parametrize('query, status', [('limit=-1', 400), ('limit=x', 400), ('limit=0', 200)])
+def test_reconciliation_limit_validation(get, query, status):
+    code, _, body = get('/transactions/reconciliation?' + query)
+    assert code == status
+    if status == 200:
+        assert json.loads(body)['issues'] == []
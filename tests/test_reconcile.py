@@ -0,0 +1,118 @@
+"""Balance reconciliation: issue classification and full vs incremental runs"""
+
+import pytest
+
+import dsa.reconcile as reconcile_module
+from api_server import TransactionStore
+from conftest import XML_PATH
+from dsa.reconcile import epoch_ms, reconcile
+from dsa.xml_parser import parse_xml_to_json
+from reconciliation import BalanceReconciler
+
+
+@pytest.fixture(params=['numpy', 'python'])
+def backend(request, monkeypatch):
+    if request.param == 'numpy':
+        pytest.importorskip('numpy')
+    else:
+        monkeypatch.setattr(reconcile_module, 'np', None)
+    return request.param
+
+
+@pytest.fixture(scope='module')
+def sample():
+    return parse_xml_to_json(XML_PATH)
+
+
+def sms(trans_id, minute, txn_type, amount, new_balance=None, fee=0.0):
+    return {'id': trans_id, 'timestamp': f'2024-06-01T10:{minute:02d}:00', 'type': txn_type,
+            'amount': amount, 'fee': fee, 'new_balance': new_balance}
+
+
+def issue_kinds(report):
+    return [(issue['id'], issue['issue']) for issue in report['issues']]
+
+
+def test_consistent_balances_have_no_issues(backend):
+    transactions = [
+        sms(1, 0, 'DEPOSIT', 1000, 1000),
+        sms(2, 1, 'PAYMENT', 200, 790, fee=10),
+        sms(3, 2, 'RECEIVED', 500),
+        sms(4, 3, 'TRANSFER', 100, 1185, fee=5),
+    ]
+    report, state = reconcile(transactions)
+    assert report['issues'] == []
+    assert report['checked'] == 2
+    assert report['closing_balance'] == 1185
+
+
+def test_issue_classification(backend):
+    transactions = [
+        sms(1, 0, 'DEPOSIT', 1000, 1000),
+        sms(2, 1, 'PAYMENT', 200, 1000),        # Balance did not move
+        sms(3, 2, 'RECEIVED', 300, 700),        # Moved the wrong way
+        sms(4, 3, 'PAYMENT', 100, 50),          # 550 unexplained
+        sms(5, 4, 'OTHER', 10),                 # Breaks the chain
+        sms(6, 5, 'PAYMENT', 100, -20),
+    ]
+    report, _ = reconcile(transactions)
+    assert issue_kinds(report) == [
+        (2, 'duplicate'), (3, 'reversed'), (4, 'missing_activity'), (6, 'negative_balance'),
+    ]
+    assert report['checked'] == 3
+
+
+def test_incremental_run_matches_full_run(backend, sample):
+    ordered = sorted(sample, key=lambda trans: epoch_ms(trans['timestamp']))
+    full, full_state = reconcile(ordered)
+
+    state = None
+    issues = []
+    checked = 0
+    for start in range(0, len(ordered), 250):
+        report, state = reconcile(ordered[start:start + 250], state)
+        issues.extend(report['issues'])
+        checked += report['checked']
+
+    assert full['issues']
+    assert checked == full['checked']
+    assert issue_kinds({'issues': issues}) == issue_kinds(full)
+    assert state['balance'] == full_state['balance']
+    assert state['transactions'] == len(ordered)
+
+
+def test_numpy_and_python_agree(sample, monkeypatch):
+    pytest.importorskip('numpy')
+    vectorized, _ = reconcile(sample)
+    monkeypatch.setattr(reconcile_module, 'np', None)
+    looped, _ = reconcile(sample)
+    assert looped == vectorized
+
+
+def test_reconciler_only_checks_new_transactions(backend):
+    store = TransactionStore()
+    store.load_from_xml(XML_PATH)
+    reconciler = BalanceReconciler(store)
+    reconciler.report()
+
+    last = max(store.get_all(), key=lambda trans: epoch_ms(trans['timestamp']))
+    store.add({'type': 'PAYMENT', 'amount': 100.0, 'fee': 0.0,
+               'timestamp': epoch_ms(last['timestamp']) + 60_000,
+               'new_balance': last['new_balance'] - 1000})
+    report = reconciler.report()
+    assert reconciler.stats == {'full_runs': 1, 'incremental_runs': 1}
+
+    fresh = BalanceReconciler(store).report()
+    assert report == fresh
+    assert report['issues'][-1]['issue'] == 'missing_activity'
+
+
+def test_reconciler_reruns_after_an_update(backend):
+    store = TransactionStore()
+    store.load_from_xml(XML_PATH)
+    reconciler = BalanceReconciler(store)
+    reconciler.report()
+
+    store.update(1, {'amount': 1.0})
+    assert reconciler.report() == BalanceReconciler(store).report()
+    assert reconciler.stats['full_runs'] == 2
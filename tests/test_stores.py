@@ -0,0 +1,155 @@
+"""TransactionStore contract shared by the memory, SQLite and partitioned backends"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import db
+from conftest import XML_PATH
+from api_server import TransactionStore
+from db import SQLiteTransactionStore
+from fee_engine import recalculate_fees
+from partitioned_store import PartitionedTransactionStore
+from timestamps import timestamp_to_epoch_ms
+
+JUNE_2024 = (timestamp_to_epoch_ms('2024-06-01'), timestamp_to_epoch_ms('2024-07-01'))
+
+
+@pytest.fixture(params=['memory', 'sqlite', 'partitioned'])
+def store(request, tmp_path):
+    if request.param == 'memory':
+        store = TransactionStore()
+    elif request.param == 'sqlite':
+        store = SQLiteTransactionStore(str(tmp_path / 'momo.sqlite'))
+    else:
+        store = PartitionedTransactionStore(str(tmp_path / 'partitions'), memory_budget=100_000)
+    store.load_from_xml(XML_PATH)
+    return store
+
+
+@pytest.fixture(scope='module')
+def reference():
+    store = TransactionStore()
+    store.load_from_xml(XML_PATH)
+    return store
+
+
+def ids(transactions):
+    return sorted(trans['id'] for trans in transactions)
+
+
+def new_transaction(**fields):
+    transaction = {'type': 'PAYMENT', 'amount': 2500.0, 'fee': 5.0,
+                   'timestamp': '2024-06-15T12:00:00', 'status': 'completed'}
+    transaction.update(fields)
+    return transaction
+
+
+def test_loads_the_same_transactions(store, reference):
+    assert store.count() == reference.count()
+    assert ids(store.get_all()) == ids(reference.get_all())
+    assert ids(store.iter_all()) == ids(reference.get_all())
+
+
+def test_get_by_id(store, reference):
+    for expected in reference.get_all()[::97]:
+        transaction = store.get_by_id(expected['id'])
+        for field in ('amount', 'fee', 'type', 'timestamp', 'body', 'new_balance'):
+            assert transaction.get(field) == expected.get(field)
+    assert store.get_by_id(10 ** 9) is None
+
+
+def test_pages_cover_every_transaction_once(store):
+    seen = []
+    for offset in range(0, store.count() + 100, 100):
+        page = store.get_page(offset, 100)
+        assert len(page) == min(100, max(0, store.count() - offset))
+        seen.extend(page)
+    assert ids(seen) == ids(store.get_all())
+
+
+def test_range_queries(store, reference):
+    start_ms, end_ms = JUNE_2024
+    expected = ids(reference.get_range(start_ms, end_ms))
+
+    assert expected
+    assert ids(store.get_range(start_ms, end_ms)) == expected
+    assert ids(store.iter_range(start_ms, end_ms)) == expected
+    assert ids(store.iter_range()) == ids(reference.get_all())
+
+
+@pytest.mark.parametrize('start, end', [('2024-06-01', '2024-07-01'), ('2024-06-15', '2024-09-10'),
+                                        ('2024-08-20', None), (None, '2024-05-20')])
+def test_range_pages_and_counts(store, start, end):
+    start_ms = timestamp_to_epoch_ms(start) if start else None
+    end_ms = timestamp_to_epoch_ms(end) if end else None
+    matching = store.get_range(start_ms, end_ms)
+
+    assert store.count_range(start_ms, end_ms) == len(matching)
+    for offset in (0, 7, 150, len(matching) - 3, len(matching) + 10):
+        assert store.get_range_page(start_ms, end_ms, offset, 100) == matching[offset:offset + 100]
+
+
+def test_add_update_delete(store):
+    count = store.count()
+    last_id = max(ids(store.get_all()))
+    created = store.add(new_transaction())
+    assert created['id'] > last_id
+    assert store.count() == count + 1
+    assert store.get_by_id(created['id'])['amount'] == 2500.0
+
+    # Moving a transaction to another month keeps it reachable by ID and range
+    updated = store.update(created['id'], {'amount': 3000.0, 'timestamp': '2025-01-15T08:00:00'})
+    assert updated['amount'] == 3000.0
+    assert store.get_by_id(created['id'])['timestamp'] == '2025-01-15T08:00:00'
+    assert created['id'] not in ids(store.get_range(*JUNE_2024))
+    assert store.update(10 ** 9, {'amount': 1.0}) is None
+
+    assert store.delete(created['id'])
+    assert store.get_by_id(created['id']) is None
+    assert not store.delete(created['id'])
+    assert store.count() == count
+
+
+def test_writes_change_the_version_and_feed(store):
+    version, seq = store.version, store.last_change_seq()
+    created = store.add(new_transaction())
+    store.update(created['id'], {'status': 'failed'})
+    store.delete(created['id'])
+
+    assert store.version != version
+    events = store.changes_since(seq)
+    assert [event['op'] for event in events] == ['create', 'update', 'delete']
+    assert all(event['id'] == created['id'] for event in events)
+    assert store.changes_since(store.last_change_seq()) == []
+
+
+def test_recalculate_fees(store, reference):
+    transactions = [dict(trans) for trans in reference.get_all()]
+    expected = recalculate_fees(transactions)
+
+    assert store.recalculate_fees() == expected
+    assert store.recalculate_fees() == 0
+    fees = {trans['id']: trans.get('fee') for trans in transactions}
+    assert {trans['id']: trans.get('fee') for trans in store.iter_all()} == fees
+
+
+def test_sqlite_iterators_page_across_threads(tmp_path, reference, monkeypatch):
+    monkeypatch.setattr(db, 'FETCH_SIZE', 7)
+    store = SQLiteTransactionStore(str(tmp_path / 'momo.sqlite'))
+    store.load_from_xml(XML_PATH)
+    start_ms, end_ms = JUNE_2024
+
+    # A streamed response may advance its iterator on a different thread each time
+    for iterator, expected in [(store.iter_all(), reference.get_all()),
+                               (store.iter_range(start_ms, end_ms),
+                                reference.get_range(start_ms, end_ms))]:
+        read = []
+        while True:
+            with ThreadPoolExecutor(max_workers=1) as pool:
+                transaction = pool.submit(next, iterator, None).result()
+            if transaction is None:
+                break
+            read.append(transaction)
+        assert ids(read) == ids(expected)
+        assert len(read) == len(expected)
@@ -0,0 +1,56 @@
+"""TemplateParser extraction and unmatched template reporting"""
+
+from conftest import XML_PATH
+from dsa.xml_parser import (TemplateParser, extract_transaction_from_sms, iter_sms, iter_transactions,
+                            merge_reports, message_template)
+
+
+def regex_transactions(xml_path):
+    transactions = []
+    for sms_data in iter_sms(xml_path):
+        transaction = extract_transaction_from_sms(sms_data.get('body'), sms_data)
+        if transaction:
+            transactions.append(transaction)
+    return transactions
+
+
+def test_iter_transactions_matches_regex_extractor():
+    parser = TemplateParser()
+    parsed = [transaction for transaction, _ in iter_transactions(XML_PATH, parser)]
+
+    assert parsed == regex_transactions(XML_PATH)
+
+
+def test_message_template_masks_numbers_and_names():
+    body = 'You have received 2,000 RWF from Jane Smith (*********013) at 2024-05-10 16:30:51.'
+
+    # Trailing separators are part of the number token
+    assert message_template(body) == '<name> have received <#> RWF from <name> (*********<#>) at <#> <#>'
+
+
+def test_unmatched_templates_are_counted():
+    parser = TemplateParser()
+    parser.parse('Your code is 1234. Do not share it.', {})
+    parser.parse('Your code is 98765. Do not share it.', {})
+    parser.parse('You have received 2,000 RWF from Jane Smith (*********013).', {})
+
+    report = parser.report()
+    assert report['unmatched_templates'] == [{
+        'template': '<name> code is <#> <name> not share it.',
+        'count': 2,
+        'example': 'Your code is 1234. Do not share it.',
+    }]
+
+    parser.reset_stats()
+    assert parser.report()['unmatched_templates'] == []
+
+
+def test_merge_reports_sums_counts():
+    first, second = TemplateParser(), TemplateParser()
+    first.parse('Your code is 1234.', {})
+    second.parse('Your code is 5678.', {})
+    second.parse('Balance check 12 done', {})
+
+    merged = merge_reports([first.report(), second.report()])
+    assert [(entry['template'], entry['count']) for entry in merged['unmatched_templates']] == [
+        ('<name> code is <#>', 2), ('<name> check <#> done', 1)]